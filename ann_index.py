@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+ann_index.py — Index approché des plus proches voisins (IVF, CPU, numpy seul)
+
+Les embeddings (normalisés) sont partitionnés en `nlist` groupes par k-means sphérique.
+Une requête compare d'abord le vecteur aux centroïdes, puis ne parcourt que les lignes des
+`nprobe` groupes les plus proches : les scores y sont exacts (produit scalaire sur les
+embeddings d'origine), seules les lignes des autres groupes sont ignorées.
+
+Compromis rappel / latence : ANN_NPROBE (défaut 64). Plus nprobe est grand, plus on lit de
+lignes et plus le résultat se rapproche du parcours complet (nprobe = nlist : identique).
+
+Fichier ivf.npz, à côté des embeddings :
+    centroids  float32 (nlist, dim), normalisés
+    offsets    int64 (nlist + 1) : le groupe g occupe ids[offsets[g]:offsets[g+1]]
+    ids        int64 (n) : numéros de ligne des embeddings, groupés, croissants dans chaque groupe
+    fingerprint  empreinte de quelques lignes des embeddings (détecte un index périmé)
+
+En dessous de IVF_MIN_ROWS lignes l'index n'est pas construit (le parcours complet est
+plus rapide) ; ANN_INDEX=1 force la construction, ANN_INDEX=0 la désactive.
+
+Usage :
+    write_ivf(DB_DIR, embeddings)                      # ingest.py / build_vector_store.py
+    ivf = load_ivf(DB_DIR, embeddings)                 # None si absent ou périmé
+    rows = ivf.candidates(q_emb)                       # lignes à scorer
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+IVF_FILE = "ivf.npz"
+IVF_MIN_ROWS = 20000
+ANN_INDEX = os.environ.get("ANN_INDEX", "auto").strip().lower()
+DEFAULT_NPROBE = int(os.environ.get("ANN_NPROBE", "64") or 64)
+
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 64
+_BLOCK = 8192
+
+
+def _normalized(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-9)
+
+
+def fingerprint(embeddings: np.ndarray) -> str:
+    """Empreinte (nb de lignes, première / médiane / dernière ligne) des embeddings indexés."""
+    n = len(embeddings)
+    h = hashlib.blake2b(str(embeddings.shape).encode(), digest_size=16)
+    for i in sorted({0, n // 2, n - 1} if n else ()):
+        h.update(np.asarray(embeddings[i], dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def default_nlist(n: int) -> int:
+    """Nombre de groupes : ≈ 4·√n (≈ 110 lignes par groupe pour 200 000 lignes)."""
+    return max(1, min(n, int(round(4 * np.sqrt(n)))))
+
+
+class IVFIndex:
+    """Centroïdes + listes inversées ; candidates() renvoie les lignes des groupes sondés."""
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def rows(self) -> int:
+        return len(self.ids)
+
+    def candidates(self, q: np.ndarray, nprobe: int | None = None) -> np.ndarray:
+        """Lignes (triées) des `nprobe` groupes dont le centroïde est le plus proche de q."""
+        nprobe = min(self.nlist, nprobe or DEFAULT_NPROBE)
+        sims = self.centroids @ _normalized(q)
+        probe = np.argpartition(sims, -nprobe)[-nprobe:] if nprobe < self.nlist else np.arange(self.nlist)
+        rows = np.concatenate([self.ids[self.offsets[g] : self.offsets[g + 1]] for g in probe])
+        rows.sort()
+        return rows
+
+    def search(self, embeddings: np.ndarray, q: np.ndarray, k: int,
+               nprobe: int | None = None) -> tuple:
+        """(lignes, scores) des k meilleurs produits scalaires parmi les candidats."""
+        rows = self.candidates(q, nprobe)
+        scores = np.asarray(embeddings[rows], dtype=np.float32) @ np.asarray(q, dtype=np.float32)
+        top = np.argsort(scores)[::-1][:k]
+        return rows[top], scores[top]
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Groupe le plus proche de chaque ligne (par lots, lignes normalisées à la volée)."""
+    labels = np.empty(len(x), dtype=np.int64)
+    for i in range(0, len(x), _BLOCK):
+        labels[i : i + _BLOCK] = np.argmax(_normalized(x[i : i + _BLOCK]) @ centroids.T, axis=1)
+    return labels
+
+
+def build_ivf(embeddings: np.ndarray, nlist: int | None = None, seed: int = 0) -> IVFIndex:
+    """k-means sphérique sur un échantillon, puis affectation de toutes les lignes."""
+    n = len(embeddings)
+    nlist = min(n, nlist or default_nlist(n))
+    rng = np.random.default_rng(seed)
+    sample_size = min(n, nlist * _KMEANS_SAMPLE_PER_LIST)
+    sample = _normalized(embeddings[np.sort(rng.choice(n, sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        # Groupe vide : réensemencé sur un point tiré au hasard
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = _normalized(sums)
+
+    labels = _assign(embeddings, centroids)
+    ids = np.argsort(labels, kind="stable").astype(np.int64)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+    return IVFIndex(centroids.astype(np.float32), offsets, ids)
+
+
+def write_ivf(db_dir: Path, embeddings: np.ndarray, force: bool | None = None) -> IVFIndex | None:
+    """
+    Construit et écrit ivf.npz si la base est assez grande (voir ANN_INDEX / IVF_MIN_ROWS).
+    Sinon supprime un ivf.npz existant, devenu périmé. Retourne l'index ou None.
+    """
+    path = Path(db_dir) / IVF_FILE
+    if force is None:
+        force = {"1": True, "0": False}.get(ANN_INDEX)
+    build = force if force is not None else len(embeddings) >= IVF_MIN_ROWS
+    if not build or len(embeddings) == 0:
+        path.unlink(missing_ok=True)
+        return None
+    ivf = build_ivf(embeddings)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, centroids=ivf.centroids, offsets=ivf.offsets, ids=ivf.ids,
+                 fingerprint=np.array(fingerprint(embeddings)))
+    os.replace(tmp, path)
+    return ivf
+
+
+def load_ivf(db_dir: Path, embeddings: np.ndarray) -> IVFIndex | None:
+    """Charge ivf.npz. None si absent, illisible ou construit pour d'autres embeddings (périmé)."""
+    path = Path(db_dir) / IVF_FILE
+    if not path.exists():
+        return None
+    try:
+        with np.load(path) as npz:
+            ivf = IVFIndex(npz["centroids"], npz["offsets"], npz["ids"])
+            stored = str(npz["fingerprint"])
+    except (OSError, KeyError, ValueError):
+        return None
+    rows = len(embeddings)
+    if ivf.rows != rows or ivf.offsets[-1] != rows or stored != fingerprint(embeddings):
+        return None
+    return ivf
@@ -3,41 +3,46 @@ app.py — Interface Streamlit de recherche dans les comptes rendus
 Usage  : streamlit run app.py
 """
 
+import hashlib
 import html as _html
+import importlib.util
+import os
 import re
 import sqlite3
+import threading
+import time
+import unicodedata
 import warnings
 
 # Supprimer les warnings non bloquants (pin_memory, HF Hub)
 warnings.filterwarnings("ignore", message=".*pin_memory.*", category=UserWarning)
 warnings.filterwarnings("ignore", message=".*HF_TOKEN.*", category=UserWarning)
 import json
-import pickle
 import subprocess
 import csv
 import io
 import numpy as np
 import streamlit as st
 import streamlit.components.v1 as components
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from collections import Counter, defaultdict
-from sentence_transformers import SentenceTransformer
+from collections import Counter, OrderedDict, defaultdict
 from pathlib import Path
 
-try:
-    from groq import Groq as _Groq
-    _GROQ_OK = True
-except ImportError:
-    _GROQ_OK = False
-
-try:
-    from rank_bm25 import BM25Okapi as _BM25Okapi
-    _BM25_OK = True
-except ImportError:
-    _BM25_OK = False
+import ann_index
+import bm25_index
+import chunk_tags
+import index_store
+import query_encoder
+import result_cache
+
+# Dépendances lourdes importées là où elles servent, pas au chargement du module : la page
+# d'accueil s'affiche sans torch ni onnxruntime (encodeur → load_model), plotly (section
+# Statistiques), groq (ask_claude_stream) ni rank_bm25 (base sans matrice BM25). Ici, on
+# vérifie seulement leur présence (find_spec n'importe pas le paquet).
+# Profil : python scripts/profile_startup.py
+_GROQ_OK = importlib.util.find_spec("groq") is not None
+_BM25_OK = importlib.util.find_spec("rank_bm25") is not None
 
 try:
     from streamlit_javascript import st_javascript
@@ -413,68 +418,499 @@ def get_git_info():
 # ── Chargement des ressources (mis en cache) ───────────────────────────────────
 @st.cache_resource(show_spinner="Chargement du modele d'embeddings...")
 def load_model():
-    return SentenceTransformer(MODEL_NAME)
+    # ONNX int8 si exporté (scripts/export_query_encoder.py), sinon SentenceTransformer (torch)
+    return query_encoder.load_query_encoder(MODEL_NAME)
+
+
+def _load_version(db_dir: Path) -> tuple:
+    """Ouvre une version de vector_db/ : (embeddings, documents, metadata, bm25, ivf, tags, version)."""
+    # Format index_store : embeddings et textes en mmap, métadonnées en colonnes
+    # (documents / metadata s'utilisent comme des listes ; anciens pickles encore lus).
+    # Avec une copie quantifiée (int8), embeddings est un QuantizedEmbeddings : voir search().
+    embeddings, documents, metadata = index_store.load_index(db_dir, quantized=True)
+    # Index BM25 (lexical) en complément des embeddings sémantiques : matrice précalculée
+    # par ingest.py (bm25_index, mmap) ; à défaut (base ancienne), construit ici avec rank_bm25
+    bm25 = bm25_index.load_bm25(db_dir, len(documents))
+    if bm25 is None and _BM25_OK:
+        from rank_bm25 import BM25Okapi
+        bm25 = BM25Okapi([bm25_index.tokenize(doc) for doc in documents])
+    # Index approché (ivf.npz, écrit par ingest.py pour les grandes bases) ; None sinon
+    ivf = ann_index.load_ivf(db_dir, embeddings)
+    # Étiquettes des chunks (tags.npy, écrit par ingest.py) ; base ancienne : calculées ici
+    tags = chunk_tags.load_tags(db_dir, len(documents))
+    if tags is None:
+        tags = _compute_tags(documents, metadata)
+    # Identifiant de la version (clé du cache des résultats) : répertoire + date d'écriture des
+    # embeddings, pour qu'une base à plat réécrite sur place change aussi d'identifiant
+    version = f"{db_dir.name}:{(db_dir / index_store.EMBEDDINGS_FILE).stat().st_mtime_ns}"
+    return embeddings, documents, metadata, bm25, ivf, tags, version
+
+
+def _compute_tags(documents, metadata) -> chunk_tags.ChunkTags:
+    """Étiquettes calculées en mémoire (base sans tags.npy ou écrite avec d'autres motifs)."""
+    if hasattr(metadata, "column"):
+        filenames = metadata.column("filename")
+    else:
+        filenames = [m.get("filename", "") for m in metadata]
+    texts = (doc for _, doc in _iter_texts(documents))
+    return chunk_tags.ChunkTags(chunk_tags.compute_tags(texts, filenames))
+
+
+class _IndexRegistry:
+    """
+    Versions de vector_db/ ouvertes par le processus. ingest.py publie chaque index dans un
+    nouveau répertoire puis bascule le pointeur vector_db/CURRENT : la nouvelle version est
+    chargée en tâche de fond et servie dès qu'elle est prête, sans redémarrage ni démarrage à
+    froid. La précédente reste ouverte pour les runs en cours (chaque run garde la version
+    obtenue par load_db() au début du script).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}      # répertoire → (embeddings, documents, metadata, bm25, ivf, tags, version)
+        self.current = None     # répertoire servi
+        self.loading = None     # répertoire en cours de chargement
+        self.failed = None      # dernier répertoire dont le chargement a échoué
+
+    def get(self) -> tuple:
+        path = index_store.active_dir(DB_DIR)
+        with self.lock:
+            if self.current is None:
+                # Premier chargement : synchrone (rien d'autre à servir)
+                self.versions[path] = _load_version(path)
+                self.current = path
+            elif path not in (self.current, self.loading, self.failed):
+                self.loading = path
+                threading.Thread(target=self._load_in_background, args=(path,), daemon=True).start()
+            return self.versions[self.current]
+
+    def _load_in_background(self, path: Path) -> None:
+        try:
+            db = _load_version(path)
+        except Exception as e:
+            print(f"[vector_db] Echec du chargement de {path} : {e}")
+            db = None
+        with self.lock:
+            self.loading = None
+            if db is None:
+                self.failed = path
+                return
+            # Version courante + précédente seulement : les plus anciennes sont libérées
+            # quand plus aucun run ne les utilise
+            self.versions = {self.current: self.versions[self.current], path: db}
+            self.current = path
+
+    def _part_for(self, embeddings, part: int):
+        with self.lock:
+            for db in self.versions.values():
+                if db[0] is embeddings:
+                    return db[part]
+        return None
+
+    def ann_for(self, embeddings):
+        """Index IVF de la version dont proviennent `embeddings` (None si inconnue ou sans IVF)."""
+        return self._part_for(embeddings, 4)
+
+    def tags_for(self, embeddings):
+        """Étiquettes des chunks de la version dont proviennent `embeddings` (None si inconnue)."""
+        return self._part_for(embeddings, 5)
+
+    def version_for(self, embeddings) -> str | None:
+        """Identifiant de la version dont proviennent `embeddings` (None si inconnue)."""
+        return self._part_for(embeddings, 6)
+
+    def live_versions(self) -> set:
+        """Identifiants des versions encore ouvertes (courante et précédente)."""
+        with self.lock:
+            return {db[6] for db in self.versions.values()}
 
 
-def _tokenize(text: str) -> list:
-    """Tokenisation simple pour BM25 : minuscules, split sur non-alphanumérique."""
-    return re.split(r"[^\w]+", text.lower())
+@st.cache_resource
+def _index_registry() -> _IndexRegistry:
+    # Vide à la création : seul load_db() ouvre vector_db/. search() et search_agent() ne font
+    # qu'y chercher les tableaux reçus (IVF, étiquettes, version) : avec d'autres tableaux, ou
+    # avant tout load_db(), ils n'ont ni index approché ni cache, et ne lisent pas vector_db/.
+    return _IndexRegistry()
 
 
-@st.cache_resource(show_spinner="Chargement de la base vectorielle...")
 def load_db():
-    embeddings = np.load(DB_DIR / "embeddings.npy")
-    with open(DB_DIR / "documents.pkl", "rb") as f:
-        documents = pickle.load(f)
-    with open(DB_DIR / "metadata.pkl", "rb") as f:
-        metadata = pickle.load(f)
-    # Construction de l'index BM25 (lexical) en complément des embeddings sémantiques
-    bm25 = None
-    if _BM25_OK:
-        tokenized = [_tokenize(doc) for doc in documents]
-        bm25 = _BM25Okapi(tokenized)
-    return embeddings, documents, metadata, bm25
+    """(embeddings, documents, metadata, bm25) de la version active de vector_db/."""
+    registry = _index_registry()
+    if registry.current is None:
+        with st.spinner("Chargement de la base vectorielle..."):
+            db = registry.get()
+    else:
+        db = registry.get()
+    # Résultats en cache des versions libérées par une bascule : supprimés une fois, ici
+    # (les deux versions ouvertes gardent les leurs pendant la bascule)
+    if RETRIEVAL_CACHE_SIZE:
+        _retrieval_cache().prune(registry.live_versions())
+    return db[:4]
+
+
+# ── Vecteurs de requêtes (cache LRU commun aux sessions) ─────────────────────
+# Nombre de requêtes libres gardées (0 = pas de cache) ; ≈ 1,5 Ko par vecteur
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024") or 0)
+
+
+class _QueryVectorCache:
+    """
+    Requête → vecteur normalisé (float32, lecture seule), partagé par toutes les sessions du
+    processus. Les requêtes fixes (sous-requêtes de search_agent, suggestions, thèmes) sont
+    encodées en un lot au chargement du modèle et ne sont jamais évincées ; les autres passent
+    par un LRU borné à `size` entrées. hits / misses comptent les deux.
+    """
+
+    def __init__(self, size: int, pinned: tuple):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._pinned_queries = tuple(dict.fromkeys(pinned))
+        self._pinned = None       # requête → vecteur, rempli au premier appel (chargement du modèle)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(queries: list) -> np.ndarray:
+        vecs = np.asarray(load_model().encode(list(queries), show_progress_bar=False), dtype=np.float32)
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-9)
+        vecs.setflags(write=False)
+        return vecs
+
+    def vector(self, query: str) -> np.ndarray:
+        return self.vectors([query])[0]
+
+    def vectors(self, queries: list) -> np.ndarray:
+        """Vecteurs (len(queries), dim) ; les requêtes absentes du cache sont encodées en un seul lot."""
+        if self._pinned is None:
+            with self._lock:
+                if self._pinned is None:
+                    self._pinned = dict(zip(self._pinned_queries, self._encode(self._pinned_queries)))
+        found, missing = {}, []
+        with self._lock:
+            for query in queries:
+                vec = self._pinned.get(query)
+                if vec is None:
+                    vec = self._lru.get(query)
+                    if vec is not None:
+                        self._lru.move_to_end(query)
+                if vec is not None:
+                    self.hits += 1
+                    found[query] = vec
+                else:
+                    self.misses += 1
+                    if query not in missing:
+                        missing.append(query)
+        if missing:
+            # Encodage hors verrou : les autres sessions continuent de lire le cache
+            found.update(zip(missing, self._encode(missing)))
+            if self.size:
+                with self._lock:
+                    for query in missing:
+                        self._lru[query] = found[query]
+                    while len(self._lru) > self.size:
+                        self._lru.popitem(last=False)
+        return np.stack([found[query] for query in queries])
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "lru": len(self._lru),
+                    "pinned": len(self._pinned or ()), "hit_rate": self.hits / total if total else 0.0}
+
+
+@st.cache_resource
+def _query_vectors() -> _QueryVectorCache:
+    # Léger : le modèle n'est chargé qu'au premier vector()
+    return _QueryVectorCache(QUERY_CACHE_SIZE, _AGENT_SUBQUERIES + tuple(SUGGESTIONS) + tuple(THEMES.values()))
+
+
+# ── Cache des résultats de recherche (commun aux sessions) ────────────────────
+# Résultats gardés en mémoire (0 = pas de cache). Couche disque optionnelle : RETRIEVAL_CACHE_DB
+# (ex. cache/retrieval.sqlite) pour garder les résultats entre deux redémarrages ; vide par défaut
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "256") or 0)
+RETRIEVAL_CACHE_DB = os.environ.get("RETRIEVAL_CACHE_DB", "")
+# Version de la logique de recherche, dans la clé du cache : à incrémenter à chaque changement
+# qui modifie les résultats (scores, filtres, bonus de l'agent, index_store, bm25_index, ann_index,
+# chunk_tags, encodeur des requêtes), pour que la couche disque ne serve pas les anciens
+RETRIEVAL_VERSION = 1
+
+
+@st.cache_resource
+def _retrieval_cache() -> result_cache.ResultCache:
+    path = Path(RETRIEVAL_CACHE_DB) if RETRIEVAL_CACHE_DB and RETRIEVAL_CACHE_SIZE else None
+    return result_cache.ResultCache(RETRIEVAL_CACHE_SIZE, path)
+
+
+def _normalize_query(query: str) -> str:
+    """Forme canonique d'une requête (NFC, espaces réduits). La casse est gardée : le modèle y est sensible."""
+    return " ".join(unicodedata.normalize("NFC", query or "").split())
+
+
+def _cached_retrieval(key: tuple, embeddings, compute) -> list:
+    """
+    Résultats (doc, meta, score) de compute(), mis en cache pour `key` et la version de l'index
+    dont proviennent `embeddings` : les clics sur les suggestions, thèmes et exemples de
+    l'agent ne relancent pas la recherche. Sans version connue (base hors registre), pas de cache.
+    """
+    cache = _retrieval_cache()
+    version = _index_registry().version_for(embeddings) if cache.size else None
+    if version is None:
+        return compute()
+    # Même index mais autre logique de recherche (RETRIEVAL_VERSION incrémentée) : autre clé
+    key = (RETRIEVAL_VERSION, *key)
+    cached = cache.get(key, version)
+    if cached is None:
+        results = compute()
+        cache.put(key, version, [(doc, dict(meta), score) for doc, meta, score in results])
+        return results
+    # Copies des métadonnées : le cache est partagé entre sessions
+    return [(doc, dict(meta), score) for doc, meta, score in cached]
 
 
 # ── Recherche hybride sémantique + BM25 ───────────────────────────────────────
 # Pondération : α × sémantique + (1-α) × BM25 normalisé
 _BM25_ALPHA = 0.6   # part sémantique ; 1-α = 0.4 pour BM25 lexical
+# Embeddings quantifiés : premier tri sur la copie int8, puis rescoring float32 des meilleurs candidats
+_RESCORE_CANDIDATES = 300
+# Index IVF : meilleurs chunks BM25 ajoutés aux candidats des groupes proches de la requête
+_ANN_BM25_CANDIDATES = 300
 
-def search(query: str, embeddings, documents, metadata,
-           n: int = 15, year_filter: list = None, exact: bool = False,
-           bm25=None):
-    model = load_model()
-    q_emb = model.encode([query], show_progress_bar=False)[0].astype(np.float32)
-    q_emb = q_emb / max(np.linalg.norm(q_emb), 1e-9)
 
-    sem_scores = embeddings @ q_emb  # cosine similarity ∈ [-1, 1]
+def _iter_texts(documents, rows=None):
+    """(ligne, texte) des lignes `rows` (toutes par défaut) ; TextStore : décodage hors cache LRU."""
+    if hasattr(documents, "iter_rows"):
+        return documents.iter_rows(rows)
+    return ((int(i), documents[i]) for i in (range(len(documents)) if rows is None else rows))
 
-    # Score BM25 : normalisé dans [0, 1] puis combiné avec le score sémantique
-    if bm25 is not None:
-        raw_bm25 = np.array(bm25.get_scores(_tokenize(query)), dtype=np.float32)
-        bm25_max = raw_bm25.max()
-        bm25_norm = raw_bm25 / bm25_max if bm25_max > 0 else raw_bm25
-        scores = _BM25_ALPHA * sem_scores + (1 - _BM25_ALPHA) * bm25_norm
-    else:
-        scores = sem_scores
 
+def _meta_mask(metadata, field: str, predicate) -> np.ndarray:
+    """Lignes dont le champ texte `field` vérifie predicate (valeur "" si absent)."""
+    if hasattr(metadata, "mask"):
+        return metadata.mask(field, predicate)
+    return np.array([bool(predicate(str(m.get(field) or ""))) for m in metadata], dtype=bool)
+
+
+def _row_locator(metadata):
+    """Fonction (filename, chunk) → ligne ou None, sans reconstruire les métadonnées de la base."""
+    if hasattr(metadata, "row_of"):
+        return metadata.row_of
+    rows = {(m.get("filename", ""), m.get("chunk", 0)): i for i, m in enumerate(metadata)}
+    return lambda filename, chunk: rows.get((filename, chunk))
+
+
+def _file_rows_locator(metadata):
+    """Fonction filename → lignes du fichier (par n° de chunk), sans parcourir la base à chaque appel."""
+    if hasattr(metadata, "file_rows"):
+        return metadata.file_rows
+    by_file = {}
+    for i, m in enumerate(metadata):
+        by_file.setdefault(m.get("filename", ""), []).append((m.get("chunk", 0), i))
+    return lambda filename: np.array([i for _, i in sorted(by_file.get(filename, []))], dtype=np.int64)
+
+
+def _exact_terms(query: str) -> list:
+    """Mots du filtre exact : ceux de plus de 2 caractères."""
+    return [t for t in re.split(r"\s+", query) if len(t) > 2]
+
+
+def _year_mask(metadata, year_filter: list) -> np.ndarray:
+    year_set = {str(y) for y in year_filter}
+    if hasattr(metadata, "column"):
+        return np.isin(metadata.column("year"), list(year_set))
+    return np.array([m["year"] in year_set for m in metadata], dtype=bool)
+
+
+def _filter_mask(query: str, documents, metadata, year_filter: list = None,
+                 exact: bool = False, rows: np.ndarray = None):
+    """
+    Lignes autorisées par les filtres (année, mot exact), ou None sans filtre.
+    rows : lignes candidates — le filtre exact ne lit que leurs textes (les autres sont refusées).
+    """
+    mask = None
     # Filtre par année
     if year_filter:
-        year_set = {str(y) for y in year_filter}
-        mask = np.array([m["year"] in year_set for m in metadata], dtype=bool)
-        scores = np.where(mask, scores, -1.0)
+        mask = _year_mask(metadata, year_filter)
 
     # Filtre exact : le chunk doit contenir au moins un mot de la requête
     if exact:
-        terms = [t for t in re.split(r"\s+", query) if len(t) > 2]
-        pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
-        mask_exact = np.array([bool(pattern.search(doc)) for doc in documents], dtype=bool)
-        scores = np.where(mask_exact, scores, -1.0)
+        terms = _exact_terms(query)
+        if hasattr(documents, "contains_any"):
+            # TextStore : recherche sur les octets de texts.bin (mmap), sans décoder les textes
+            mask_exact = documents.contains_any(terms, rows)
+        else:
+            pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+            mask_exact = np.zeros(len(documents), dtype=bool)
+            mask_exact[[i for i, doc in _iter_texts(documents, rows) if pattern.search(doc)]] = True
+        mask = mask_exact if mask is None else mask & mask_exact
+    return mask
+
+
+def _year_key(year_filter) -> tuple:
+    return tuple(sorted({str(y) for y in year_filter or ()}))
+
+
+def _year_rows(metadata, years) -> np.ndarray:
+    """Lignes (croissantes) des années `years` ; MetadataStore : tranches du répertoire des années."""
+    if hasattr(metadata, "year_rows"):
+        return metadata.year_rows(years)
+    return np.flatnonzero(_year_mask(metadata, years))
+
+
+def _filter_rows(queries: list, documents, metadata) -> list:
+    """
+    Lignes autorisées (croissantes) de chaque (requête, n, year_filter, exact) de search_many,
+    ou None sans filtre : lignes des années (répertoire, partagées entre requêtes) intersectées
+    avec les lignes du filtre exact, calculées en un seul parcours des textes pour toutes.
+    """
+    year_rows = {}
+    for _, _, year_filter, _ in queries:
+        key = _year_key(year_filter)
+        if key and key not in year_rows:
+            year_rows[key] = _year_rows(metadata, key)
+    exact_idx = [j for j, (_, _, _, exact) in enumerate(queries) if exact]
+    if exact_idx and hasattr(documents, "contains_many"):
+        exact_masks = dict(zip(exact_idx, documents.contains_many([_exact_terms(queries[j][0]) for j in exact_idx])))
+    else:
+        exact_masks = {j: _filter_mask(queries[j][0], documents, metadata, exact=True) for j in exact_idx}
+    allowed = []
+    for j, (_, _, year_filter, _) in enumerate(queries):
+        rows = year_rows.get(_year_key(year_filter))
+        if j in exact_masks:
+            mask = exact_masks[j]
+            rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+        allowed.append(rows)
+    return allowed
+
+
+def _bm25_scores(bm25, queries: list) -> np.ndarray:
+    """Scores BM25 (len(queries), nb de chunks) ; BM25Okapi (ancien format) : une requête à la fois."""
+    tokens = [bm25_index.tokenize(q) for q in queries]
+    if hasattr(bm25, "get_scores_many"):
+        return bm25.get_scores_many(tokens)
+    return np.array([bm25.get_scores(t) for t in tokens], dtype=np.float32)
+
+
+def _top_rows(scores: np.ndarray, n: int, rows: np.ndarray = None) -> np.ndarray:
+    """Les n lignes de meilleur score, triées (parmi `rows` si fourni) : sélection puis tri des seules n."""
+    if rows is None:
+        rows = np.arange(len(scores))
+    k = min(n, len(rows))
+    if k <= 0:
+        return rows[:0]
+    sub = scores[rows]
+    best = np.argpartition(sub, len(sub) - k)[len(sub) - k:]
+    return rows[best[np.argsort(sub[best], kind="stable")[::-1]]]
+
+
+def _search_ivf(ivf, q_emb: np.ndarray, bm25_norm, query: str, n: int, year_filter, exact: bool,
+                embeddings, documents, metadata):
+    """
+    Index IVF (grandes bases) : seuls les chunks des groupes proches de la requête et les
+    meilleurs chunks BM25 sont scorés, en pleine précision. None si les filtres laissent moins
+    de n candidats (parcours complet par search_many).
+    """
+    rows = ivf.candidates(q_emb)
+    if bm25_norm is not None:
+        k = min(len(bm25_norm), _ANN_BM25_CANDIDATES)
+        rows = np.union1d(rows, np.argpartition(bm25_norm, -k)[-k:])
+    if isinstance(embeddings, index_store.QuantizedEmbeddings):
+        sem_rows = embeddings.exact_scores(q_emb, rows)
+    else:
+        sem_rows = np.asarray(embeddings[rows], dtype=np.float32) @ q_emb
+    scores = np.full(len(embeddings), -1.0, dtype=np.float32)
+    if bm25_norm is not None:
+        scores[rows] = _BM25_ALPHA * sem_rows + (1 - _BM25_ALPHA) * bm25_norm[rows]
+    else:
+        scores[rows] = sem_rows
+    mask = _filter_mask(query, documents, metadata, year_filter, exact, rows)
+    if mask is not None:
+        scores = np.where(mask, scores, -1.0)
+    if np.count_nonzero(scores[rows] > -1.0) < n:
+        return None
+    return [(documents[i], metadata[i], float(scores[i])) for i in _top_rows(scores, n, rows)]
+
+
+def search_many(queries: list, embeddings, documents, metadata, bm25=None) -> list:
+    """
+    Plusieurs recherches hybrides en un lot : queries = [(requête, n, year_filter, exact)].
+    Une liste de résultats par requête, comme autant d'appels à search(), mais les requêtes
+    sont encodées en un seul appel au modèle, scorées par un seul produit embeddings @ Q et un
+    seul passage BM25, et les filtres exacts lisent texts.bin une seule fois.
+    """
+    if not queries:
+        return []
+    texts = [q for q, _, _, _ in queries]
+    q_embs = _query_vectors().vectors(texts)   # (m, dim) normalisés, en cache (LRU commun aux sessions)
+    quantized = isinstance(embeddings, index_store.QuantizedEmbeddings)
+
+    # Scores BM25 : normalisés dans [0, 1] (par requête) puis combinés avec le score sémantique
+    bm25_norm = None
+    if bm25 is not None:
+        bm25_norm = _bm25_scores(bm25, texts)
+        bm25_max = bm25_norm.max(axis=1, keepdims=True)
+        np.divide(bm25_norm, bm25_max, out=bm25_norm, where=bm25_max > 0)
+
+    results = [None] * len(queries)
+    ivf = _index_registry().ann_for(embeddings)
+    if ivf is not None and ivf.rows == len(embeddings):
+        for j, (query, n, year_filter, exact) in enumerate(queries):
+            results[j] = _search_ivf(ivf, q_embs[j], None if bm25_norm is None else bm25_norm[j],
+                                     query, n, year_filter, exact, embeddings, documents, metadata)
+    todo = [j for j, found in enumerate(results) if found is None]
+    if not todo:
+        return results
+
+    # Parcours complet. Les requêtes filtrées (années, mot exact) ne scorent que leurs lignes
+    # autorisées ; les autres (ou celles dont les filtres gardent plus de la moitié de la base)
+    # partagent un seul produit embeddings @ Q, une colonne par requête.
+    allowed = dict(zip(todo, _filter_rows([queries[j] for j in todo], documents, metadata)))
+    dense = [j for j in todo if allowed[j] is None or 2 * len(allowed[j]) > len(embeddings)]
+    if dense:
+        if quantized:
+            sem_all = embeddings.approx_scores(q_embs[dense])  # cosine approchée (copie int8/float16)
+        else:
+            sem_all = embeddings @ q_embs[dense].T  # cosine similarity ∈ [-1, 1]
+    column = {j: col for col, j in enumerate(dense)}
+
+    for j in todo:
+        _, n, _, _ = queries[j]
+        rows = allowed[j]   # None : toutes les lignes ; scores ci-dessous indexés comme rows
+        if j in column:
+            sem_scores = np.ascontiguousarray(sem_all[:, column[j]] if rows is None else sem_all[rows, column[j]])
+        elif quantized:
+            sem_scores = embeddings.approx_scores(q_embs[j], rows=rows)
+        else:
+            sem_scores = np.asarray(embeddings[rows], dtype=np.float32) @ q_embs[j]
+        if bm25_norm is not None:
+            bm25_rows = bm25_norm[j] if rows is None else bm25_norm[j][rows]
+            scores = _BM25_ALPHA * sem_scores + (1 - _BM25_ALPHA) * bm25_rows
+        else:
+            scores = sem_scores.copy()
+
+        if quantized:
+            # Rescoring exact : seuls les candidats retenus sur les scores approchés sont
+            # recalculés en float32, puis triés ; le reste de la matrice n'est pas relu.
+            k = min(len(scores), max(n, _RESCORE_CANDIDATES))
+            cand = np.sort(np.argpartition(scores, -k)[-k:]) if k else np.array([], dtype=np.int64)
+            sem_exact = embeddings.exact_scores(q_embs[j], cand if rows is None else rows[cand])
+            weight = _BM25_ALPHA if bm25 is not None else 1.0
+            scores[cand] += weight * (sem_exact - sem_scores[cand])
+            top = _top_rows(scores, n, cand)
+        else:
+            top = _top_rows(scores, n)
+        top_idx = top if rows is None else rows[top]
+        results[j] = [(documents[i], metadata[i], float(s)) for i, s in zip(top_idx.tolist(), scores[top].tolist())]
+    return results
 
-    top_idx = np.argsort(scores)[::-1][:n]
-    # Exclure les résultats filtrés (score == -1)
-    top_idx = [i for i in top_idx if scores[i] > -1.0]
-    return [(documents[i], metadata[i], float(scores[i])) for i in top_idx]
+
+def search(query: str, embeddings, documents, metadata,
+           n: int = 15, year_filter: list = None, exact: bool = False,
+           bm25=None):
+    query = _normalize_query(query)
+    key = ("search", query, _year_key(year_filter), exact, n, bm25 is not None)
+    return _cached_retrieval(key, embeddings, lambda: search_many(
+        [(query, n, year_filter, exact)], embeddings, documents, metadata, bm25)[0])
 
 
 # ── Utilitaires d'affichage ────────────────────────────────────────────────────
@@ -503,30 +939,14 @@ _QUERY_TARIF_MONTANT = re.compile(
     r"\b(tarif|tarifs|montant|montants|prix|barème|barèmes|coût|coûts|euro|euros|taux|cotisation|grille|quotient)\b",
     re.IGNORECASE
 )
-# Chunk contient au moins un nombre (améliore le ranking pour les questions tarifaires)
-_CHUNK_HAS_NUMBER = re.compile(r"\d")
-# Chunk évoque un montant (€, crédit, HT, TTC, "euro") → à inclure quand on cherche les coûts des travaux
-_CHUNK_HAS_AMOUNT = re.compile(
-    r"\d[\d\s]*(?:€|euro|euros|HT|TTC)|(?:crédit|montant|budget|alloué|ouvrir)[^\n]{0,80}\d|"
-    r"\d[\d\s]{2,}(?:\.\d{2})?\s*(?:€|euro)",
-    re.IGNORECASE
-)
-# Chunk parle de voirie / travaux publics (rue, chaussée, route)
-_CHUNK_VOIRIE = re.compile(
-    r"\b(travaux|voirie|chauss[eé]e|route|rue|réfection|enrobé)\b",
-    re.IGNORECASE
-)
-# Chunk parle d'Horizon / logiciels métiers (pour prioriser ces passages en sortie)
-_CHUNK_HORIZON = re.compile(
-    r"\b(horizon|logiciel|logiciels|renouvellement|villages\s*cloud|DETR)\b",
-    re.IGNORECASE
-)
-# Chunk parle explicitement des tarifs de restauration scolaire (cantine)
-_CHUNK_CANTINE_TARIF = re.compile(
-    r"\b(restauration\s+scolaire)\b.{0,80}\b(tarification|tarifs|bar[eè]me)\b|"
-    r"\bRessources\s+annuelles\b.{0,80}\bTARIF\s+RESTAURATION\b",
-    re.IGNORECASE | re.DOTALL
-)
+# Motifs des chunks : définis dans chunk_tags.py, évalués une fois par chunk à l'ingestion
+# (tags.npy). Ici, ils ne servent plus qu'aux bonus et au classement des passages retenus.
+_CHUNK_HAS_NUMBER = chunk_tags.HAS_NUMBER
+_CHUNK_HAS_AMOUNT = chunk_tags.HAS_AMOUNT
+_CHUNK_VOIRIE = chunk_tags.VOIRIE
+_CHUNK_HORIZON = chunk_tags.HORIZON
+_CHUNK_CANTINE_TARIF = chunk_tags.CANTINE_TARIF
+_CHUNK_CHATEAU = chunk_tags.CHATEAU
 # Questions sur le château / Viollet-le-Duc / restauration patrimoniale
 _QUERY_CHATEAU = re.compile(
     r"\b(ch[âa]teau|viollet|wyganowski|ouradou|restauration|restaur[eé]|m[eé]di[eé]val|patrimoine|"
@@ -534,13 +954,6 @@ _QUERY_CHATEAU = re.compile(
     r"inspecteur\s+des\s+travaux|genie\s*civil|architecte|architecture|moyen.?[aâ]ge)\b",
     re.IGNORECASE
 )
-# Chunk parle du château ou de Viollet-le-Duc ou des acteurs du chantier
-_CHUNK_CHATEAU = re.compile(
-    r"\b(ch[âa]teau|viollet|wyganowski|ouradou|restauration|restaur[eé]|fortification|donjon|rempart|"
-    r"patrimoine|monument|napoléon\s*III|m[eé]di[eé]val|gothic|inspecteur|chantier)\b",
-    re.IGNORECASE
-)
-
 # Questions sur sujets récurrents (logiciels, voirie, contrats) → inclure les PV récents (2025, 2024, 2023)
 _QUERY_RECENT_DELIB = re.compile(
     r"\b(logiciel|logiciels|horizon|contrat\s+m[eé]tier|renouvellement\s+contrat|"
@@ -548,6 +961,20 @@ _QUERY_RECENT_DELIB = re.compile(
     re.IGNORECASE
 )
 
+# Sous-requêtes fixes de search_agent : passages forcés selon le sujet de la question.
+# Leurs vecteurs sont calculés une fois au chargement du modèle (_QueryVectorCache).
+_KW_HORIZON_RECENT = ("logiciels métiers", "renouvellement contrat", "Horizon")
+_KW_HORIZON = ("Horizon", "logiciel", "logiciels")
+_KW_VOIRIE = ("voirie travaux", "voirie", "travaux", "crédit", "Armistice", "rue de l'Armistice")
+_KW_CANTINE = (
+    "Restauration scolaire tarification",
+    "tarification restauration scolaire",
+    "Ressources annuelles TARIF RESTAURATION",
+    "ACCUEIL REPAS TARIF RESTAURATION SCOLAIRE",
+)
+_KW_CHATEAU = ("Viollet-le-Duc", "restauration château", "château Pierrefonds", "fortification")
+_AGENT_SUBQUERIES = _KW_HORIZON_RECENT + _KW_HORIZON + _KW_VOIRIE + _KW_CANTINE + _KW_CHATEAU
+
 # Mots vides français exclus de la recherche exacte
 _STOP_FR = {
     'les', 'des', 'une', 'que', 'qui', 'est', 'pas', 'par', 'sur',
@@ -565,14 +992,21 @@ _STOP_FR = {
 # ── Recherche hybride pour l'agent (sémantique + exacte sur noms clés) ────────
 def search_agent(question: str, embeddings, documents, metadata,
                  n: int = 15, year_filter: list = None, bm25=None):
+    """Passages de l'agent pour `question` (voir _search_agent), en cache par question et filtres."""
+    question = _normalize_query(question)
+    # L'année courante entre dans la clé : les passes « deux dernières années » en dépendent
+    key = ("agent", question, _year_key(year_filter), n, bm25 is not None, datetime.now().year)
+    return _cached_retrieval(key, embeddings, lambda: _search_agent(
+        question, embeddings, documents, metadata, n=n, year_filter=year_filter, bm25=bm25))
+
+
+def _search_agent(question: str, embeddings, documents, metadata,
+                  n: int = 15, year_filter: list = None, bm25=None):
     """
     Combine recherche hybride (sémantique + BM25) et recherche exacte filtrée sur les noms
     significatifs de la question (sans mots vides ni mots de question).
     Bonus pour les chunks contenant des chiffres quand la question porte sur tarifs/montants.
     """
-    sem = search(question, embeddings, documents, metadata,
-                 n=n, year_filter=year_filter, exact=False, bm25=bm25)
-
     # Extraire uniquement les mots porteurs de sens (≥ 4 chars, hors stop words)
     raw = [t.strip("'\".,?!") for t in re.split(r'\W+', question)]
     sig = [t for t in raw
@@ -583,6 +1017,41 @@ def search_agent(question: str, embeddings, documents, metadata,
     query_wants_figures = bool(_QUERY_TARIF_MONTANT.search(question))
     query_wants_voirie = bool(_QUERY_RECENT_DELIB.search(question))  # travaux, voirie, etc.
     query_about_cantine = bool(re.search(r"\b(cantine|restauration\s+scolaire|restaurant\s+scolaire)\b", question, re.IGNORECASE))
+    query_about_horizon = bool(re.search(r"\b(logiciel|logiciels|horizon|renouvellement)\b", question, re.IGNORECASE))
+    query_about_chateau = bool(_QUERY_CHATEAU.search(question))
+    no_year_filter = year_filter is None or len(year_filter) == 0
+    recent_delib = no_year_filter and query_wants_voirie
+
+    # Toutes les sous-requêtes de la question (sémantique, exacte, par année, mots-clés des
+    # passes ci-dessous) sont cherchées en un lot : un seul appel au modèle, un produit
+    # matriciel et un passage BM25 pour toutes (search_many)
+    batch = []
+
+    def _plan(query: str, n_results: int, years, exact: bool) -> int:
+        batch.append((query, n_results, years, exact))
+        return len(batch) - 1
+
+    i_sem = _plan(question, n, year_filter, False)
+    i_exact = _plan(" ".join(sig), n, year_filter, True) if sig else None
+    i_years, i_horizon_recent, i_horizon, i_voirie, i_cantine, i_chateau = {}, [], [], [], [], []
+    if recent_delib:
+        i_years = {y: _plan(question, 12, [y], False) for y in (2025, 2024, 2023)}
+        if query_about_horizon:
+            i_horizon_recent = [_plan(kw, 10, [2025, 2024], True) for kw in _KW_HORIZON_RECENT]
+            i_horizon = [_plan(kw, 18, None, True) for kw in _KW_HORIZON]
+    if query_wants_voirie or query_wants_figures:
+        i_voirie = [_plan(kw, 10, year_filter, True) for kw in _KW_VOIRIE]
+    if query_about_cantine and no_year_filter:
+        i_cantine = [_plan(kw, 14, None, True) for kw in _KW_CANTINE]
+    if query_about_chateau:
+        i_chateau = [_plan(kw, 12, None, True) for kw in _KW_CHATEAU]
+    hits = search_many(batch, embeddings, documents, metadata, bm25=bm25)
+
+    # Étiquettes précalculées (chunk_tags) : les passages forcés ci-dessous sont choisis par
+    # masques ; seuls les textes des lignes retenues sont décodés
+    tags = _index_registry().tags_for(embeddings)
+    if tags is None:
+        tags = _compute_tags(documents, metadata)
 
     def _score_with_bonus(doc, meta, score):
         # Bonus si la question porte sur tarifs/montants et le passage contient des chiffres
@@ -598,60 +1067,55 @@ def search_agent(question: str, embeddings, documents, metadata,
         return (doc, meta, min(score, 1.0))
 
     seen: dict = {}
-    if sig:
-        focused = " ".join(sig)
-        exact = search(focused, embeddings, documents, metadata,
-                       n=n, year_filter=year_filter, exact=True, bm25=bm25)
-        for doc, meta, score in exact:
+
+    def _force(rows, limit: int, score_of) -> None:
+        # Ajoute les lignes `rows` (dans l'ordre) absentes de seen, au plus `limit`
+        added = 0
+        for i in rows.tolist():
+            if added >= limit:
+                break
+            meta = metadata[i]
+            key = (meta.get("filename", ""), meta.get("chunk", 0))
+            if key in seen:
+                continue
+            seen[key] = (documents[i], meta, score_of(i, meta))
+            added += 1
+
+    if i_exact is not None:
+        for doc, meta, score in hits[i_exact]:
             key = (meta.get("filename", ""), meta.get("chunk", 0))
             seen[key] = _score_with_bonus(doc, meta, score + 0.05)
 
-    for doc, meta, score in sem:
+    for doc, meta, score in hits[i_sem]:
         key = (meta.get("filename", ""), meta.get("chunk", 0))
         if key not in seen:
             seen[key] = _score_with_bonus(doc, meta, score)
 
     # Pour les questions sur logiciels, voirie, contrats : inclure des passages des PV récents (2025 prioritaire)
-    if (year_filter is None or len(year_filter) == 0) and _QUERY_RECENT_DELIB.search(question):
+    if recent_delib:
         year_bonus = {2025: 0.14, 2024: 0.09, 2023: 0.06}  # 2025 fortement favorisé pour donner la situation à jour
-        for y in (2025, 2024, 2023):
-            extra = search(question, embeddings, documents, metadata, n=12, year_filter=[y], exact=False, bm25=bm25)
-            for doc, meta, score in extra:
+        for y, i in i_years.items():
+            for doc, meta, score in hits[i]:
                 key = (meta.get("filename", ""), meta.get("chunk", 0))
                 if key not in seen:
                     seen[key] = _score_with_bonus(doc, meta, score + year_bonus[y])
         # Pour logiciels/Horizon : forcer l'inclusion de tous les chunks 2025 (puis 2024) qui parlent d'Horizon/logiciels,
         # pour que la réponse détaille la situation récente (2025) et pas seulement l'historique (ex. 2022).
-        if re.search(r"\b(logiciel|logiciels|horizon|renouvellement)\b", question, re.IGNORECASE):
+        if query_about_horizon:
             for y in (2025, 2024):
-                added_h = 0
-                for doc, meta in zip(documents, metadata):
-                    if added_h >= 25:
-                        break
-                    if meta.get("year") != str(y):
-                        continue
-                    if not str(meta.get("filename", "")).lower().endswith(".pdf"):
-                        continue
-                    if not _CHUNK_HORIZON.search(doc):
-                        continue
-                    key = (meta.get("filename", ""), meta.get("chunk", 0))
-                    if key in seen:
-                        continue
-                    # 2025 très prioritaire pour détailler la situation actuelle
-                    score_h = 0.58 if y == 2025 else 0.48
-                    seen[key] = (doc, meta, score_h)
-                    added_h += 1
+                year_rows = np.flatnonzero(tags.mask("pdf", "horizon") & _meta_mask(metadata, "year", str(y).__eq__))
+                # 2025 très prioritaire pour détailler la situation actuelle
+                score_h = 0.58 if y == 2025 else 0.48
+                _force(year_rows, 25, lambda i, meta: score_h)
             # Recherche sémantique ciblée en complément (2025/2024)
-            for kw in ("logiciels métiers", "renouvellement contrat", "Horizon"):
-                extra = search(kw, embeddings, documents, metadata, n=10, year_filter=[2025, 2024], exact=True, bm25=bm25)
-                for doc, meta, score in extra:
+            for i in i_horizon_recent:
+                for doc, meta, score in hits[i]:
                     key = (meta.get("filename", ""), meta.get("chunk", 0))
                     if key not in seen:
                         seen[key] = _score_with_bonus(doc, meta, score + 0.12)
             # Secours : inclure tout passage qui mentionne "Horizon" ou "logiciel" (toutes années).
-            for kw in ("Horizon", "logiciel", "logiciels"):
-                extra = search(kw, embeddings, documents, metadata, n=18, year_filter=None, exact=True, bm25=bm25)
-                for doc, meta, score in extra:
+            for i in i_horizon:
+                for doc, meta, score in hits[i]:
                     key = (meta.get("filename", ""), meta.get("chunk", 0))
                     if key not in seen:
                         y = meta.get("year") or ""
@@ -659,27 +1123,15 @@ def search_agent(question: str, embeddings, documents, metadata,
                         seen[key] = _score_with_bonus(doc, meta, score + bonus)
             # Force : parcourir toute la base et ajouter tout chunk qui mentionne Horizon/logiciel (PDF),
             # pour ne jamais exclure ces passages quand ils existent (ex. PV 2022).
-            added_any = 0
-            for doc, meta in zip(documents, metadata):
-                if added_any >= 35:
-                    break
-                if not str(meta.get("filename", "")).lower().endswith(".pdf"):
-                    continue
-                if not _CHUNK_HORIZON.search(doc):
-                    continue
-                key = (meta.get("filename", ""), meta.get("chunk", 0))
-                if key in seen:
-                    continue
+            def _score_force(i, meta):
                 y = meta.get("year") or ""
-                score_force = 0.50 if y == "2025" else 0.42 if y == "2024" else 0.35
-                seen[key] = (doc, meta, score_force)
-                added_any += 1
+                return 0.50 if y == "2025" else 0.42 if y == "2024" else 0.35
+            _force(np.flatnonzero(tags.mask("pdf", "horizon")), 35, _score_force)
 
     # Pour voirie/travaux/montant : forcer l'inclusion de chunks qui contiennent "voirie", "travaux", "crédit", "Armistice"
     if query_wants_voirie or query_wants_figures:
-        for exact_query in ("voirie travaux", "voirie", "travaux", "crédit", "Armistice", "rue de l'Armistice"):
-            exact_chunks = search(exact_query, embeddings, documents, metadata, n=10, year_filter=year_filter, exact=True, bm25=bm25)
-            for doc, meta, score in exact_chunks:
+        for i in i_voirie:
+            for doc, meta, score in hits[i]:
                 key = (meta.get("filename", ""), meta.get("chunk", 0))
                 if key not in seen:
                     # Priorité aux PDF (PV) et aux chunks avec des chiffres
@@ -689,16 +1141,10 @@ def search_agent(question: str, embeddings, documents, metadata,
                     seen[key] = _score_with_bonus(doc, meta, score + bonus)
 
     # Cantine / restauration scolaire : forcer l'inclusion de chunks "tarification" (évite la réponse vague)
-    if query_about_cantine and (year_filter is None or len(year_filter) == 0):
+    if query_about_cantine and no_year_filter:
         # Recherches exactes ciblées, très efficaces sur les titres de délibérations / tableaux
-        for exact_query in (
-            "Restauration scolaire tarification",
-            "tarification restauration scolaire",
-            "Ressources annuelles TARIF RESTAURATION",
-            "ACCUEIL REPAS TARIF RESTAURATION SCOLAIRE",
-        ):
-            exact_chunks = search(exact_query, embeddings, documents, metadata, n=14, year_filter=None, exact=True, bm25=bm25)
-            for doc, meta, score in exact_chunks:
+        for i in i_cantine:
+            for doc, meta, score in hits[i]:
                 key = (meta.get("filename", ""), meta.get("chunk", 0))
                 if key not in seen:
                     bonus = 0.10 if str(meta.get("filename", "")).lower().endswith(".pdf") else 0.05
@@ -709,37 +1155,24 @@ def search_agent(question: str, embeddings, documents, metadata,
                         bonus -= 0.06
                     seen[key] = _score_with_bonus(doc, meta, score + bonus)
 
-        # Secours : parcourir la base pour inclure des passages "Restauration scolaire : tarification ..."
-        added_cantine = 0
-        for doc, meta in zip(documents, metadata):
-            if added_cantine >= 30:
-                break
-            if not str(meta.get("filename", "")).lower().endswith(".pdf"):
-                continue
-            if not _CHUNK_CANTINE_TARIF.search(doc):
-                continue
-            # Éviter de sur-représenter la restauration de l'accueil de loisirs
-            if re.search(r"\baccueil\s+de\s+loisirs\b", doc, re.IGNORECASE) and not re.search(r"\brestauration\s+scolaire\b", doc, re.IGNORECASE):
-                continue
-            if not _CHUNK_HAS_NUMBER.search(doc):
-                continue
-            key = (meta.get("filename", ""), meta.get("chunk", 0))
-            if key in seen:
-                continue
-            seen[key] = (doc, meta, 0.54)
-            added_cantine += 1
+        # Secours : inclure des passages "Restauration scolaire : tarification ..." (PV, avec chiffres),
+        # sans sur-représenter la restauration de l'accueil de loisirs
+        loisirs_only = tags.mask("accueil_loisirs") & ~tags.mask("restauration_scolaire")
+        _force(np.flatnonzero(tags.mask("pdf", "cantine_tarif", "number") & ~loisirs_only), 30,
+               lambda i, meta: 0.54)
 
     # Expansion de contexte : pour chaque chunk trouvé, ajouter les voisins
     # immédiats (±1, ±2) du même fichier — capture les délibérations adjacentes
-    all_by_key = {
-        (m.get("filename", ""), m.get("chunk", 0)): (d, m)
-        for d, m in zip(documents, metadata)
-    }
+    # (lignes retrouvées par (fichier, n° de chunk), seuls les voisins sont décodés)
+    row_of = _row_locator(metadata)
     for (fname, chunk_idx), (_, _, score) in list(seen.items()):
         for delta in (-2, -1, 1, 2):
             nkey = (fname, chunk_idx + delta)
-            if nkey in all_by_key and nkey not in seen:
-                nd, nm = all_by_key[nkey]
+            if nkey in seen:
+                continue
+            row = row_of(fname, chunk_idx + delta)
+            if row is not None:
+                nd, nm = documents[row], metadata[row]
                 # Score décroissant avec la distance
                 neighbor_score = max(0.0, score - 0.05 * abs(delta))
                 seen[nkey] = (nd, nm, neighbor_score)
@@ -748,26 +1181,10 @@ def search_agent(question: str, embeddings, documents, metadata,
     # (PV) qui parlent de voirie/travaux ET de montants pour que l'agent puisse les citer.
     if query_wants_voirie or query_wants_figures:
         last_2_years = {str(datetime.now().year), str(datetime.now().year - 1)}
-        added_voirie = 0
-        for doc, meta in zip(documents, metadata):
-            if added_voirie >= 20:
-                break
-            fname = meta.get("filename", "")
-            if not str(fname).lower().endswith(".pdf"):
-                continue
-            if meta.get("year") not in last_2_years:
-                continue
-            if not _CHUNK_VOIRIE.search(doc):
-                continue
-            if not _CHUNK_HAS_NUMBER.search(doc):
-                continue
-            key = (fname, meta.get("chunk", 0))
-            if key in seen:
-                continue
-            # Priorité aux chunks qui contiennent un montant explicite (€, crédit, etc.)
-            score_voirie = 0.52 if _CHUNK_HAS_AMOUNT.search(doc) else 0.45
-            seen[key] = (doc, meta, score_voirie)
-            added_voirie += 1
+        recent_rows = np.flatnonzero(tags.mask("pdf", "voirie", "number")
+                                     & _meta_mask(metadata, "year", last_2_years.__contains__))
+        # Priorité aux chunks qui contiennent un montant explicite (€, crédit, etc.)
+        _force(recent_rows, 20, lambda i, meta: 0.52 if tags.has(i, "amount") else 0.45)
 
     # Quand la question porte sur les montants (travaux, voirie, budget) : ajouter les chunks
     # du même PV qui mentionnent des montants (€, crédit, HT, etc.) pour que le montant voté
@@ -777,58 +1194,38 @@ def search_agent(question: str, embeddings, documents, metadata,
         if str(meta.get("filename", "")).lower().endswith(".pdf")
     }
     if (query_wants_figures or query_wants_voirie) and pdf_files_in_context:
-        added = 0
         # Plus de chunks financiers du même PV pour les questions voirie/montants (réponse plus complète)
         max_extra_amount_chunks = 22 if query_wants_voirie else 12
-        for i, (doc, meta) in enumerate(zip(documents, metadata)):
-            if added >= max_extra_amount_chunks:
-                break
-            fname = meta.get("filename", "")
-            if fname not in pdf_files_in_context:
-                continue
-            key = (fname, meta.get("chunk", 0))
-            if key in seen:
-                continue
-            if not _CHUNK_HAS_AMOUNT.search(doc) or not _CHUNK_HAS_NUMBER.search(doc):
-                continue
-            seen[key] = (doc, meta, 0.38)
-            added += 1
+        # Répertoire des documents : lignes de chaque PV lues par tranche, sans parcourir la base
+        file_rows = _file_rows_locator(metadata)
+        context_rows = np.sort(np.concatenate([file_rows(f) for f in pdf_files_in_context]))
+        context_rows = tags.select(context_rows, "amount", "number")
+        _force(context_rows, max_extra_amount_chunks, lambda i, meta: 0.38)
 
     # Pour les questions sur le château / Viollet-le-Duc : forcer l'inclusion des chunks des
     # fichiers septentrion (livres openedition) qui traitent de l'histoire et de la restauration.
-    if _QUERY_CHATEAU.search(question):
-        added_ch = 0
-        for doc, meta in zip(documents, metadata):
-            if added_ch >= 30:
-                break
-            fname = str(meta.get("filename", ""))
-            # Cibler en priorité les fichiers septentrion puis tout chunk qui parle du château
-            is_septentrion = "septentrion" in fname.lower() or "chateau" in fname.lower()
-            if not (is_septentrion or _CHUNK_CHATEAU.search(doc)):
-                continue
-            key = (fname, meta.get("chunk", 0))
-            if key in seen:
-                continue
-            score_ch = 0.60 if is_septentrion else 0.45
-            seen[key] = (doc, meta, score_ch)
-            added_ch += 1
+    if query_about_chateau:
+        septentrion = _meta_mask(metadata, "filename",
+                                 lambda f: "septentrion" in f.lower() or "chateau" in f.lower())
+        # Cibler en priorité les fichiers septentrion puis tout chunk qui parle du château
+        _force(np.flatnonzero(septentrion | tags.mask("chateau")), 30,
+               lambda i, meta: 0.60 if septentrion[i] else 0.45)
         # Recherches exactes ciblées sur mots-clés château
-        for kw in ("Viollet-le-Duc", "restauration château", "château Pierrefonds", "fortification"):
-            extra = search(kw, embeddings, documents, metadata, n=12, year_filter=None, exact=True, bm25=bm25)
-            for doc, meta, score in extra:
+        for i in i_chateau:
+            for doc, meta, score in hits[i]:
                 key = (meta.get("filename", ""), meta.get("chunk", 0))
                 if key not in seen:
                     seen[key] = (doc, meta, score + 0.10)
 
     merged = sorted(seen.values(), key=lambda x: x[2], reverse=True)
     # Pour les questions sur le château : placer les chunks septentrion en tête
-    if _QUERY_CHATEAU.search(question):
+    if query_about_chateau:
         chateau_first = [x for x in merged if _CHUNK_CHATEAU.search(x[0]) or
                          "septentrion" in str(x[1].get("filename", "")).lower()]
         others = [x for x in merged if x not in chateau_first]
         merged = chateau_first + others
     # Pour les questions sur Horizon/logiciels : placer les passages qui en parlent en tête (2025 avant 2024 avant le reste).
-    if re.search(r"\b(logiciel|logiciels|horizon|renouvellement)\b", question, re.IGNORECASE):
+    if query_about_horizon:
         horizon_first = [x for x in merged if _CHUNK_HORIZON.search(x[0])]
         others = [x for x in merged if x not in horizon_first]
         # 2025 en premier, puis 2024, puis les autres années
@@ -998,30 +1395,86 @@ Sous le Second Empire : station thermale connue sous "Pierrefonds-les-Bains". De
    Ces sources sont valides et fiables pour l'histoire du château. Appuie-toi dessus en priorité \
    pour toute question sur la restauration, l'architecture ou l'histoire du château."""
 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+_SYSTEM_AGENT_HASH = hashlib.sha256(SYSTEM_AGENT.encode("utf-8")).hexdigest()[:16]
+
+
+# ── Cache des réponses du LLM (commun aux sessions) ───────────────────────────
+# Même question, mêmes passages → même réponse rejouée sans appel Groq (boutons d'exemple, bilans…).
+# ANSWER_CACHE_SIZE=0 désactive le cache ; ANSWER_CACHE_TTL en secondes. Couche disque sur
+# demande seulement (ANSWER_CACHE_DB=cache/answers.sqlite) : par défaut, un redémarrage repart à vide
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "128") or 0)
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", str(7 * 86400)) or 0) or None
+ANSWER_CACHE_DB = os.environ.get("ANSWER_CACHE_DB", "")
+ANSWER_CACHE_DISK_MAX = int(os.environ.get("ANSWER_CACHE_DISK_MAX", "1000") or 0)
+
 
-def ask_claude_stream(question: str, passages: list):
+class _AnswerCache:
     """
-    Générateur qui streame la réponse via l'API Groq (gratuite).
-    Lève ValueError si la clé API est manquante ou si groq n'est pas installé.
+    Réponses complètes du LLM par (modèle, prompt système, question, passages), avec le temps
+    de génération et les tokens de l'appel d'origine : stats() donne ce que les hits ont épargné.
     """
-    if not _GROQ_OK:
-        raise ValueError("Le package `groq` n'est pas installé. Lancez : `pip install groq`")
 
-    try:
-        api_key = st.secrets.get("GROQ_API_KEY", "")
-    except Exception:
-        api_key = ""
-    if not api_key:
-        raise ValueError(
-            "Clé API Groq manquante. "
-            "Ajoutez `GROQ_API_KEY = \"gsk_...\"` dans `.streamlit/secrets.toml`. "
-            "Clé gratuite sur : https://console.groq.com/keys"
-        )
+    def __init__(self, size: int, path: Path | None, ttl: float | None, max_disk_entries: int):
+        self._cache = result_cache.ResultCache(size, path, max_disk_entries, ttl=ttl)
+        self.size = size
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> str | None:
+        # La version est le modèle : les réponses d'un ancien GROQ_MODEL ne sont plus servies
+        value = self._cache.get(key, GROQ_MODEL)
+        if value is None:
+            return None
+        with self._lock:
+            self.saved_seconds += value.get("seconds", 0.0)
+            self.saved_tokens += value.get("tokens", 0)
+        return value["answer"]
+
+    def put(self, key: tuple, answer: str, seconds: float, tokens: int) -> None:
+        self._cache.put(key, GROQ_MODEL, {"answer": answer, "seconds": round(seconds, 3), "tokens": tokens})
+
+    def prune(self) -> None:
+        """Supprime les réponses d'un autre modèle que GROQ_MODEL."""
+        self._cache.prune({GROQ_MODEL})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._cache.stats(), "saved_seconds": self.saved_seconds, "saved_tokens": self.saved_tokens}
+
+
+@st.cache_resource
+def _answer_cache() -> _AnswerCache:
+    path = Path(ANSWER_CACHE_DB) if ANSWER_CACHE_DB and ANSWER_CACHE_SIZE else None
+    cache = _AnswerCache(ANSWER_CACHE_SIZE, path, ANSWER_CACHE_TTL, ANSWER_CACHE_DISK_MAX)
+    cache.prune()
+    return cache
+
+
+def _answer_key(question: str, passages: list, user_msg: str) -> tuple:
+    """Clé d'une réponse : modèle, prompt système, question, passages (fichier, chunk) et message envoyé."""
+    ids = [[meta.get("filename", ""), meta.get("chunk", -1)] for _, meta, _ in passages]
+    # Le message complet couvre le texte des passages (réindexation) et les consignes ajoutées
+    msg_hash = hashlib.sha256(user_msg.encode("utf-8")).hexdigest()[:16]
+    return ("answer", GROQ_MODEL, _SYSTEM_AGENT_HASH, question, ids, msg_hash)
 
+
+def ask_claude_stream(question: str, passages: list, use_cache: bool = True):
+    """
+    Générateur qui streame la réponse via l'API Groq (gratuite).
+    Une réponse déjà générée pour la même question et les mêmes passages est rejouée depuis
+    le cache (_answer_cache), sans appel à Groq ; use_cache=False force l'appel et n'enregistre
+    rien (baseline et tests de l'agent, qui doivent interroger le LLM).
+    Lève ValueError si la clé API est manquante ou si groq n'est pas installé.
+    """
     context_parts = []
     for i, (doc, meta, score) in enumerate(passages, 1):
         fname = meta.get("filename", "?")
-        context_parts.append(f"<source id=\"{i}\" fichier=\"{fname}\">\n{doc}\n</source>")
+        # Passage fusionné à l'indexation avec des copies quasi identiques (ingest.py) : les citer aussi
+        also = ", ".join(r.get("filename", "") for r in meta.get("sources", ()) if r.get("filename"))
+        also_attr = f" aussi=\"{also}\"" if also else ""
+        context_parts.append(f"<source id=\"{i}\" fichier=\"{fname}\"{also_attr}>\n{doc}\n</source>")
     context = "\n\n".join(context_parts)
 
     # Quand la question porte sur Horizon/logiciels et qu'au moins un passage en parle, forcer le LLM à s'en servir
@@ -1079,9 +1532,33 @@ def ask_claude_stream(question: str, passages: list):
         "Réponds à la question en te basant exclusivement sur ces passages."
     )
 
-    client = _Groq(api_key=api_key)
+    cache = _answer_cache()
+    key = _answer_key(question, passages, user_msg) if use_cache and cache.size else None
+    cached = cache.get(key) if key is not None else None
+    if cached is not None:
+        # Rejeu par lignes : l'appelant affiche la réponse comme un flux Groq
+        yield from cached.splitlines(keepends=True)
+        return
+
+    if not _GROQ_OK:
+        raise ValueError("Le package `groq` n'est pas installé. Lancez : `pip install groq`")
+
+    try:
+        api_key = st.secrets.get("GROQ_API_KEY", "")
+    except Exception:
+        api_key = ""
+    if not api_key:
+        raise ValueError(
+            "Clé API Groq manquante. "
+            "Ajoutez `GROQ_API_KEY = \"gsk_...\"` dans `.streamlit/secrets.toml`. "
+            "Clé gratuite sur : https://console.groq.com/keys"
+        )
+
+    from groq import Groq
+    client = Groq(api_key=api_key)
+    t0 = time.perf_counter()
     stream = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
+        model=GROQ_MODEL,
         max_tokens=3500,
         messages=[
             {"role": "system", "content": SYSTEM_AGENT},
@@ -1089,10 +1566,21 @@ def ask_claude_stream(question: str, passages: list):
         ],
         stream=True,
     )
+    parts, tokens = [], 0
     for chunk in stream:
+        # Dernier morceau du flux Groq : usage de l'appel dans x_groq (absent selon la version du SDK)
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            tokens = getattr(usage, "total_tokens", 0) or 0
+        if not chunk.choices:
+            continue
         content = chunk.choices[0].delta.content
         if content:
+            parts.append(content)
             yield content
+    # Flux terminé sans erreur ni abandon : seule une réponse complète est mise en cache
+    if key is not None and parts:
+        cache.put(key, "".join(parts), time.perf_counter() - t0, tokens)
 
 
 # ── Post-traitement : remplacement des références sources par des liens ─────────
@@ -1442,7 +1930,7 @@ def main():
     </script>
     """, height=0)
 
-    if not DB_DIR.exists():
+    if not index_store.index_exists(DB_DIR):
         st.error("Base vectorielle introuvable. Lancez d'abord : `python ingest.py`")
         st.stop()
 
@@ -1458,7 +1946,16 @@ def main():
     base_has_pdfs = len(_pv_filenames) > 0   # conservé pour compatibilité des conditions existantes
     if admin:
         base_desc = f"**{len(documents)} passages**" + (f" (dont {len(_pv_filenames)} PV/délibération(s))" if base_has_pdfs else " (sites web uniquement, PVs non indexés)")
-        st.caption(f"Base indexée : {base_desc} · 🔑 Mode admin")
+        qv = _query_vectors().stats()
+        rc = _retrieval_cache().stats()
+        ac = _answer_cache().stats()
+        st.caption(f"Base indexée : {base_desc} · vecteurs de requêtes en cache : {qv['hits']} hits / "
+                   f"{qv['misses']} misses ({qv['hit_rate']:.0%}) · résultats en cache : "
+                   f"{rc['hits'] + rc['disk_hits']} hits (dont {rc['disk_hits']} disque) / "
+                   f"{rc['misses']} misses ({rc['hit_rate']:.0%}) · réponses LLM rejouées : "
+                   f"{ac['hits'] + ac['disk_hits']} / {ac['hits'] + ac['disk_hits'] + ac['misses']} "
+                   f"({ac['expired']} expirées), {ac['saved_seconds']:.0f} s et "
+                   f"{ac['saved_tokens']} tokens Groq épargnés · 🔑 Mode admin")
 
     # ── Listes électorales ────────────────────────────────────────────────────
     listes_electorales = []  # [(nom_liste, [noms]), ...]
@@ -1823,6 +2320,8 @@ def main():
         # SECTION STATISTIQUES
         # ════════════════════════════════════════════════════════════════════════
         elif st.session_state["current_section"] == "stats":
+            import plotly.express as px
+            import plotly.graph_objects as go
             st.title("📊 Statistiques des séances du Conseil Municipal")
             stats_path = DB_DIR / "stats.json"
             if not stats_path.exists():
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+bm25_index.py — Index BM25 précalculé (matrice creuse terme × chunk, lue en mmap)
+
+Remplace la construction de rank_bm25.BM25Okapi à chaque démarrage de l'appli (tokenisation de
+tout le corpus) et son get_scores() en Python pur. ingest.py écrit, pour chaque terme, la liste
+des chunks qui le contiennent avec le poids BM25 déjà appliqué :
+
+    w(t, d) = idf(t) · tf · (k1 + 1) / (tf + k1 · (1 - b + b · |d| / avgdl))
+
+Le score d'une requête est alors la somme des lignes de ses termes (un produit creux
+requête × matrice). Mêmes formules et paramètres que BM25Okapi (k1 = 1.5, b = 0.75,
+idf négatif remplacé par epsilon × idf moyen, epsilon = 0.25) : mêmes scores, à l'arrondi
+float32 près.
+
+Fichiers, dans vector_db/ :
+    bm25_indptr.npy   int64 (nb termes + 1) : le terme t occupe [indptr[t], indptr[t+1])
+    bm25_docs.npy     int32 : numéros de chunk, croissants pour chaque terme
+    bm25_weights.npy  float32 : poids BM25 correspondants
+    bm25.json         version, paramètres, nb de chunks, vocabulaire (ordre des termes)
+
+Usage :
+    write_bm25(DB_DIR, documents)               # ingest.py
+    bm25 = load_bm25(DB_DIR, len(documents))    # None si absent ou périmé
+    scores = bm25.get_scores(tokenize(query))
+    scores = bm25.get_scores_many([tokenize(q) for q in queries])   # une ligne par requête
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+INDPTR_FILE  = "bm25_indptr.npy"
+DOCS_FILE    = "bm25_docs.npy"
+WEIGHTS_FILE = "bm25_weights.npy"
+META_FILE    = "bm25.json"
+
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+_SPLIT = re.compile(r"[^\w]+")
+
+
+def tokenize(text: str) -> list:
+    """Tokenisation simple pour BM25 : minuscules, split sur non-alphanumérique."""
+    return _SPLIT.split(text.lower())
+
+
+# ── Écriture ──────────────────────────────────────────────────────────────────
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def write_bm25(db_dir: Path, documents) -> None:
+    """Tokenise les chunks et écrit la matrice BM25 (bm25.json en dernier)."""
+    db_dir = Path(db_dir)
+    vocab = {}
+    term_ids, doc_ids, tfs = [], [], []
+    doc_len = np.zeros(len(documents), dtype=np.float64)
+    for d, doc in enumerate(documents):
+        tokens = tokenize(doc)
+        doc_len[d] = len(tokens)
+        counts = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            term_ids.append(vocab.setdefault(tok, len(vocab)))
+            doc_ids.append(d)
+            tfs.append(tf)
+
+    n = len(documents)
+    term_ids = np.array(term_ids, dtype=np.int64)
+    doc_ids = np.array(doc_ids, dtype=np.int32)
+    tfs = np.array(tfs, dtype=np.float64)
+
+    # idf (variante BM25Okapi) : les idf négatifs (terme dans plus de la moitié des chunks)
+    # sont remplacés par epsilon × idf moyen
+    df = np.bincount(term_ids, minlength=len(vocab)).astype(np.float64)
+    idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+    average_idf = float(idf.mean()) if len(idf) else 0.0
+    idf[idf < 0] = EPSILON * average_idf
+
+    avgdl = float(doc_len.mean()) if n else 0.0
+    norm = K1 * (1 - B + B * doc_len[doc_ids] / avgdl) if avgdl else np.full(len(doc_ids), K1)
+    weights = (idf[term_ids] * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32)
+
+    # Tri par terme (stable : les chunks restent croissants dans chaque liste)
+    order = np.argsort(term_ids, kind="stable")
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df.astype(np.int64), out=indptr[1:])
+    _save_npy(db_dir / INDPTR_FILE, indptr)
+    _save_npy(db_dir / DOCS_FILE, doc_ids[order])
+    _save_npy(db_dir / WEIGHTS_FILE, weights[order])
+
+    meta = {"format": FORMAT_VERSION, "k1": K1, "b": B, "epsilon": EPSILON,
+            "rows": n, "avgdl": avgdl, "average_idf": average_idf, "vocab": list(vocab)}
+    tmp = db_dir / (META_FILE + ".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, db_dir / META_FILE)
+
+
+# ── Lecture ───────────────────────────────────────────────────────────────────
+class BM25Index:
+    """Matrice BM25 creuse (listes par terme) ; get_scores() comme rank_bm25.BM25Okapi."""
+
+    def __init__(self, vocab: list, indptr: np.ndarray, docs: np.ndarray,
+                 weights: np.ndarray, rows: int):
+        self.term_ids = {t: i for i, t in enumerate(vocab)}
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.corpus_size = rows
+
+    def get_scores(self, query: list) -> np.ndarray:
+        """Score BM25 de chaque chunk pour la liste de tokens `query` (répétitions comptées)."""
+        scores = np.zeros(self.corpus_size, dtype=np.float32)
+        counts = {}
+        for tok in query:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, count in counts.items():
+            t = self.term_ids.get(tok)
+            if t is None:
+                continue
+            start, end = int(self.indptr[t]), int(self.indptr[t + 1])
+            docs = self.docs[start:end]
+            # Chunks distincts dans une liste : addition vectorisée sans collision
+            if count == 1:
+                scores[docs] += self.weights[start:end]
+            else:
+                scores[docs] += count * self.weights[start:end]
+        return scores
+
+    def get_scores_many(self, queries: list) -> np.ndarray:
+        """
+        get_scores pour plusieurs listes de tokens : scores (len(queries), nb de chunks). La
+        liste de chaque terme n'est lue qu'une fois, quel que soit le nombre de requêtes qui
+        le contiennent (produit creux requêtes × termes × chunks).
+        """
+        scores = np.zeros((len(queries), self.corpus_size), dtype=np.float32)
+        counts = {}      # terme → {requête : nb d'occurrences}
+        for k, query in enumerate(queries):
+            for tok in query:
+                per_query = counts.setdefault(tok, {})
+                per_query[k] = per_query.get(k, 0) + 1
+        for tok, per_query in counts.items():
+            t = self.term_ids.get(tok)
+            if t is None:
+                continue
+            start, end = int(self.indptr[t]), int(self.indptr[t + 1])
+            docs, weights = self.docs[start:end], self.weights[start:end]
+            for k, count in per_query.items():
+                scores[k, docs] += weights if count == 1 else count * weights
+        return scores
+
+
+def bm25_exists(db_dir: Path) -> bool:
+    """Vrai si db_dir contient les quatre fichiers de la matrice BM25."""
+    db_dir = Path(db_dir)
+    return all((db_dir / f).exists() for f in (META_FILE, INDPTR_FILE, DOCS_FILE, WEIGHTS_FILE))
+
+
+def load_bm25(db_dir: Path, rows: int) -> BM25Index | None:
+    """Ouvre la matrice BM25 (mmap). None si absente, d'une autre version ou périmée."""
+    db_dir = Path(db_dir)
+    if not bm25_exists(db_dir):
+        return None
+    meta = json.loads((db_dir / META_FILE).read_text(encoding="utf-8"))
+    if meta.get("format") != FORMAT_VERSION or meta.get("rows") != rows:
+        return None
+    if (meta.get("k1"), meta.get("b"), meta.get("epsilon")) != (K1, B, EPSILON):
+        return None
+    indptr = np.load(db_dir / INDPTR_FILE, mmap_mode="r")
+    docs = np.load(db_dir / DOCS_FILE, mmap_mode="r")
+    weights = np.load(db_dir / WEIGHTS_FILE, mmap_mode="r")
+    if len(indptr) != len(meta["vocab"]) + 1 or not (len(docs) == len(weights) == indptr[-1]):
+        return None
+    return BM25Index(meta["vocab"], indptr, docs, weights, rows)
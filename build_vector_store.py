@@ -1,19 +1,24 @@
 # -*- coding: utf-8 -*-
 """
 Construit une base vectorielle à partir de tous les PDF du dossier.
-Embeddings avec sentence-transformers (local). Stockage en .npz + .json (pas de ChromaDB).
+Embeddings avec sentence-transformers (local). Stockage (pas de ChromaDB) : embeddings.npy,
+texts.bin + text_offsets.npy, metadata.json — format index_store.save_simple_index, ouvert en
+mmap par query_vector_store.py et l'appli Django (une seule copie en mémoire pour tous les processus).
 """
 import re
-import json
 from pathlib import Path
 from pypdf import PdfReader
-import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from embedding_cache import EmbeddingCache
+import ann_index
+import index_store
+
 DOSSIER = Path(__file__).resolve().parent
 STORE_DIR = DOSSIER / "base_vectorielle"
-EMBEDDINGS_FILE = STORE_DIR / "embeddings.npz"
-META_FILE = STORE_DIR / "metadata.json"
+EMBED_CACHE_FILE = DOSSIER / "cache" / "embeddings.sqlite"
+EMBEDDINGS_FILE = STORE_DIR / index_store.EMBEDDINGS_FILE
+META_FILE = STORE_DIR / index_store.SIMPLE_META_FILE
 
 CHUNK_SIZE = 600
 CHUNK_OVERLAP = 150
@@ -50,8 +55,9 @@ def decouper_paragraphes(texte):
 def main():
     STORE_DIR.mkdir(exist_ok=True)
 
-    print("Chargement du modèle d'embeddings...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    def load_model():
+        print("Chargement du modèle d'embeddings...")
+        return SentenceTransformer(EMBEDDING_MODEL)
 
     pdfs = sorted(p for p in DOSSIER.glob("*.pdf") if p.is_file())
     all_docs = []
@@ -79,19 +85,22 @@ def main():
         return
 
     print(f"Génération des embeddings pour {len(all_docs)} segments...")
-    embeddings = model.encode(all_docs, show_progress_bar=True)
-    embeddings = np.array(embeddings, dtype=np.float32)
+    cache = EmbeddingCache(EMBED_CACHE_FILE, EMBEDDING_MODEL)
+    try:
+        embeddings = cache.encode(all_docs, load_model, batch_size=64, progress=True)
+    finally:
+        cache.close()
+    print(cache.stats_line())
 
-    np.savez_compressed(
-        EMBEDDINGS_FILE,
-        embeddings=embeddings,
-    )
-    with open(META_FILE, "w", encoding="utf-8") as f:
-        json.dump({"documents": all_docs, "metadatas": all_metadatas}, f, ensure_ascii=False, indent=0)
+    index_store.save_simple_index(STORE_DIR, embeddings, all_docs, all_metadatas)
+    # Index approché (IVF) lu par query_vector_store.py et web/search/vector_search.py
+    ivf = ann_index.write_ivf(STORE_DIR, embeddings)
 
     print(f"\nBase vectorielle créée : {STORE_DIR}")
-    print(f"  - {EMBEDDINGS_FILE.name}")
+    print(f"  - {EMBEDDINGS_FILE.name}, {index_store.TEXTS_FILE} + {index_store.OFFSETS_FILE}")
     print(f"  - {META_FILE.name}")
+    if ivf is not None:
+        print(f"  - {ann_index.IVF_FILE} ({ivf.nlist} groupes)")
     print(f"Segments indexés : {len(all_docs)}")
 
 
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+chunk_tags.py — Étiquettes précalculées des chunks (un masque de bits par chunk, lu en mmap)
+
+search_agent force l'inclusion de passages selon le sujet de la question (Horizon, cantine,
+voirie, château, montants…). Au lieu de tester les mêmes regex sur tout le corpus à chaque
+question, ingest.py les évalue une fois par chunk et écrit un entier uint16 par chunk, un bit
+par étiquette : les passes de l'agent deviennent des opérations sur des masques numpy, et
+seuls les textes des lignes retenues sont décodés.
+
+Fichiers, dans vector_db/ :
+    tags.npy    uint16 (nb de chunks) : bits des étiquettes de TAGS
+    tags.json   version, nb de chunks, étiquettes et signature des motifs
+
+Une base sans tags.npy, ou écrite avec d'autres motifs (signature différente), est étiquetée
+au chargement par l'appli (compute_tags : un passage sur les textes).
+
+Usage :
+    write_tags(DB_DIR, documents, filenames)        # ingest.py
+    tags = load_tags(DB_DIR, len(documents))        # None si absent ou périmé
+    rows = np.flatnonzero(tags.mask("pdf", "horizon"))
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+TAGS_FILE = "tags.npy"
+META_FILE = "tags.json"
+
+# ── Motifs (partagés avec app.py) ─────────────────────────────────────────────
+# Chunk contient au moins un nombre (améliore le ranking pour les questions tarifaires)
+HAS_NUMBER = re.compile(r"\d")
+# Chunk évoque un montant (€, crédit, HT, TTC, "euro") → à inclure quand on cherche les coûts des travaux
+HAS_AMOUNT = re.compile(
+    r"\d[\d\s]*(?:€|euro|euros|HT|TTC)|(?:crédit|montant|budget|alloué|ouvrir)[^\n]{0,80}\d|"
+    r"\d[\d\s]{2,}(?:\.\d{2})?\s*(?:€|euro)",
+    re.IGNORECASE
+)
+# Chunk parle de voirie / travaux publics (rue, chaussée, route)
+VOIRIE = re.compile(
+    r"\b(travaux|voirie|chauss[eé]e|route|rue|réfection|enrobé)\b",
+    re.IGNORECASE
+)
+# Chunk parle d'Horizon / logiciels métiers (pour prioriser ces passages en sortie)
+HORIZON = re.compile(
+    r"\b(horizon|logiciel|logiciels|renouvellement|villages\s*cloud|DETR)\b",
+    re.IGNORECASE
+)
+# Chunk parle explicitement des tarifs de restauration scolaire (cantine)
+CANTINE_TARIF = re.compile(
+    r"\b(restauration\s+scolaire)\b.{0,80}\b(tarification|tarifs|bar[eè]me)\b|"
+    r"\bRessources\s+annuelles\b.{0,80}\bTARIF\s+RESTAURATION\b",
+    re.IGNORECASE | re.DOTALL
+)
+# Chunk parle du château ou de Viollet-le-Duc ou des acteurs du chantier
+CHATEAU = re.compile(
+    r"\b(ch[âa]teau|viollet|wyganowski|ouradou|restauration|restaur[eé]|fortification|donjon|rempart|"
+    r"patrimoine|monument|napoléon\s*III|m[eé]di[eé]val|gothic|inspecteur|chantier)\b",
+    re.IGNORECASE
+)
+# Cantine : écarter les passages sur la restauration de l'accueil de loisirs
+ACCUEIL_LOISIRS = re.compile(r"\baccueil\s+de\s+loisirs\b", re.IGNORECASE)
+RESTAURATION_SCOLAIRE = re.compile(r"\brestauration\s+scolaire\b", re.IGNORECASE)
+
+# Étiquette → (bit, motif sur le texte) ; "pdf" porte sur le nom de fichier
+TAGS = {
+    "pdf":                   (1 << 0, None),
+    "number":                (1 << 1, HAS_NUMBER),
+    "amount":                (1 << 2, HAS_AMOUNT),
+    "voirie":                (1 << 3, VOIRIE),
+    "horizon":               (1 << 4, HORIZON),
+    "cantine_tarif":         (1 << 5, CANTINE_TARIF),
+    "chateau":               (1 << 6, CHATEAU),
+    "accueil_loisirs":       (1 << 7, ACCUEIL_LOISIRS),
+    "restauration_scolaire": (1 << 8, RESTAURATION_SCOLAIRE),
+}
+_TEXT_TAGS = [(bit, pattern) for bit, pattern in TAGS.values() if pattern is not None]
+
+
+def signature() -> str:
+    """Empreinte des étiquettes et de leurs motifs : change si un motif est modifié."""
+    spec = [(name, bit, pattern.pattern if pattern else "filename:.pdf", pattern.flags if pattern else 0)
+            for name, (bit, pattern) in TAGS.items()]
+    return hashlib.sha256(json.dumps(spec, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _bits(text: str, filename: str) -> int:
+    bits = TAGS["pdf"][0] if str(filename or "").lower().endswith(".pdf") else 0
+    for bit, pattern in _TEXT_TAGS:
+        if pattern.search(text):
+            bits |= bit
+    return bits
+
+
+def compute_tags(texts, filenames) -> np.ndarray:
+    """Bits des étiquettes de chaque chunk (texts et filenames : itérables alignés)."""
+    return np.fromiter((_bits(t, f) for t, f in zip(texts, filenames)), dtype=np.uint16)
+
+
+# ── Écriture ──────────────────────────────────────────────────────────────────
+def write_tags(db_dir: Path, texts, filenames) -> np.ndarray:
+    """Étiquette les chunks et écrit tags.npy puis tags.json. Retourne les bits."""
+    db_dir = Path(db_dir)
+    bits = compute_tags(texts, filenames)
+    tmp = db_dir / (TAGS_FILE + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, bits)
+    os.replace(tmp, db_dir / TAGS_FILE)
+    meta = {"format": FORMAT_VERSION, "rows": len(bits), "signature": signature(),
+            "tags": {name: bit for name, (bit, _) in TAGS.items()}}
+    tmp = db_dir / (META_FILE + ".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, db_dir / META_FILE)
+    return bits
+
+
+# ── Lecture ───────────────────────────────────────────────────────────────────
+class ChunkTags:
+    """Bits des étiquettes par chunk ; mask() donne le masque booléen d'une combinaison."""
+
+    def __init__(self, bits: np.ndarray):
+        self.bits = bits
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    @staticmethod
+    def _want(names: tuple) -> int:
+        want = 0
+        for name in names:
+            want |= TAGS[name][0]
+        return want
+
+    def mask(self, *names: str) -> np.ndarray:
+        """Lignes portant toutes les étiquettes `names`."""
+        want = self._want(names)
+        return (self.bits & want) == want
+
+    def select(self, rows: np.ndarray, *names: str) -> np.ndarray:
+        """Lignes de `rows` portant toutes les étiquettes `names` (seuls leurs bits sont lus)."""
+        want = self._want(names)
+        rows = np.asarray(rows, dtype=np.int64)
+        return rows[(self.bits[rows] & want) == want]
+
+    def has(self, row: int, name: str) -> bool:
+        return bool(int(self.bits[row]) & TAGS[name][0])
+
+
+def load_tags(db_dir: Path, rows: int) -> ChunkTags | None:
+    """Ouvre tags.npy (mmap). None si absent, d'une autre version, d'autres motifs ou périmé."""
+    db_dir = Path(db_dir)
+    if not (db_dir / TAGS_FILE).exists() or not (db_dir / META_FILE).exists():
+        return None
+    try:
+        meta = json.loads((db_dir / META_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != FORMAT_VERSION or meta.get("rows") != rows or meta.get("signature") != signature():
+        return None
+    bits = np.load(db_dir / TAGS_FILE, mmap_mode="r")
+    if len(bits) != rows:
+        return None
+    return ChunkTags(bits)
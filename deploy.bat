@@ -36,7 +36,7 @@ if errorlevel 1 (
 :: Preparation vector_db (flush OneDrive)
 if exist "%~dp0vector_db" (
     git update-index --refresh
-    python -c "import os; d=os.path.join(os.getcwd(),'vector_db'); [open(os.path.join(d,f),'rb').read(1) for f in ['documents.pkl','embeddings.npy','metadata.pkl','stats.json'] if os.path.exists(os.path.join(d,f))]" 2>nul
+    python -c "import os; [open(os.path.join(r,f),'rb').read(1) for r,_,fs in os.walk(os.path.join(os.getcwd(),'vector_db')) for f in fs]" 2>nul
     timeout /t 2 /nobreak >nul
 )
 
@@ -51,12 +51,16 @@ git rm -r --cached fetcher_raw   2>nul
 echo Staging des fichiers...
 git add -A
 
-:: Force-add vector_db (non ignore par defaut, mais on s'assure qu'il est inclus)
-if exist "%~dp0vector_db" (
-    git add -f "%~dp0vector_db\documents.pkl"
-    git add -f "%~dp0vector_db\embeddings.npy"
-    git add -f "%~dp0vector_db\metadata.pkl"
-    git add -f "%~dp0vector_db\stats.json"
+:: vector_db : seulement CURRENT, stats.json et la version servie. La version precedente
+:: (gardee sur disque pour un processus local en cours) et les anciennes ne sont pas commitees.
+if exist "%~dp0vector_db\CURRENT" (
+    set /p VDB_CURRENT=<"%~dp0vector_db\CURRENT"
+    git rm -r -q --cached --ignore-unmatch vector_db/versions
+    git add -f vector_db/CURRENT "vector_db/versions/!VDB_CURRENT!"
+    if exist "%~dp0vector_db\stats.json" git add -f vector_db/stats.json
+) else if exist "%~dp0vector_db" (
+    rem Disposition a plat (avant les versions) : tout le repertoire
+    git add -A -f "%~dp0vector_db"
 )
 echo Fichiers stages :
 git status --short
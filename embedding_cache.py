@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+embedding_cache.py — Cache disque des embeddings de chunks (SQLite)
+
+Clé : (nom du modèle, SHA-256 du texte du chunk) → vecteur float32 brut (non normalisé).
+Un chunk déjà encodé lors d'un run précédent n'est plus renvoyé au modèle : après
+modification d'un seul PV, seuls ses chunks nouveaux ou modifiés sont encodés.
+
+Éviction LRU : au-delà de `max_entries`, les entrées utilisées le moins récemment
+sont supprimées (EMBEDDING_CACHE_MAX pour changer la limite).
+
+Usage :
+    cache = EmbeddingCache(CACHE_DIR / "embeddings.sqlite", MODEL_NAME)
+    vectors = cache.encode(texts, load_model, batch_size=64)   # load_model() appelé seulement si besoin
+    for embs in cache.iter_encode(texts, load_model):         # ou lot par lot, mémoire bornée
+        ...
+    print(cache.stats_line())
+    cache.close()
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX", "150000"))
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hexadécimal du texte d'un chunk (UTF-8)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache persistant (model, hash du texte) → vecteur float32, avec compteurs de hits."""
+
+    def __init__(self, path: Path, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, "
+            "vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    # ── Lecture / écriture ────────────────────────────────────────────────────
+    def get_many(self, texts: list) -> list:
+        """Retourne pour chaque texte son vecteur float32 en cache, ou None (et met à jour last_used)."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        # Requêtes par paquets (limite SQLite sur le nombre de paramètres)
+        for i in range(0, len(hashes), 500):
+            part = hashes[i : i + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT text_hash, dim, vector FROM embeddings "
+                f"WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *part],
+            ).fetchall()
+            for h, dim, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(now, self.model_name, h) for h in found],
+            )
+            self._conn.commit()
+        result = [found.get(h) for h in hashes]
+        n_hit = sum(v is not None for v in result)
+        self.hits += n_hit
+        self.misses += len(result) - n_hit
+        return result
+
+    def put_many(self, texts: list, vectors) -> None:
+        """Enregistre les vecteurs (float32) des textes donnés."""
+        now = time.time()
+        rows = []
+        for t, v in zip(texts, vectors):
+            v = np.ascontiguousarray(v, dtype=np.float32)
+            rows.append((self.model_name, text_hash(t), int(v.shape[0]), v.tobytes(), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._conn.commit()
+
+    def iter_encode(self, texts: list, load_model, batch_size: int = 64):
+        """
+        Encode `texts` par lots de `batch_size` et produit, dans l'ordre, une matrice float32
+        (len(lot), dim) par lot. Seuls les absents du cache sont calculés ; `load_model` est une
+        fonction sans argument renvoyant le SentenceTransformer, appelée au premier absent seulement.
+        La mémoire reste bornée à un lot : l'appelant écrit chaque lot où il veut (ex. memmap).
+        """
+        model = None
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start : start + batch_size]
+            cached = self.get_many(batch)
+            missing = [i for i, v in enumerate(cached) if v is None]
+            if missing:
+                if model is None:
+                    model = load_model()
+                todo = [batch[i] for i in missing]
+                embs = np.asarray(model.encode(todo, show_progress_bar=False), dtype=np.float32)
+                self.put_many(todo, embs)
+                for i, v in zip(missing, embs):
+                    cached[i] = v
+            yield np.vstack(cached).astype(np.float32, copy=False)
+
+    def encode(self, texts: list, load_model, batch_size: int = 64, progress: bool = False) -> np.ndarray:
+        """
+        Encode `texts` en ne calculant que les absents du cache (voir `iter_encode`).
+        Retourne une matrice float32 (len(texts), dim) dans l'ordre des textes.
+        """
+        parts, done = [], 0
+        for embs in self.iter_encode(texts, load_model, batch_size):
+            parts.append(embs)
+            done += len(embs)
+            if progress:
+                print(f"  {done}/{len(texts)}", end="\r")
+        if progress and texts:
+            print()
+        if not parts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(parts)
+
+    # ── Maintenance ──────────────────────────────────────────────────────────
+    def evict(self) -> int:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_entries. Retourne le nombre supprimé."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        return excess
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats_line(self) -> str:
+        """Résumé lisible : hits, misses, taux de hit."""
+        return (f"cache embeddings : {self.hits} hit(s), {self.misses} miss(es), "
+                f"taux {self.hit_rate:.0%}")
+
+    def close(self) -> None:
+        """Applique l'éviction puis ferme la base."""
+        try:
+            self.evict()
+        finally:
+            self._conn.close()
@@ -52,7 +52,8 @@ def _collect_answer(question: str) -> str:
         raise RuntimeError(f"Aucun passage trouvé pour la question : {question!r}")
 
     chunks = []
-    for piece in app.ask_claude_stream(question, passages):
+    # Sans le cache des réponses : la baseline doit venir d'un vrai appel au LLM
+    for piece in app.ask_claude_stream(question, passages, use_cache=False):
         chunks.append(piece)
     full_text = "".join(chunks)
     # On applique le même post-traitement que dans l'UI (liens de sources + bloc Références)
@@ -0,0 +1,753 @@
+# -*- coding: utf-8 -*-
+"""
+index_store.py — Format disque de la base vectorielle (vector_db/)
+
+Remplace documents.pkl / metadata.pkl (listes Python dépicklées en entier dans chaque
+worker Streamlit) par un format versionné, ouvert en quelques millisecondes :
+
+    embeddings.npy     float32 (n, dim), ouvert en mmap
+    texts.bin          textes des chunks concaténés (UTF-8), ouvert en mmap
+    text_offsets.npy   int64 (n + 1) : le chunk i est texts.bin[off[i]:off[i+1]]
+    metadata.npz       colonnes de métadonnées (codes int32 des dictionnaires, entiers) et
+                       répertoires des documents (lignes de chaque fichier par n° de chunk)
+                       et des années (lignes de chaque année)
+    index.json         version du format, nb de lignes, dimension, dictionnaires
+                       (filename, rel_path, date, year, source_url), champs rares
+                       (ex. "sources") par ligne — écrit en dernier
+    embeddings_q.npy   (optionnel) copie quantifiée des embeddings : int8 (n, dim)
+                       + embeddings_scale.npy (float32, une échelle par ligne), ou float16
+
+`documents` et `metadata` restent utilisables comme des listes (len, indexation, tranches,
+itération) : les textes sont décodés et les dicts reconstruits à la demande. Les colonnes
+sont aussi exposées en tableaux numpy (metadata.column("year"), metadata.year_num) pour les
+filtres vectorisés ; metadata.file_rows(filename) / metadata.row_of(filename, chunk) lisent
+le répertoire des documents (une tranche par fichier), metadata.year_rows(années) celui des
+années. Un ancien vector_db/ (pickles) reste lisible. Les derniers textes lus sont
+gardés dans un petit cache LRU (TEXT_CACHE_SIZE) ; les parcours complets (documents.iter_rows,
+documents.contains_many) ne le remplissent pas et aucune liste de tous les textes n'est construite.
+
+Versions : ingest.py écrit chaque index dans un nouveau répertoire vector_db/versions/<id>/
+puis remplace atomiquement le pointeur vector_db/CURRENT (une ligne : <id>). Un lecteur ne voit
+donc jamais de fichiers à moitié écrits, et une appli en cours garde l'ancienne version ouverte
+(elle n'est supprimée qu'à l'ingestion suivante). Sans CURRENT, les fichiers sont lus
+directement dans vector_db/ (disposition à plat historique).
+
+La copie quantifiée sert à un premier tri approché (4× moins de mémoire en int8) ; seuls les
+meilleurs candidats sont rescorés sur les vecteurs float32 (QuantizedEmbeddings).
+
+Usage :
+    out_dir = new_version_dir(DB_DIR)                   # ingest.py : tout est écrit dans out_dir
+    save_quantized(out_dir, "int8")                     # après écriture de embeddings.npy
+    save_index(out_dir, documents, metadata, dim, quantization="int8")
+    publish_version(DB_DIR, out_dir)                    # bascule atomique du pointeur
+    embeddings, documents, metadata = load_index(DB_DIR)                  # version active
+    embeddings, documents, metadata = load_index(DB_DIR, quantized=True)  # + copie quantifiée
+    active_dir(DB_DIR)                                  # répertoire de la version active
+"""
+
+import bisect
+import itertools
+import json
+import mmap
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+EMBEDDINGS_FILE = "embeddings.npy"
+TEXTS_FILE      = "texts.bin"
+OFFSETS_FILE    = "text_offsets.npy"
+METADATA_FILE   = "metadata.npz"
+INDEX_FILE      = "index.json"
+QUANT_FILE       = "embeddings_q.npy"
+QUANT_SCALE_FILE = "embeddings_scale.npy"
+QUANTIZATIONS   = ("int8", "float16")
+LEGACY_FILES    = ("documents.pkl", "metadata.pkl")
+# Base simple (base_vectorielle/, build_vector_store.py) : métadonnées libres en JSON
+SIMPLE_META_FILE       = "metadata.json"
+SIMPLE_LEGACY_EMB_FILE = "embeddings.npz"
+VERSIONS_DIR    = "versions"
+CURRENT_FILE    = "CURRENT"
+# Textes décodés gardés en mémoire (passages récemment affichés), par processus
+TEXT_CACHE_SIZE = int(os.environ.get("TEXT_CACHE_SIZE", "256") or 0)
+# Taille des blocs de texts.bin mis en minuscules par les recherches de mots exacts
+SCAN_BLOCK = 4 << 20
+# Au-delà de ce nombre d'encodages d'un terme (2^k pour k lettres accentuées), le terme est
+# cherché par re.IGNORECASE sur les textes décodés plutôt que par bytes.find
+MAX_FOLDED_VARIANTS = 64
+
+# Champs texte encodés par dictionnaire (code -1 = champ absent)
+_DICT_FIELDS = ("filename", "rel_path", "date", "year", "source_url")
+# Champs entiers (toujours présents)
+_INT_FIELDS = ("chunk", "total_chunks")
+# Ordre des clés dans les dicts reconstruits (celui produit par ingest.py)
+_FIELD_ORDER = ("filename", "rel_path", "date", "year", "chunk", "total_chunks", "source_url", "is_table")
+
+
+def _year_num(year) -> int:
+    """Année entière (0 si l'année n'est pas numérique, ex. "web")."""
+    year = str(year)
+    return int(year) if year.isdigit() else 0
+
+
+# ── Versions (répertoires + pointeur CURRENT) ─────────────────────────────────
+def current_version(db_dir: Path) -> str | None:
+    """Nom de la version pointée par CURRENT (None : pas de pointeur, disposition à plat)."""
+    try:
+        name = (Path(db_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return name or None
+
+
+def active_dir(db_dir: Path) -> Path:
+    """Répertoire des fichiers de la version active (db_dir lui-même sans pointeur valide)."""
+    db_dir = Path(db_dir)
+    name = current_version(db_dir)
+    if name and (db_dir / VERSIONS_DIR / name).is_dir():
+        return db_dir / VERSIONS_DIR / name
+    return db_dir
+
+
+def new_version_dir(db_dir: Path) -> Path:
+    """Crée un répertoire de version vide (nom : date et heure, suffixe si déjà pris)."""
+    root = Path(db_dir) / VERSIONS_DIR
+    root.mkdir(parents=True, exist_ok=True)
+    base = time.strftime("%Y%m%d-%H%M%S")
+    for i in range(1000):
+        path = root / (base if i == 0 else f"{base}-{i}")
+        try:
+            path.mkdir()
+            return path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"Aucun nom de version libre dans {root}")
+
+
+def publish_version(db_dir: Path, version_dir: Path) -> str | None:
+    """Fait pointer CURRENT sur version_dir (remplacement atomique). Retourne l'ancienne version."""
+    previous = current_version(db_dir)
+    _replace_tmp(Path(db_dir) / CURRENT_FILE,
+                 lambda tmp: Path(tmp).write_text(Path(version_dir).name + "\n", encoding="utf-8"))
+    return previous
+
+
+def prune_versions(db_dir: Path, keep: set) -> list:
+    """
+    Supprime les répertoires de version absents de `keep` (versions remplacées, runs interrompus).
+    Un répertoire encore ouvert (Windows) est ignoré et retenté à l'ingestion suivante.
+    Retourne les noms supprimés.
+    """
+    root = Path(db_dir) / VERSIONS_DIR
+    removed = []
+    if not root.is_dir():
+        return removed
+    for path in sorted(root.iterdir()):
+        if path.is_dir() and path.name not in keep:
+            try:
+                shutil.rmtree(path)
+                removed.append(path.name)
+            except OSError:
+                pass
+    return removed
+
+
+# ── Écriture ──────────────────────────────────────────────────────────────────
+def _replace_tmp(path: Path, write) -> None:
+    """Écrit via `write(tmp)` dans un fichier temporaire puis le renomme (pas de fichier tronqué)."""
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_quantized(db_dir: Path, quantization: str | None, block: int = 8192) -> None:
+    """
+    Écrit la copie quantifiée de embeddings.npy (lots de `block` lignes, mémoire bornée).
+    int8 : quantification symétrique par ligne, x ≈ q × scale avec scale = max|x| / 127.
+    quantization=None supprime une copie existante.
+    """
+    db_dir = Path(db_dir)
+    if quantization is None:
+        for name in (QUANT_FILE, QUANT_SCALE_FILE):
+            (db_dir / name).unlink(missing_ok=True)
+        return
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantification inconnue : {quantization!r} (attendu : {', '.join(QUANTIZATIONS)})")
+    emb = np.load(db_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    n = emb.shape[0]
+    scale = np.ones(n, dtype=np.float32)
+
+    def _write_data(tmp):
+        dtype = np.int8 if quantization == "int8" else np.float16
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=emb.shape)
+        for i in range(0, n, block):
+            x = np.asarray(emb[i : i + block], dtype=np.float32)
+            if quantization == "int8":
+                s = np.maximum(np.abs(x).max(axis=1), 1e-12) / 127.0
+                out[i : i + block] = np.clip(np.rint(x / s[:, None]), -127, 127)
+                scale[i : i + block] = s
+            else:
+                out[i : i + block] = x
+        out.flush()
+        del out
+
+    _replace_tmp(db_dir / QUANT_FILE, _write_data)
+    del emb
+    if quantization == "int8":
+        def _write_scale(tmp):
+            with open(tmp, "wb") as f:
+                np.save(f, scale)
+
+        _replace_tmp(db_dir / QUANT_SCALE_FILE, _write_scale)
+    else:
+        (db_dir / QUANT_SCALE_FILE).unlink(missing_ok=True)
+
+
+def save_texts(db_dir: Path, documents) -> None:
+    """Écrit texts.bin (textes UTF-8 concaténés) puis text_offsets.npy (voir TextStore)."""
+    db_dir = Path(db_dir)
+    offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+
+    def _write_texts(tmp):
+        pos = 0
+        with open(tmp, "wb") as f:
+            for i, doc in enumerate(documents):
+                data = doc.encode("utf-8")
+                f.write(data)
+                pos += len(data)
+                offsets[i + 1] = pos
+
+    _replace_tmp(db_dir / TEXTS_FILE, _write_texts)
+
+    def _write_offsets(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, offsets)
+
+    _replace_tmp(db_dir / OFFSETS_FILE, _write_offsets)
+
+
+def group_rows(codes: np.ndarray, n_values: int, order: np.ndarray = None) -> tuple:
+    """
+    Lignes groupées par valeur d'un champ encodé par dictionnaire : (indptr, rows). Les lignes
+    de la valeur de code c occupent rows[indptr[c + 1] : indptr[c + 2]] (groupe 0 : champ
+    absent, code -1), triées par `order` puis par n° de ligne (par n° de ligne seul par défaut).
+    Répertoires de metadata.npz : documents (doc_*, par n° de chunk : le chunk précédent /
+    suivant d'une ligne est son voisin dans doc_rows) et années (year_*).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    keys = (codes,) if order is None else (order, codes)
+    rows = np.lexsort(keys).astype(np.int32)   # stable : doublons dans l'ordre des lignes
+    indptr = np.zeros(n_values + 2, dtype=np.int64)
+    np.cumsum(np.bincount(codes + 1, minlength=n_values + 1), out=indptr[1:])
+    return indptr, rows
+
+
+def save_index(db_dir: Path, documents: list, metadata: list, dim: int,
+               quantization: str | None = None) -> None:
+    """
+    Écrit textes + métadonnées au format colonnes puis index.json (en dernier : il valide
+    l'ensemble). embeddings.npy (et sa copie quantifiée, voir save_quantized) est écrit
+    par l'appelant (ingest.py, en streaming).
+    """
+    db_dir = Path(db_dir)
+    n = len(documents)
+    if len(metadata) != n:
+        raise ValueError(f"{n} textes pour {len(metadata)} métadonnées")
+
+    save_texts(db_dir, documents)
+
+    # Métadonnées : dictionnaires + colonnes d'entiers, champs rares à part
+    vocab = {f: {} for f in _DICT_FIELDS}
+    codes = {f: np.full(n, -1, dtype=np.int32) for f in _DICT_FIELDS}
+    ints = {f: np.zeros(n, dtype=np.int32) for f in _INT_FIELDS}
+    is_table = np.zeros(n, dtype=bool)
+    year_num = np.zeros(n, dtype=np.int16)
+    extras = {}
+    for i, meta in enumerate(metadata):
+        for key, value in meta.items():
+            if key in vocab and isinstance(value, str):
+                codes[key][i] = vocab[key].setdefault(value, len(vocab[key]))
+            elif key in ints and isinstance(value, int):
+                ints[key][i] = value
+            elif key == "is_table" and value is True:
+                is_table[i] = True
+            else:
+                extras.setdefault(str(i), {})[key] = value
+        year_num[i] = _year_num(meta.get("year", ""))
+
+    doc_indptr, doc_rows = group_rows(codes["filename"], len(vocab["filename"]), order=ints["chunk"])
+    year_indptr, year_rows = group_rows(codes["year"], len(vocab["year"]))
+
+    def _write_meta(tmp):
+        with open(tmp, "wb") as f:
+            np.savez(f, is_table=is_table, year_num=year_num, doc_indptr=doc_indptr, doc_rows=doc_rows,
+                     year_indptr=year_indptr, year_rows=year_rows,
+                     **{f"{k}_id": v for k, v in codes.items()}, **ints)
+
+    _replace_tmp(db_dir / METADATA_FILE, _write_meta)
+
+    index = {
+        "format": FORMAT_VERSION,
+        "rows": n,
+        "dim": int(dim),
+        "quantization": quantization,
+        "vocab": {f: list(v) for f, v in vocab.items()},
+        "extras": extras,
+    }
+    _replace_tmp(db_dir / INDEX_FILE, lambda tmp: Path(tmp).write_text(
+        json.dumps(index, ensure_ascii=False), encoding="utf-8"))
+
+
+def _folded_variants(term: str) -> list | None:
+    """
+    Encodages UTF-8 de `term`, lettres ASCII en minuscules, pour toutes les casses de ses
+    caractères non ASCII : chercher ces octets dans un texte passé par bytes.lower() équivaut
+    à re.search(re.escape(term), texte, re.IGNORECASE). None au-delà de MAX_FOLDED_VARIANTS
+    encodages (mot saisi avec beaucoup de lettres accentuées : 2^k combinaisons).
+    """
+    options = [sorted({v.encode("utf-8").lower() for v in (ch, ch.lower(), ch.upper()) if len(v) == 1})
+               for ch in term]
+    count = 1
+    for parts in options:
+        count *= len(parts)
+        if count > MAX_FOLDED_VARIANTS:
+            return None
+    return sorted({b"".join(parts) for parts in itertools.product(*options)})
+
+
+# ── Lecture ───────────────────────────────────────────────────────────────────
+class TextStore(Sequence):
+    """
+    Textes des chunks, décodés à la demande depuis texts.bin (mmap). documents[i] passe par un
+    petit cache LRU (TEXT_CACHE_SIZE textes : les passages affichés) ; les parcours complets
+    (itération, iter_rows) décodent sans remplir le cache. La mémoire occupée ne dépend
+    donc pas de la taille du corpus : les pages de texts.bin sont partagées entre processus.
+    """
+
+    def __init__(self, texts_path: Path, offsets: np.ndarray, cache_size: int = TEXT_CACHE_SIZE):
+        self._offsets = offsets
+        self._file = open(texts_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()   # sessions Streamlit = threads partageant le store
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _decode(self, i: int) -> str:
+        return self._buf[int(self._offsets[i]) : int(self._offsets[i + 1])].decode("utf-8")
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if not self._cache_size:
+            return self._decode(i)
+        with self._lock:
+            text = self._cache.get(i)
+            if text is not None:
+                self._cache.move_to_end(i)
+                return text
+        text = self._decode(i)
+        with self._lock:
+            self._cache[i] = text
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def __iter__(self):
+        buf, off = self._buf, self._offsets.tolist()
+        for i in range(len(off) - 1):
+            yield buf[off[i] : off[i + 1]].decode("utf-8")
+
+    def iter_rows(self, rows=None):
+        """(ligne, texte) pour les lignes `rows` (toutes par défaut), décodés un par un hors cache."""
+        if rows is None:
+            yield from enumerate(self)
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        buf = self._buf
+        # Bornes lues en une fois (plus rapide que l'accès numpy élément par élément)
+        for i, start, end in zip(rows.tolist(), self._offsets[rows].tolist(),
+                                 self._offsets[rows + 1].tolist()):
+            yield i, buf[start:end].decode("utf-8")
+
+    def contains_any(self, terms: list, rows=None) -> np.ndarray:
+        """
+        Masque des lignes dont le texte contient au moins un des `terms` (sans casse), comme
+        re.search("|".join(map(re.escape, terms)), texte, re.IGNORECASE) — calculé directement
+        sur les octets de texts.bin, sans décoder les textes. rows : lignes à examiner (les
+        autres restent à False).
+        """
+        return self.contains_many([terms], rows)[0]
+
+    def contains_many(self, term_lists: list, rows=None) -> np.ndarray:
+        """
+        contains_any pour plusieurs listes de termes en un seul parcours de texts.bin :
+        masques (len(term_lists), nb de chunks). Le fichier est lu par blocs de chunks entiers
+        (SCAN_BLOCK octets), passés une fois en minuscules ASCII ; chaque terme distinct y est
+        cherché par bytes.find (_folded_variants pour les casses des lettres accentuées) ; les
+        termes aux trop nombreuses variantes, par re.IGNORECASE sur les textes décodés.
+        """
+        masks = np.zeros((len(term_lists), len(self)), dtype=bool)
+        term_ids = {}      # terme → indice dans needles
+        owners = []        # pour chaque liste : indices de ses termes
+        for terms in term_lists:
+            owners.append([term_ids.setdefault(t, len(term_ids)) for t in terms])
+        needles = [_folded_variants(t) for t in term_ids]
+        hits = np.zeros((len(needles), len(self)), dtype=bool)
+        buf, off = self._buf, self._offsets
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            for i, start, end in zip(rows.tolist(), off[rows].tolist(), off[rows + 1].tolist()):
+                text = bytes(buf[start:end]).lower()
+                for t, variants in enumerate(needles):
+                    if variants is not None:
+                        hits[t, i] = any(v in text for v in variants)
+        elif any(v is not None for v in needles):
+            # Bornes des blocs : SCAN_BLOCK octets arrondis à la fin d'un chunk (une
+            # correspondance à cheval sur deux chunks ne compte pas)
+            cuts = np.searchsorted(off, np.arange(SCAN_BLOCK, int(off[-1]), SCAN_BLOCK), side="left")
+            bounds = [0, *sorted(set(cuts.tolist()) - {0, len(self)}), len(self)]
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                base = int(off[first])
+                local = (off[first : last + 1] - base).tolist()
+                text = bytes(buf[base : local[-1] + base]).lower()
+                for t, variants in enumerate(needles):
+                    if variants is None:
+                        continue
+                    row_hits = hits[t]
+                    for v in variants:
+                        pos = text.find(v)
+                        while pos >= 0:
+                            r = bisect.bisect_right(local, pos) - 1
+                            if pos + len(v) <= local[r + 1]:
+                                row_hits[first + r] = True
+                                pos = text.find(v, local[r + 1])   # chunk suivant
+                            else:
+                                pos = text.find(v, pos + 1)
+        slow = [(t, re.compile(re.escape(term), re.IGNORECASE))
+                for t, (term, variants) in enumerate(zip(term_ids, needles)) if variants is None]
+        if slow:
+            for i in range(len(self)) if rows is None else rows.tolist():
+                text = self._decode(i)
+                for t, pattern in slow:
+                    hits[t, i] = pattern.search(text) is not None
+        for k, ids in enumerate(owners):
+            if not ids:    # motif vide : tous les textes correspondent
+                masks[k, slice(None) if rows is None else rows] = True
+            elif len(ids) == 1:
+                masks[k] = hits[ids[0]]
+            else:
+                np.any(hits[ids], axis=0, out=masks[k])
+        return masks
+
+    def close(self) -> None:
+        """Libère le mmap (nécessaire sous Windows avant de remplacer texts.bin)."""
+        self._cache.clear()
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._file.close()
+
+
+class MetadataStore(Sequence):
+    """Métadonnées en colonnes ; metadata[i] reconstruit le dict de la ligne i."""
+
+    def __init__(self, columns: dict, vocab: dict, extras: dict):
+        self._n = len(columns["chunk"])
+        self._vocab = vocab
+        self._extras = {int(k): v for k, v in extras.items()}
+        self._codes = {f: columns[f"{f}_id"] for f in _DICT_FIELDS}
+        self._ints = {f: columns[f] for f in _INT_FIELDS}
+        self._is_table = columns["is_table"]
+        self._arrays = columns
+        #: Année entière de chaque ligne (0 si non numérique, ex. "web")
+        self.year_num = columns["year_num"]
+        self._directory = None   # voir _file_directory()
+        self._years = None       # répertoire des années : voir year_rows()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def column(self, field: str) -> np.ndarray:
+        """Valeurs d'une colonne pour toutes les lignes (chaînes : "" si absent)."""
+        if field in _DICT_FIELDS:
+            values = np.array(self._vocab[field] + [""], dtype=object)
+            return values[self._arrays[f"{field}_id"]]   # code -1 → dernier élément ""
+        return self._arrays[field]
+
+    def mask(self, field: str, predicate) -> np.ndarray:
+        """
+        Masque booléen des lignes dont le champ texte vérifie predicate(valeur) ("" si absent).
+        Le prédicat n'est évalué qu'une fois par valeur du dictionnaire, pas par ligne.
+        """
+        ok = np.array([bool(predicate(v)) for v in self._vocab[field] + [""]], dtype=bool)
+        return ok[self._codes[field]]
+
+    def _file_directory(self) -> tuple:
+        """(doc_indptr, doc_rows, n° de chunk de doc_rows, code de chaque nom de fichier)."""
+        if self._directory is None:
+            if "doc_rows" in self._arrays:
+                indptr, rows = self._arrays["doc_indptr"], self._arrays["doc_rows"]
+            else:   # base écrite avant le répertoire : calculé une fois au chargement
+                indptr, rows = group_rows(self._codes["filename"], len(self._vocab["filename"]),
+                                          order=self._ints["chunk"])
+            code_of = {v: c for c, v in enumerate(self._vocab["filename"])}
+            self._directory = (indptr, rows, self._ints["chunk"][rows], code_of)
+        return self._directory
+
+    def _file_span(self, filename: str) -> tuple:
+        """Bornes [début, fin) des lignes de `filename` dans doc_rows (vide si fichier inconnu)."""
+        indptr, _, _, code_of = self._file_directory()
+        code = code_of.get(filename, -1 if not filename else None)   # -1 : pas de nom de fichier
+        if code is None:
+            return 0, 0
+        return int(indptr[code + 1]), int(indptr[code + 2])
+
+    def file_rows(self, filename: str) -> np.ndarray:
+        """Lignes du fichier `filename`, par n° de chunk croissant (une tranche du répertoire)."""
+        start, end = self._file_span(filename)
+        return self._file_directory()[1][start:end]
+
+    def year_rows(self, years) -> np.ndarray:
+        """Lignes (croissantes) dont l'année est dans `years` : tranches du répertoire des années."""
+        if self._years is None:
+            if "year_rows" in self._arrays:
+                self._years = (self._arrays["year_indptr"], self._arrays["year_rows"])
+            else:
+                self._years = group_rows(self._codes["year"], len(self._vocab["year"]))
+        indptr, rows = self._years
+        wanted = {str(y) for y in years}
+        codes = [c for c, v in enumerate(self._vocab["year"]) if v in wanted]
+        parts = [rows[indptr[c + 1] : indptr[c + 2]] for c in codes]
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else rows[:0]
+
+    def row_of(self, filename: str, chunk: int) -> int | None:
+        """Ligne du chunk n° `chunk` du fichier `filename` (la dernière en cas de doublon), ou None."""
+        _, rows, chunks, _ = self._file_directory()
+        start, end = self._file_span(filename)
+        pos = start + int(np.searchsorted(chunks[start:end], chunk, side="right")) - 1
+        return int(rows[pos]) if pos >= start and chunks[pos] == chunk else None
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return self._row(i, self._codes, self._ints, self._is_table)
+
+    def _row(self, i: int, codes: dict, ints: dict, is_table) -> dict:
+        meta = {}
+        for field in _FIELD_ORDER:
+            if field in codes:
+                code = int(codes[field][i])
+                if code >= 0:
+                    meta[field] = self._vocab[field][code]
+            elif field in ints:
+                meta[field] = int(ints[field][i])
+            elif is_table[i]:
+                meta["is_table"] = True
+        extra = self._extras.get(i)
+        if extra:
+            meta.update(extra)
+        return meta
+
+    def __iter__(self):
+        # Colonnes converties une fois en listes pour le parcours complet (plus rapide que numpy élément par élément)
+        codes = {f: a.tolist() for f, a in self._codes.items()}
+        ints = {f: a.tolist() for f, a in self._ints.items()}
+        is_table = self._is_table.tolist()
+        for i in range(self._n):
+            yield self._row(i, codes, ints, is_table)
+
+
+class QuantizedEmbeddings:
+    """
+    Embeddings float32 (mmap) accompagnés de leur copie quantifiée. Se comporte comme la
+    matrice float32 (shape, indexation, `@`) ; approx_scores() calcule les similarités sur la
+    copie quantifiée, exact_scores() rescore quelques lignes en pleine précision.
+    """
+
+    def __init__(self, full: np.ndarray, data: np.ndarray, scale: np.ndarray | None):
+        self.full = full
+        self.data = data
+        self.scale = scale
+        self.quantization = "int8" if data.dtype == np.int8 else "float16"
+
+    @property
+    def shape(self) -> tuple:
+        return self.full.shape
+
+    @property
+    def dtype(self):
+        return self.full.dtype
+
+    def __len__(self) -> int:
+        return len(self.full)
+
+    def __getitem__(self, i):
+        return self.full[i]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.full, dtype=dtype)
+
+    def __matmul__(self, q):
+        return self.full @ q
+
+    def approx_scores(self, q: np.ndarray, block: int = 512, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Produits scalaires approchés data × q. Les lignes sont converties en float32 par lots
+        dans un tampon réutilisé : petit (512 × dim) pour rester dans le cache du processeur,
+        il rend ce passage plus rapide qu'un produit sur la matrice float32 complète.
+        q : un vecteur (dim,) → scores (n,), ou plusieurs requêtes (m, dim) → scores (n, m),
+        chaque lot converti une seule fois pour toutes les requêtes.
+        rows : lignes à scorer (triées), dans cet ordre ; les autres ne sont pas lues.
+        """
+        q = np.asarray(q, dtype=np.float32)
+        n = len(self.data) if rows is None else len(rows)
+        out = np.empty((n,) + q.shape[:-1], dtype=np.float32)
+        buf = np.empty((min(block, n), self.data.shape[1]), dtype=np.float32)
+        for i in range(0, n, block):
+            lot = buf[: min(block, n - i)]
+            np.copyto(lot, self.data[i : i + block] if rows is None else self.data[rows[i : i + block]],
+                      casting="unsafe")
+            np.dot(lot, q.T, out=out[i : i + len(lot)])
+        if self.scale is not None:
+            scale = self.scale if rows is None else self.scale[rows]
+            np.multiply(out, scale.reshape((n,) + (1,) * (q.ndim - 1)), out=out)
+        return out
+
+    def exact_scores(self, q: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Produits scalaires float32 pour les lignes `rows` (triées : accès mmap séquentiel)."""
+        return np.asarray(self.full[rows], dtype=np.float32) @ q
+
+
+def texts_exist(db_dir: Path) -> bool:
+    """Vrai si db_dir contient texts.bin et text_offsets.npy (écrits par save_texts)."""
+    return (Path(db_dir) / TEXTS_FILE).exists() and (Path(db_dir) / OFFSETS_FILE).exists()
+
+
+def load_texts(db_dir: Path) -> TextStore:
+    """Ouvre texts.bin + text_offsets.npy en lecture seule (mmap : pages partagées entre processus)."""
+    db_dir = Path(db_dir)
+    return TextStore(db_dir / TEXTS_FILE, np.load(db_dir / OFFSETS_FILE, mmap_mode="r"))
+
+
+def index_exists(db_dir: Path) -> bool:
+    """Vrai si db_dir contient une base lisible (nouveau format ou pickles historiques)."""
+    db_dir = active_dir(db_dir)
+    if not (db_dir / EMBEDDINGS_FILE).exists():
+        return False
+    return (db_dir / INDEX_FILE).exists() or all((db_dir / f).exists() for f in LEGACY_FILES)
+
+
+def load_index(db_dir: Path, mmap_embeddings: bool = True, quantized: bool = False) -> tuple:
+    """
+    Ouvre la base : (embeddings, documents, metadata). Lève FileNotFoundError si absente,
+    ValueError si les fichiers sont incohérents ou d'une version de format inconnue.
+    quantized=True : embeddings est un QuantizedEmbeddings si la base a une copie quantifiée.
+    db_dir peut être vector_db/ (version active, voir active_dir) ou un répertoire de version.
+    """
+    db_dir = active_dir(db_dir)
+    embeddings = np.load(db_dir / EMBEDDINGS_FILE, mmap_mode="r" if mmap_embeddings else None)
+    index_path = db_dir / INDEX_FILE
+    if not index_path.exists():
+        # Ancien format : pickles (documents.pkl, metadata.pkl)
+        with open(db_dir / "documents.pkl", "rb") as f:
+            documents = pickle.load(f)
+        with open(db_dir / "metadata.pkl", "rb") as f:
+            metadata = pickle.load(f)
+        return embeddings, documents, metadata
+
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    if index.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Format de base vectorielle inconnu : {index.get('format')!r}")
+    offsets = np.load(db_dir / OFFSETS_FILE, mmap_mode="r" if mmap_embeddings else None)
+    with np.load(db_dir / METADATA_FILE) as npz:
+        columns = {k: npz[k] for k in npz.files}
+    n = index["rows"]
+    if not (embeddings.shape[0] == len(offsets) - 1 == len(columns["chunk"]) == n):
+        raise ValueError("Base vectorielle incohérente (nombre de lignes différent entre fichiers)")
+    documents = TextStore(db_dir / TEXTS_FILE, offsets)
+    metadata = MetadataStore(columns, index["vocab"], index.get("extras", {}))
+    quantization = index.get("quantization")
+    if quantized and quantization in QUANTIZATIONS:
+        data = np.load(db_dir / QUANT_FILE, mmap_mode="r" if mmap_embeddings else None)
+        scale = (np.load(db_dir / QUANT_SCALE_FILE, mmap_mode="r" if mmap_embeddings else None)
+                 if quantization == "int8" else None)
+        if data.shape != embeddings.shape or (scale is not None and len(scale) != n):
+            raise ValueError("Copie quantifiée des embeddings incohérente avec embeddings.npy")
+        embeddings = QuantizedEmbeddings(embeddings, data, scale)
+    return embeddings, documents, metadata
+
+
+# ── Base simple (base_vectorielle/ : build_vector_store.py, Django, query_vector_store.py) ──
+def save_simple_index(store_dir: Path, embeddings: np.ndarray, documents: list, metadatas: list) -> None:
+    """
+    Écrit embeddings.npy, texts.bin + text_offsets.npy et metadata.json ({"metadatas": [...]},
+    en dernier). Les fichiers .npy / .bin s'ouvrent en mmap : les processus qui lisent la base
+    (workers Django, scripts) partagent une seule copie en mémoire.
+    """
+    store_dir = Path(store_dir)
+    if not (len(embeddings) == len(documents) == len(metadatas)):
+        raise ValueError("embeddings, documents et metadatas de longueurs différentes")
+
+    def _write_embeddings(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    _replace_tmp(store_dir / EMBEDDINGS_FILE, _write_embeddings)
+    save_texts(store_dir, documents)
+    _replace_tmp(store_dir / SIMPLE_META_FILE, lambda tmp: Path(tmp).write_text(
+        json.dumps({"metadatas": metadatas}, ensure_ascii=False, indent=0), encoding="utf-8"))
+    (store_dir / SIMPLE_LEGACY_EMB_FILE).unlink(missing_ok=True)
+
+
+def simple_index_exists(store_dir: Path) -> bool:
+    """Vrai si store_dir contient une base simple (format mmap ou historique .npz + .json)."""
+    store_dir = Path(store_dir)
+    if not (store_dir / SIMPLE_META_FILE).exists():
+        return False
+    return (store_dir / SIMPLE_LEGACY_EMB_FILE).exists() or (
+        (store_dir / EMBEDDINGS_FILE).exists() and texts_exist(store_dir))
+
+
+def load_simple_index(store_dir: Path) -> tuple:
+    """
+    Ouvre une base simple : (embeddings, documents, metadatas). embeddings et documents sont
+    en mmap (lecture seule) ; une base historique (embeddings.npz, textes dans metadata.json)
+    est chargée en mémoire.
+    """
+    store_dir = Path(store_dir)
+    with open(store_dir / SIMPLE_META_FILE, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if (store_dir / EMBEDDINGS_FILE).exists() and texts_exist(store_dir):
+        embeddings = np.load(store_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        documents = load_texts(store_dir)
+    else:
+        with np.load(store_dir / SIMPLE_LEGACY_EMB_FILE) as data:
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        documents = meta["documents"]
+    metadatas = meta["metadatas"]
+    if not (len(embeddings) == len(documents) == len(metadatas)):
+        raise ValueError("Base vectorielle incohérente (nombre de lignes différent entre fichiers)")
+    return embeddings, documents, metadatas
@@ -1,8 +1,14 @@
 """
 ingest.py — Indexe d'abord les .md (sites web), puis optionnellement les PDFs (PV, L'ECHO)
-Stockage : embeddings.npy + metadata.pkl + documents.pkl
-Usage    : python ingest.py           # .md puis PDFs
+Stockage : embeddings.npy + texts.bin / text_offsets.npy + metadata.npz + index.json
+           (format index_store.py) + manifest.json, dans un nouveau répertoire
+           vector_db/versions/<id>/ ; vector_db/CURRENT n'y pointe qu'une fois tout écrit
+Usage    : python ingest.py           # .md puis PDFs (incrémental)
            python ingest.py --md-only # uniquement .md (sites web)
+           python ingest.py --full    # ignore le manifest, réindexe tout
+
+- Incrémental : manifest.json mémorise le hash et la plage de lignes de chaque fichier source ;
+  seuls les fichiers ajoutés, modifiés ou supprimés sont retraités.
 
 - Tableaux PDF : extraction des tableaux (barèmes, tarifs cantine/périscolaire) via pdfplumber
   extract_tables(), en plus du texte ; chaque tableau est aussi indexé comme chunk dédié.
@@ -13,6 +19,9 @@ Pour les PDFs image (ex. L'ECHO), utilise l'OCR :
 """
 
 import argparse
+import hashlib
+import importlib.util
+import json
 import os
 import re
 import warnings
@@ -25,18 +34,33 @@ warnings.filterwarnings("ignore", message=".*Cannot parse.*")  # pdfplumber font
 import shutil
 import pickle
 import sys
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
 import pdfplumber
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from pathlib import Path
 
+from embedding_cache import EmbeddingCache
+import ann_index
+import bm25_index
+import chunk_tags
+import index_store
+
 # OCR pour PDFs image (L'ECHO) — Tesseract puis EasyOCR en secours
 _OCR_TESSERACT = False
 _OCR_EASYOCR = False
 _easyocr_reader = None
 
 try:
-    import fitz  # PyMuPDF
+    import fitz  # PyMuPDF : rendu des pages à OCR
+    _FITZ_OK = True
+except ImportError:
+    _FITZ_OK = False
+
+try:
     from PIL import Image
     import pytesseract
     if sys.platform == "win32":
@@ -56,11 +80,9 @@ except ImportError:
     pass
 
 if not _OCR_TESSERACT:
-    try:
-        import easyocr
-        _OCR_EASYOCR = True
-    except ImportError:
-        pass
+    # Détection sans import : easyocr charge torch, inutile aux workers d'extraction
+    # (sous Windows, chaque worker réimporte ingest.py) ; import dans _get_easyocr_reader()
+    _OCR_EASYOCR = importlib.util.find_spec("easyocr") is not None
 
 _OCR_AVAILABLE = _OCR_TESSERACT or _OCR_EASYOCR
 
@@ -72,10 +94,28 @@ IMAGES_DIR     = APP_DIR / "source" / "images"  # images a indexer par OCR direc
 KNOWLEDGE_DIR  = APP_DIR / "knowledge_sites"  # .md issus de fetch_sites.py (défaut)
 INPUT_DIR      = APP_DIR / "input"            # .md produits par transform.py
 DB_DIR         = APP_DIR / "vector_db"
+CACHE_DIR      = APP_DIR / "cache"            # caches locaux (non versionnés, hors vector_db/)
+EMBED_CACHE_FILE = CACHE_DIR / "embeddings.sqlite"
 MODEL_NAME     = "paraphrase-multilingual-MiniLM-L12-v2"
 CHUNK_SIZE     = 500    # caractères max par chunk (≈100 tokens, dans la limite du modèle MiniLM 128 tokens)
 CHUNK_OVERLAP  = 80     # recouvrement entre chunks (évite de couper tableaux/chiffres)
 
+# Processus d'extraction PDF en parallèle (--workers N ou INGEST_WORKERS, 1 = séquentiel)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+
+# Moteur d'extraction du texte des PDFs (--pdf-backend ou INGEST_PDF_BACKEND) :
+# "pdfplumber" (défaut) ou "pymupdf" (plus rapide ; pdfplumber reste utilisé pour les tableaux).
+PDF_BACKENDS   = ("pdfplumber", "pymupdf")
+PDF_BACKEND    = os.environ.get("INGEST_PDF_BACKEND", "pdfplumber").strip().lower()
+
+# Fusion des chunks quasi identiques (SimHash) : INGEST_DEDUP=0 pour desactiver
+DEDUP          = os.environ.get("INGEST_DEDUP", "1").strip().lower() in ("1", "true", "yes")
+
+# Copie quantifiee des embeddings pour le premier tri de la recherche (INGEST_QUANTIZE) :
+# "int8" (defaut, 4x moins de memoire), "float16", ou "0" pour ne pas l'ecrire.
+QUANTIZE       = os.environ.get("INGEST_QUANTIZE", "int8").strip().lower()
+QUANTIZE       = None if QUANTIZE in ("", "0", "none", "false", "no") else QUANTIZE
+
 # OCR des PDFs journal (L'ECHO) : tres lent en CPU. Actif par defaut. INGEST_OCR_JOURNAL=0 pour desactiver.
 OCR_JOURNAL    = os.environ.get("INGEST_OCR_JOURNAL", "1").strip().lower() in ("1", "true", "yes")
 
@@ -121,62 +161,189 @@ def extract_date(filename: str) -> tuple:
 
 
 # ── OCR pour PDFs image (L'ECHO) ───────────────────────────────────────────────
-def _ocr_tesseract(doc) -> list:
-    """OCR via Tesseract."""
-    pages_text = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=200, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        text = pytesseract.image_to_string(img, lang="fra+eng")
-        if text.strip():
-            pages_text.append(text.strip())
-    return pages_text
-
-
-def _ocr_easyocr(doc) -> list:
-    """OCR via EasyOCR (fallback, pas de binaire externe). Une page en erreur est ignorée."""
+# Seules les pages sans couche texte mais contenant une image (pages scannées, y compris
+# les annexes scannées d'un PV texte) sont OCRisées. Elles sont rendues avec fitz et
+# OCRisées en parallèle (une tâche par page). Chaque texte de page est mis en cache par
+# (hash du PDF, page, DPI, moteur) dans cache/ocr_pages.sqlite : un re-run ou une reprise
+# après crash ne refait jamais l'OCR d'une page déjà traitée.
+OCR_DPI = 200
+OCR_MIN_PAGE_CHARS = 20   # en dessous, une page avec image est considérée comme scannée
+OCR_CACHE_FILE = CACHE_DIR / "ocr_pages.sqlite"
+
+_worker_pdf = {}  # document fitz ouvert dans un worker OCR (réutilisé d'une page à l'autre)
+
+# Un seul pool OCR par run, ouvert à la première page à OCRiser et fermé par main() : les
+# workers gardent leur moteur (Reader EasyOCR et son modèle torch) d'un PDF à l'autre.
+# Le pool d'extraction peut tourner en même temps : l'OCR prend par défaut la moitié des
+# processus (INGEST_OCR_WORKERS pour changer), et au plus OCR_EASYOCR_MAX_WORKERS avec
+# EasyOCR (≈ 1 Go de mémoire par worker).
+OCR_WORKERS = int(os.environ.get("INGEST_OCR_WORKERS", "0") or 0)
+OCR_EASYOCR_MAX_WORKERS = 2
+_ocr_pool = None
+
+
+def _ocr_engine() -> str:
+    """Nom du moteur OCR utilisé pour les pages (fait partie de la clé du cache)."""
+    return "tesseract" if _OCR_TESSERACT else "easyocr"
+
+
+def _get_easyocr_reader():
     global _easyocr_reader
     if _easyocr_reader is None:
         import easyocr
         _easyocr_reader = easyocr.Reader(["fr", "en"], gpu=False, verbose=False)
-    pages_text = []
-    for page in doc:
+    return _easyocr_reader
+
+
+def _ocr_tesseract(pix) -> str:
+    """OCR via Tesseract d'une page rendue (pixmap fitz)."""
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return pytesseract.image_to_string(img, lang="fra+eng").strip()
+
+
+def _ocr_easyocr(pix) -> str:
+    """OCR via EasyOCR (pas de binaire externe) d'une page rendue (pixmap fitz)."""
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    result = _get_easyocr_reader().readtext(arr)
+    return " ".join(r[1] for r in result if r[1].strip()).strip()
+
+
+def _ocr_page(doc, page_no: int, dpi: int) -> tuple:
+    """OCR d'une page d'un document fitz ouvert → (n° de page, texte, erreur)."""
+    try:
+        pix = doc[page_no].get_pixmap(dpi=dpi, alpha=False)
+        text = _ocr_tesseract(pix) if _OCR_TESSERACT else _ocr_easyocr(pix)
+        return page_no, text, None
+    except Exception as e:
+        # Une page qui fait planter l'OCR est ignorée (ex. format particulier), sans être mise en cache
+        return page_no, "", repr(e)
+
+
+def _ocr_page_job(job: tuple) -> tuple:
+    """
+    (pdf_path, n° de page, dpi) → (n° de page, texte, erreur). Exécuté dans un worker OCR ;
+    le PDF reste ouvert entre deux pages du même fichier.
+    """
+    pdf_path, page_no, dpi = job
+    doc = _worker_pdf.get(pdf_path)
+    if doc is None:
+        for d in _worker_pdf.values():
+            d.close()
+        _worker_pdf.clear()
         try:
-            pix = page.get_pixmap(dpi=200, alpha=False)
-            arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
-            result = _easyocr_reader.readtext(arr)
-            text = " ".join(r[1] for r in result if r[1].strip())
-            if text.strip():
-                pages_text.append(text.strip())
-        except Exception:
-            # Une page qui fait planter EasyOCR est ignorée (ex. format particulier)
-            continue
-    return pages_text
+            doc = _worker_pdf[pdf_path] = fitz.open(pdf_path)
+        except Exception as e:
+            return page_no, "", repr(e)
+    return _ocr_page(doc, page_no, dpi)
+
+
+def _init_ocr_worker() -> None:
+    """Un seul thread de calcul par worker : le parallélisme vient des processus."""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except Exception:
+        pass
+
+
+def _ocr_pool_size(workers: int) -> int:
+    """Nombre de processus OCR pour un run à `workers` processus d'extraction."""
+    size = OCR_WORKERS or max(1, workers // 2)
+    if not _OCR_TESSERACT:
+        size = min(size, OCR_EASYOCR_MAX_WORKERS)
+    return max(1, size)
+
+
+def _get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ProcessPoolExecutor(max_workers=_ocr_pool_size(workers), initializer=_init_ocr_worker)
+    return _ocr_pool
+
+
+def close_ocr_pool() -> None:
+    """Arrête le pool OCR du run (s'il a été ouvert)."""
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown()
+        _ocr_pool = None
+
 
+class OcrPageCache:
+    """Cache SQLite du texte OCR par (hash du PDF, page, DPI, moteur)."""
 
-def extract_text_ocr(pdf_path: Path) -> list:
+    def __init__(self, path: Path | None = None):
+        path = Path(path or OCR_CACHE_FILE)   # lu à l'appel : OCR_CACHE_FILE peut être redéfini
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            "pdf_hash TEXT NOT NULL, page INTEGER NOT NULL, dpi INTEGER NOT NULL, "
+            "engine TEXT NOT NULL, text TEXT NOT NULL, "
+            "PRIMARY KEY (pdf_hash, page, dpi, engine))"
+        )
+        self._conn.commit()
+
+    def get(self, pdf_hash: str, dpi: int, engine: str) -> dict:
+        """Textes déjà OCRisés de ce PDF : {n° de page: texte}."""
+        rows = self._conn.execute(
+            "SELECT page, text FROM ocr_pages WHERE pdf_hash = ? AND dpi = ? AND engine = ?",
+            (pdf_hash, dpi, engine),
+        ).fetchall()
+        return dict(rows)
+
+    def put(self, pdf_hash: str, page: int, dpi: int, engine: str, text: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ocr_pages (pdf_hash, page, dpi, engine, text) VALUES (?, ?, ?, ?, ?)",
+            (pdf_hash, page, dpi, engine, text),
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def extract_text_ocr(pdf_path: Path, pages: list, pdf_hash: str | None = None, workers: int = 1) -> dict:
     """
-    Extrait le texte d'un PDF image via OCR.
-    Essaie Tesseract puis EasyOCR en secours.
+    OCR des pages `pages` (indices à partir de 0) d'un PDF, sur le pool OCR du run
+    (_ocr_pool_size(workers) processus). Les pages déjà présentes dans le cache OCR ne
+    sont pas retraitées ; en séquentiel le PDF n'est ouvert qu'une fois.
+    Retourne {n° de page: texte}.
     """
-    if not _OCR_AVAILABLE:
-        return []
+    if not _OCR_AVAILABLE or not _FITZ_OK or not pages:
+        return {}
+    pdf_hash = pdf_hash or file_hash(pdf_path)
+    engine = _ocr_engine()
+    cache = OcrPageCache()
     try:
-        doc = fitz.open(pdf_path)
-        pages_text = []
-        if _OCR_TESSERACT:
+        cached = cache.get(pdf_hash, OCR_DPI, engine)
+        texts = {i: cached[i] for i in pages if i in cached}
+        todo = [i for i in pages if i not in texts]
+
+        def _store(page_no, text, error):
+            texts[page_no] = text
+            if error is None:
+                cache.put(pdf_hash, page_no, OCR_DPI, engine, text)
+
+        if todo and (_ocr_pool_size(workers) <= 1 or len(todo) <= 1):
+            with fitz.open(pdf_path) as doc:
+                for i in todo:
+                    _store(*_ocr_page(doc, i, OCR_DPI))
+        elif todo:
+            pool = _get_ocr_pool(workers)
+            futures = [pool.submit(_ocr_page_job, (str(pdf_path), i, OCR_DPI)) for i in todo]
             try:
-                pages_text = _ocr_tesseract(doc)
-            except Exception:
-                pass
-        if not pages_text and _OCR_EASYOCR:
-            doc.close()
-            doc = fitz.open(pdf_path)
-            pages_text = _ocr_easyocr(doc)
-        doc.close()
-        return pages_text
-    except Exception:
-        return []
+                # Chaque page est mise en cache dès qu'elle est terminée (reprise après crash)
+                for fut in as_completed(futures):
+                    _store(*fut.result())
+            except BrokenProcessPool:
+                # Worker tué (mémoire…) : le PDF suivant repartira d'un pool neuf
+                close_ocr_pool()
+                raise
+    finally:
+        cache.close()
+    return texts
 
 
 def _ocr_image_file(img_path: Path) -> str:
@@ -195,14 +362,9 @@ def _ocr_image_file(img_path: Path) -> str:
         except Exception:
             pass
     if _OCR_EASYOCR:
-        global _easyocr_reader
         try:
-            import numpy as np
-            if _easyocr_reader is None:
-                import easyocr as _easyocr
-                _easyocr_reader = _easyocr.Reader(["fr", "en"], gpu=False, verbose=False)
             arr = np.array(img)
-            result = _easyocr_reader.readtext(arr)
+            result = _get_easyocr_reader().readtext(arr)
             return " ".join(r[1] for r in result if r[1].strip())
         except Exception:
             pass
@@ -222,26 +384,71 @@ def _table_to_text(table: list) -> str:
     return "\n".join(lines) if lines else ""
 
 
-def _extract_page_text_and_tables(page):
+def _is_ruling_grid(h_rules: set, v_rules: set) -> bool:
     """
-    Extrait le texte d'une page PDF et y ajoute le contenu des tableaux détectés.
-    Retourne (texte_complet, liste_des_texte_tableaux) pour permettre d'indexer
-    aussi chaque tableau comme chunk dédié (meilleure recherche tarifs/barèmes).
+    Au moins 3 filets horizontaux et 2 verticaux distincts : de quoi former un tableau
+    d'au moins deux lignes. Sans cela, la détection de tableaux (la partie la plus coûteuse
+    de l'extraction, qui ne trouve de toute façon que des tableaux à filets) est sautée.
     """
-    text = page.extract_text() or ""
-    table_texts = []
+    return len(h_rules) >= 3 and len(v_rules) >= 2
+
+
+def _plumber_has_ruling_grid(page) -> bool:
+    """Filets (lignes, bords de rectangles) d'une page pdfplumber."""
+    edges = page.edges
+    h_rules = {round(e["top"]) for e in edges if e["orientation"] == "h"}
+    v_rules = {round(e["x0"]) for e in edges if e["orientation"] == "v"}
+    return _is_ruling_grid(h_rules, v_rules)
+
+
+def _fitz_has_ruling_grid(page) -> bool:
+    """Filets (lignes, bords de rectangles) des dessins vectoriels d'une page PyMuPDF."""
+    h_rules, v_rules = set(), set()
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) >= 3:
+                    h_rules.add(round(p1.y))
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) >= 3:
+                    v_rules.add(round(p1.x))
+            elif item[0] == "re":
+                r = item[1]
+                if r.width >= 3:
+                    h_rules.update((round(r.y0), round(r.y1)))
+                if r.height >= 3:
+                    v_rules.update((round(r.x0), round(r.x1)))
+    return _is_ruling_grid(h_rules, v_rules)
+
+
+def _page_tables(page) -> list:
+    """Textes des tableaux détectés par pdfplumber sur une page."""
     try:
         tables = page.extract_tables() or []
     except Exception:
         tables = []
+    table_texts = []
     for tbl in tables:
         if not tbl:
             continue
         table_text = _table_to_text(tbl)
         if table_text.strip():
-            text += "\n\n[Tableau]\n" + table_text
             # Chunks dédiés aux tableaux pour améliorer la recherche "tarif cantine", "barème"
             table_texts.append(table_text)
+    return table_texts
+
+
+def _extract_page_text_and_tables(page, gate_tables: bool = True):
+    """
+    Extrait le texte d'une page PDF et y ajoute le contenu des tableaux détectés.
+    Retourne (texte_complet, liste_des_texte_tableaux) pour permettre d'indexer
+    aussi chaque tableau comme chunk dédié (meilleure recherche tarifs/barèmes).
+    `gate_tables` : ne chercher de tableaux que sur les pages avec des filets.
+    """
+    text = page.extract_text() or ""
+    table_texts = _page_tables(page) if not gate_tables or _plumber_has_ruling_grid(page) else []
+    for table_text in table_texts:
+        text += "\n\n[Tableau]\n" + table_text
     return text.strip(), table_texts
 
 
@@ -269,6 +476,484 @@ def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP)
     return [c for c in chunks if len(c) > 80]
 
 
+# ── Extraction d'un fichier source → (chunks, métadonnées) ─────────────────────
+_IMAGE_EXT = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".webp"}
+
+
+def _extract_md(md_path: Path) -> tuple:
+    """Découpe un .md (site web) en chunks. Retourne (docs, metadatas), vides si rien à indexer."""
+    raw = md_path.read_text(encoding="utf-8")
+    source_url = ""
+    for line in raw.split("\n")[:10]:
+        if line.strip().lower().startswith("source :"):
+            source_url = line.split(":", 1)[-1].strip()
+            break
+    if "---" in raw:
+        content = raw.split("---", 1)[-1].strip()
+    else:
+        content = raw
+    chunks = chunk_text(content)
+    if not chunks and len(content) > 80:
+        chunks = [content]
+    label = f"[Web] {md_path.stem}"
+    metas = []
+    for i in range(len(chunks)):
+        meta = {
+            "filename": label,
+            "rel_path": source_url or md_path.name,
+            "date": "web",
+            "year": "web",
+            "chunk": i,
+            "total_chunks": len(chunks),
+        }
+        if source_url:
+            meta["source_url"] = source_url
+        metas.append(meta)
+    return chunks, metas
+
+
+def _extract_image(img_path: Path) -> tuple:
+    """OCR d'une image de source/images/. Retourne (docs, metadatas, message)."""
+    text = _ocr_image_file(img_path)
+    if not text:
+        return [], [], "aucun texte"
+    chunks = chunk_text(text)
+    if not chunks and len(text) > 80:
+        chunks = [text]
+    if not chunks:
+        return [], [], "aucun chunk"
+    date_iso, year = extract_date(img_path.name)
+    metas = [{
+        "filename": img_path.name,
+        "rel_path": f"source/images/{img_path.name}",
+        "date": date_iso,
+        "year": year,
+        "chunk": i,
+        "total_chunks": len(chunks),
+    } for i in range(len(chunks))]
+    return chunks, metas, f"{len(chunks)} chunks"
+
+
+def _read_pdf_pdfplumber(pdf_path: Path, gate_tables: bool = True) -> tuple:
+    """Lecture pdfplumber (texte + tableaux). Voir _read_pdf."""
+    with pdfplumber.open(pdf_path) as pdf:
+        pages_text = []
+        all_table_texts = []
+        scanned = []
+        for i, p in enumerate(pdf.pages):
+            page_content, table_texts = _extract_page_text_and_tables(p, gate_tables)
+            pages_text.append(page_content)
+            all_table_texts.extend(table_texts)
+            if len(page_content) < OCR_MIN_PAGE_CHARS and p.images:
+                scanned.append(i)
+        return pages_text, all_table_texts, scanned
+
+
+def _read_pdf_pymupdf(pdf_path: Path, gate_tables: bool = True) -> tuple:
+    """
+    Lecture PyMuPDF pour le texte ; pdfplumber n'est ouvert que si une page a des filets,
+    et seulement pour les tableaux de ces pages. Voir _read_pdf.
+    """
+    pages_text, scanned, table_pages = [], [], []
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            pages_text.append(page.get_text(sort=True).strip())
+            if len(pages_text[-1]) < OCR_MIN_PAGE_CHARS and page.get_images():
+                scanned.append(i)
+            if not gate_tables or _fitz_has_ruling_grid(page):
+                table_pages.append(i)
+    all_table_texts = []
+    if table_pages:
+        with pdfplumber.open(pdf_path) as pdf:
+            for i in table_pages:
+                table_texts = _page_tables(pdf.pages[i])
+                for table_text in table_texts:
+                    pages_text[i] += "\n\n[Tableau]\n" + table_text
+                pages_text[i] = pages_text[i].strip()
+                all_table_texts.extend(table_texts)
+    return pages_text, all_table_texts, scanned
+
+
+def _read_pdf(pdf_path: Path, backend: str | None = None, gate_tables: bool = True) -> tuple:
+    """
+    Texte + tableaux d'un PDF, page par page, avec le moteur `backend` (défaut : PDF_BACKEND).
+    Retourne (texte de chaque page, "" si vide ; tableaux ; indices des pages à OCRiser).
+    Une page est à OCRiser si sa couche texte est (quasi) vide et qu'elle contient une image.
+    """
+    backend = backend or PDF_BACKEND
+    if backend == "pymupdf" and _FITZ_OK:
+        return _read_pdf_pymupdf(pdf_path, gate_tables)
+    return _read_pdf_pdfplumber(pdf_path, gate_tables)
+
+
+def _extract_pdf(pdf_path: Path, read: tuple | None = None, pdf_hash: str | None = None,
+                 workers: int = 1) -> tuple:
+    """
+    Découpe en chunks le texte + les tableaux d'un PDF, avec OCR (page-parallèle) en secours.
+    `read` : résultat de _read_pdf déjà calculé (par un worker), sinon le PDF est lu ici.
+    Retourne (docs, metadatas, message) ; docs vide si le PDF est ignoré.
+    """
+    date_iso, year = extract_date(pdf_path.name)
+    is_journal = "journal" in str(pdf_path).replace("\\", "/")
+    rel_path = f"journal/{pdf_path.name}" if is_journal else pdf_path.name
+    log = []
+
+    pages_text, all_table_texts, scanned = read if read is not None else _read_pdf(pdf_path)
+    has_text = any(pages_text)
+    if not has_text:
+        # PDF entièrement image : toutes les pages vides sont OCRisées, même sans image détectée
+        scanned = [i for i, t in enumerate(pages_text) if not t]
+
+    if scanned and _OCR_AVAILABLE:
+        if is_journal and not OCR_JOURNAL:
+            if not has_text:
+                return [], [], "ignore (OCR journaux desactive, INGEST_OCR_JOURNAL=0 pour desactiver)"
+        else:
+            try:
+                ocr_texts = extract_text_ocr(pdf_path, scanned, pdf_hash=pdf_hash, workers=workers)
+                n_ocr = sum(bool(t.strip()) for t in ocr_texts.values())
+                for i, t in ocr_texts.items():
+                    if t.strip():
+                        pages_text[i] = t
+                if n_ocr:
+                    log.append("OCR" if not has_text else f"OCR {n_ocr} page(s)")
+            except Exception as e:
+                log.append(f"OCR echoue ({e!r})")
+    pages_text = [t for t in pages_text if t.strip()]
+
+    if not pages_text:
+        if not _OCR_AVAILABLE:
+            log.append("aucun texte (PDF scanne ? pip install easyocr pour l'OCR)")
+        else:
+            log.append("aucun texte (OCR echoue ?)")
+        return [], [], " ... ".join(log)
+
+    full_text = "\n".join(pages_text)
+    chunks = chunk_text(full_text)
+    if not chunks and len(full_text) > 80:
+        chunks = [full_text]
+    total_chunks = len(chunks) + len(all_table_texts)
+    if all_table_texts:
+        log.append(f"{len(chunks)} chunks + {len(all_table_texts)} tableau(x)")
+    else:
+        log.append(f"{len(chunks)} chunks")
+
+    docs, metas = [], []
+    for i, chunk in enumerate(chunks):
+        docs.append(chunk)
+        metas.append({
+            "filename": pdf_path.name,
+            "rel_path": rel_path,
+            "date": date_iso,
+            "year": year,
+            "chunk": i,
+            "total_chunks": total_chunks,
+        })
+    # Chunks dédiés aux tableaux (barèmes, tarifs) pour améliorer la recherche sémantique
+    for j, table_str in enumerate(all_table_texts):
+        if len(table_str.strip()) < 20:
+            continue
+        docs.append("[Tableau] " + table_str.strip())
+        metas.append({
+            "filename": pdf_path.name,
+            "rel_path": rel_path,
+            "date": date_iso,
+            "year": year,
+            "chunk": len(chunks) + j,
+            "total_chunks": total_chunks,
+            "is_table": True,
+        })
+    return docs, metas, " ... ".join(log)
+
+
+def _read_pdf_job(pdf_path: Path, backend: str | None = None) -> tuple:
+    """Point d'entrée des workers : ne lève jamais. Retourne (résultat de _read_pdf | None, erreur)."""
+    try:
+        return _read_pdf(pdf_path, backend), None
+    except Exception as e:
+        return None, f"ERREUR : {e}"
+
+
+def _iter_pdf_reads(pdf_paths: list, workers: int, backend: str | None = None):
+    """
+    Lit les PDFs (pdfplumber / PyMuPDF, mono-cœur) dans un pool de `workers` processus.
+    Les résultats sont produits dans l'ordre de `pdf_paths` : all_docs / all_metadatas
+    sont identiques à ceux d'un run séquentiel. workers <= 1 → lecture dans ce processus.
+    L'OCR éventuel est fait ensuite par le processus principal, parallélisé par page.
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        for p in pdf_paths:
+            yield _read_pdf_job(p, backend)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths))) as pool:
+        # backend passé explicitement : sous Windows (spawn) les workers ne voient pas --pdf-backend
+        yield from pool.map(_read_pdf_job, pdf_paths, [backend] * len(pdf_paths))
+
+
+# ── Fusion des chunks quasi identiques (SimHash) ───────────────────────────────
+# Un même texte peut être indexé plusieurs fois : PV en .pdf et en .md (transform.py),
+# pages web qui se recoupent, tableaux repris d'un PV à l'autre. Chaque chunk reçoit une
+# empreinte SimHash 64 bits calculée sur ses triplets de mots. Deux chunks à au plus
+# DEDUP_MAX_DISTANCE bits d'écart et contenant exactement les mêmes nombres (montants,
+# dates : deux barèmes d'années différentes ne sont jamais fusionnés) ne forment qu'une
+# ligne ; elle garde la référence des autres copies dans meta["sources"].
+DEDUP_MAX_DISTANCE = 3
+_DEDUP_BANDS = 4          # 4 bandes de 16 bits : ≤ 3 bits d'écart → au moins une bande identique
+_DEDUP_PRIORITY = {"pdf": 0, "image": 1, "md": 2}   # copie gardée : PDF d'abord (lien cliquable, date)
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+")
+_SIMHASH_BITS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """Empreinte SimHash 64 bits d'un texte (triplets de mots en minuscules)."""
+    words = _WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i : i + 3]) for i in range(max(1, len(words) - 2))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "little")
+         for sh in shingles],
+        dtype=np.uint64,
+    )
+    votes = ((hashes[:, None] & _SIMHASH_BITS) != 0).sum(axis=0)
+    return int(_SIMHASH_BITS[votes * 2 > len(hashes)].sum())
+
+
+def _source_ref(meta: dict, key: str) -> dict:
+    """Référence d'une copie fusionnée, conservée dans meta["sources"] de la ligne gardée."""
+    ref = {k: meta[k] for k in ("filename", "rel_path", "date", "year", "source_url") if k in meta}
+    ref["source_key"] = key
+    return ref
+
+
+def collapse_near_duplicates(docs: list, metas: list, keys: list, kinds: list) -> list:
+    """
+    Repère les chunks quasi identiques. `keys` / `kinds` : fichier source et type de chaque ligne.
+    Retourne pour chaque ligne l'indice de la ligne gardée (elle-même si elle est gardée) et
+    ajoute aux métadonnées des lignes gardées la référence des copies (meta["sources"]).
+    """
+    keeper = list(range(len(docs)))
+    buckets = {}   # (bande, valeur) → lignes gardées
+    sigs = {}
+    order = sorted(range(len(docs)), key=lambda i: (_DEDUP_PRIORITY.get(kinds[i], 9), i))
+    for i in order:
+        sig = simhash(docs[i])
+        numbers = _NUMBER_RE.findall(docs[i])
+        bands = [(b, (sig >> (16 * b)) & 0xFFFF) for b in range(_DEDUP_BANDS)]
+        match = None
+        for band in bands:
+            for j in buckets.get(band, ()):
+                sig_j, numbers_j = sigs[j]
+                if bin(sig ^ sig_j).count("1") <= DEDUP_MAX_DISTANCE and numbers == numbers_j:
+                    match = j
+                    break
+            if match is not None:
+                break
+        if match is None:
+            sigs[i] = (sig, numbers)
+            for band in bands:
+                buckets.setdefault(band, []).append(i)
+            continue
+        keeper[i] = match
+        refs = metas[match].setdefault("sources", [])
+        known = {keys[match]} | {r["source_key"] for r in refs}
+        for ref in [_source_ref(metas[i], keys[i])] + metas[i].pop("sources", []):
+            if ref["source_key"] not in known:
+                known.add(ref["source_key"])
+                refs.append(ref)
+        if refs:
+            refs.sort(key=lambda r: r["source_key"])   # ordre stable entre run incrémental et complet
+        else:
+            del metas[match]["sources"]
+    return keeper
+
+
+# ── Manifest d'indexation incrémentale ─────────────────────────────────────────
+# manifest.json (dans le répertoire de la version) : pour chaque fichier source, son hash et
+# sa plage de lignes [début, fin) dans l'index. Seuls les fichiers ajoutés, modifiés ou
+# supprimés sont retraités ; les autres lignes sont recopiées depuis la version active.
+MANIFEST_NAME    = "manifest.json"
+MANIFEST_VERSION = 1
+EXTRACTION_VERSION = 2   # à incrémenter quand l'extraction change (2 : OCR des pages scannées des PDF texte)
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 du contenu d'un fichier (lecture par blocs de 1 Mo)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_key(path: Path) -> str:
+    """Clé stable d'un fichier source : chemin relatif au projet (absolu s'il est hors projet)."""
+    resolved = path.resolve()
+    try:
+        return resolved.relative_to(APP_DIR.resolve()).as_posix()
+    except ValueError:
+        return resolved.as_posix()
+
+
+def _index_config() -> dict:
+    """Paramètres dont le changement invalide tout l'index (modèle, découpage, version de l'extraction)."""
+    return {"model": MODEL_NAME, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+            "extraction": EXTRACTION_VERSION, "pdf_backend": PDF_BACKEND,
+            "dedup": DEDUP_MAX_DISTANCE if DEDUP else None}
+
+
+def _ocr_signature() -> str:
+    """État de l'OCR : s'il change, les fichiers ignorés faute d'OCR sont retentés."""
+    return f"tesseract={int(_OCR_TESSERACT)},easyocr={int(_OCR_EASYOCR)},journal={int(OCR_JOURNAL)}"
+
+
+def load_manifest(db_dir: Path) -> dict | None:
+    """Lit le manifest de db_dir. None si absent, illisible ou construit avec une autre config."""
+    manifest_file = Path(db_dir) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return None
+    try:
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("config") != _index_config():
+        return None
+    return manifest
+
+
+def save_manifest(db_dir: Path, files: dict, total_rows: int) -> None:
+    """Écrit le manifest de façon atomique (fichier temporaire puis remplacement)."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "config": _index_config(),
+        "ocr": _ocr_signature(),
+        "total_rows": total_rows,
+        "files": files,
+    }
+    manifest_file = Path(db_dir) / MANIFEST_NAME
+    tmp = manifest_file.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, manifest_file)
+
+
+def _load_previous_index(db_dir: Path, manifest: dict | None):
+    """
+    Charge l'index existant de db_dir (embeddings en mmap) s'il est cohérent avec le manifest.
+    Retourne (embeddings, documents, metadata) ou None (→ reconstruction complète).
+    """
+    if manifest is None or not index_store.index_exists(db_dir):
+        return None
+    try:
+        embeddings, documents, metadata = index_store.load_index(db_dir)
+    except Exception:
+        return None
+    n = manifest.get("total_rows")
+    if not (len(documents) == len(metadata) == embeddings.shape[0] == n):
+        return None
+    return embeddings, documents, metadata
+
+
+# Fichiers de la disposition à plat (avant les versions) : remplacés par vector_db/versions/
+_FLAT_FILES = (index_store.EMBEDDINGS_FILE, index_store.TEXTS_FILE, index_store.OFFSETS_FILE,
+               index_store.METADATA_FILE, index_store.INDEX_FILE, index_store.QUANT_FILE,
+               index_store.QUANT_SCALE_FILE, *index_store.LEGACY_FILES, ann_index.IVF_FILE,
+               bm25_index.META_FILE, bm25_index.INDPTR_FILE, bm25_index.DOCS_FILE,
+               bm25_index.WEIGHTS_FILE, MANIFEST_NAME)
+
+
+def _remove_flat_layout() -> None:
+    """Supprime les fichiers d'index restés à la racine de vector_db/ (fichier encore ouvert : ignoré)."""
+    for name in _FLAT_FILES:
+        try:
+            (DB_DIR / name).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+def _list_sources() -> list:
+    """Fichiers sources dans l'ordre d'indexation : .md, puis images, puis PDFs. Liste de (kind, path)."""
+    sources = []
+    if KNOWLEDGE_DIR.exists():
+        sources += [("md", p) for p in sorted(KNOWLEDGE_DIR.glob("*.md"))]
+    if IMAGES_DIR.exists():
+        sources += [
+            ("image", p) for p in sorted(IMAGES_DIR.iterdir())
+            if p.is_file() and p.suffix.lower() in _IMAGE_EXT
+        ]
+    if STATIC_DIR.exists():
+        sources += [("pdf", p) for p in sorted(STATIC_DIR.rglob("*.pdf")) if p.is_file()]
+    return sources
+
+
+# ── Reprise après interruption (--resume) ──────────────────────────────────────
+# Les chunks extraits sont sauvegardés fichier par fichier dans CHECKPOINT_DIR ; les embeddings
+# le sont lot par lot via le cache d'embeddings (chaque lot est commité dans embeddings.sqlite)
+# et l'OCR page par page via OcrPageCache. Avec --resume, un run interrompu repart donc au premier
+# fichier non extrait / premier lot non encodé. PROGRESS_FILE indique le travail restant.
+CHECKPOINT_DIR = CACHE_DIR / "ingest_checkpoint"
+PROGRESS_FILE  = CACHE_DIR / "ingest_progress.json"
+
+
+class RunCheckpoint:
+    """Points de reprise d'un run d'indexation : chunks extraits par fichier + fichier de progression."""
+
+    def __init__(self, resume: bool = False):
+        self.progress = {}
+        previous = self._read_progress()
+        if not resume:
+            if previous and previous.get("stage") != "termine":
+                print(f"  Run precedent interrompu (etape : {previous.get('stage')}) : points de reprise "
+                      f"abandonnes (--resume pour les reutiliser).")
+            shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+        elif previous and previous.get("stage") != "termine":
+            print(f"  Reprise du run interrompu (etape : {previous.get('stage')}).")
+        CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _read_progress() -> dict | None:
+        try:
+            return json.loads(PROGRESS_FILE.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+
+    @staticmethod
+    def _path(key: str, digest: str) -> Path:
+        """Fichier de reprise d'une source : dépend du contenu, du découpage et de l'état de l'OCR."""
+        sig = json.dumps([key, digest, _index_config(), _ocr_signature()], sort_keys=True)
+        return CHECKPOINT_DIR / f"{hashlib.sha256(sig.encode('utf-8')).hexdigest()}.pkl"
+
+    def load(self, key: str, digest: str):
+        """(docs, metas) extraits lors d'un run précédent, ou None."""
+        path = self._path(key, digest)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def save(self, key: str, digest: str, docs: list, metas: list) -> None:
+        """Sauvegarde atomique des chunks extraits d'une source."""
+        path = self._path(key, digest)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((docs, metas), f)
+        os.replace(tmp, path)
+
+    def update(self, **fields) -> None:
+        """Met à jour le fichier de progression (écriture atomique)."""
+        self.progress.update(fields, updated=time.strftime("%Y-%m-%d %H:%M:%S"))
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = PROGRESS_FILE.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.progress, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, PROGRESS_FILE)
+
+    def finish(self) -> None:
+        """Run terminé : les points de reprise ne servent plus."""
+        shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+        self.update(stage="termine", remaining_files=[])
+
+
 # ── Programme principal ────────────────────────────────────────────────────────
 def _check_ocr() -> bool:
     """Vérifie qu'au moins un OCR est disponible."""
@@ -282,9 +967,25 @@ def _check_ocr() -> bool:
     return False
 
 
+def _load_model():
+    """Charge le modèle d'embeddings (GPU si USE_GPU et CUDA disponibles)."""
+    print(f"Chargement du modele '{MODEL_NAME}'...")
+    try:
+        import torch
+        use_gpu = os.environ.get("USE_GPU") and torch.cuda.is_available()
+        device = "cuda" if use_gpu else "cpu"
+        if use_gpu:
+            print(f"  GPU : {torch.cuda.get_device_name(0)}")
+    except Exception:
+        device = "cpu"
+    # Import différé : les workers d'extraction PDF n'ont pas besoin de torch
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME, device=device)
+
+
 def main(args=None):
     if args is None:
-        args = argparse.Namespace(md_only=False, md_dir=None)
+        args = argparse.Namespace(md_only=False, md_dir=None, full=False, workers=None, resume=False)
     DB_DIR.mkdir(exist_ok=True)
 
     # Répertoire source des .md : --md-dir ou KNOWLEDGE_DIR par défaut
@@ -293,6 +994,14 @@ def main(args=None):
         KNOWLEDGE_DIR = Path(args.md_dir)
         print(f"  Source .md : {KNOWLEDGE_DIR}")
 
+    global PDF_BACKEND
+    if getattr(args, "pdf_backend", None):
+        PDF_BACKEND = args.pdf_backend
+    if PDF_BACKEND not in PDF_BACKENDS or (PDF_BACKEND == "pymupdf" and not _FITZ_OK):
+        print(f"  [!] Moteur PDF '{PDF_BACKEND}' indisponible, utilisation de pdfplumber.")
+        PDF_BACKEND = "pdfplumber"
+    print(f"  Extraction PDF : {PDF_BACKEND}")
+
     _ocr_ok = _check_ocr()
     if not OCR_JOURNAL:
         print("  OCR des PDFs journal : desactive (INGEST_OCR_JOURNAL=0). Supprimez la variable pour reactiver.")
@@ -307,226 +1016,287 @@ def main(args=None):
                 shutil.copy2(pdf, dest)
                 print(f"  Copie : journal/{pdf.name} -> static/journal/")
 
-    print(f"Chargement du modele '{MODEL_NAME}'...")
-    try:
-        import torch
-        use_gpu = os.environ.get("USE_GPU") and torch.cuda.is_available()
-        device = "cuda" if use_gpu else "cpu"
-        if use_gpu:
-            print(f"  GPU : {torch.cuda.get_device_name(0)}")
-    except Exception:
-        device = "cpu"
-    model = SentenceTransformer(MODEL_NAME, device=device)
+    # Index précédent (version active) : réutilisé pour les fichiers inchangés (sauf --full)
+    prev_dir = index_store.active_dir(DB_DIR)
+    manifest = None if getattr(args, "full", False) else load_manifest(prev_dir)
+    previous = _load_previous_index(prev_dir, manifest)
+    if previous is None:
+        manifest = None
+        print("  Indexation complete (pas de manifest exploitable ou --full).")
+    old_files = manifest["files"] if manifest else {}
+    retry_skipped = manifest is not None and manifest.get("ocr") != _ocr_signature()
 
-    all_docs, all_metadatas = [], []
+    do_pdfs = not getattr(args, "md_only", False)
+    sources = _list_sources()
+
+    # 1) Planification : pour chaque source, réutiliser ses lignes ("old") ou l'extraire ("new")
     skipped = []
+    plan = []   # (kind, path, key, action, old_entry | digest)
+    for kind, path in sources:
+        key = _source_key(path)
+        old = old_files.get(key)
+        if kind == "pdf" and not do_pdfs:
+            # --md-only : les PDFs déjà indexés sont conservés tels quels
+            if old:
+                plan.append((kind, path, key, "old", old))
+            continue
+        try:
+            digest = file_hash(path)
+        except OSError as e:
+            print(f"  ERREUR {path.name} : {e}")
+            skipped.append(path.name)
+            continue
+        unchanged = old is not None and old["hash"] == digest
+        if unchanged and not (retry_skipped and old["rows"][0] == old["rows"][1]):
+            plan.append((kind, path, key, "old", old))
+        elif kind == "image" and not _OCR_AVAILABLE:
+            continue
+        else:
+            plan.append((kind, path, key, "new", digest))
 
-    # ── 1. Fichiers .md (sites web) en premier ───────────────────────────────────
-    md_files = []
-    if KNOWLEDGE_DIR.exists():
-        md_files = sorted(KNOWLEDGE_DIR.glob("*.md"))
-        if md_files:
-            print(f"\n--- Fichiers .md / sites web ({len(md_files)} fichier(s)) ---\n")
-        for md_path in md_files:
-            try:
-                raw = md_path.read_text(encoding="utf-8")
-                source_url = ""
-                for line in raw.split("\n")[:10]:
-                    if line.strip().lower().startswith("source :"):
-                        source_url = line.split(":", 1)[-1].strip()
-                        break
-                if "---" in raw:
-                    content = raw.split("---", 1)[-1].strip()
-                else:
-                    content = raw
-                chunks = chunk_text(content)
-                if not chunks and len(content) > 80:
-                    chunks = [content]
-                if not chunks:
-                    skipped.append(md_path.name)
+    # Un fichier inchangé dont des chunks ont été fusionnés dans ceux d'un fichier modifié
+    # ou supprimé doit être réextrait : ses copies n'existent plus que dans ce fichier-là.
+    kept_keys = {key for _, _, key, action, _ in plan if action == "old"}
+    while True:
+        stale = set(old_files) - kept_keys
+        redo = [i for i, (_, _, key, action, info) in enumerate(plan)
+                if action == "old" and stale.intersection(info.get("merged_into", ()))]
+        if not redo:
+            break
+        for i in redo:
+            kind, path, key, _, info = plan[i]
+            plan[i] = (kind, path, key, "new", info["hash"] if kind == "pdf" and not do_pdfs else file_hash(path))
+            kept_keys.discard(key)
+
+    # Points de reprise : avec --resume, les sources déjà extraites par un run interrompu sont rechargées
+    resume = getattr(args, "resume", False)
+    ckpt = RunCheckpoint(resume)
+    remaining = {key: None for _, _, key, action, _ in plan if action == "new"}
+    resumed = {}
+    if resume:
+        for _, _, key, action, info in plan:
+            if action == "new" and (saved := ckpt.load(key, info)) is not None:
+                resumed[key] = saved
+        if resumed:
+            print(f"  Reprise : {len(resumed)} fichier(s) deja extrait(s), {len(remaining) - len(resumed)} restant(s).")
+    ckpt.update(stage="extraction", files_total=len(remaining), files_done=0, remaining_files=list(remaining))
+
+    # 2) Extraction : les PDFs à traiter partent tout de suite dans le pool de processus
+    #    (en parallèle des .md/images), les résultats sont consommés dans l'ordre des sources.
+    workers = getattr(args, "workers", None) or INGEST_WORKERS
+    pdf_jobs = [
+        path for kind, path, key, action, _ in plan
+        if kind == "pdf" and action == "new" and key not in resumed
+    ]
+    if pdf_jobs:
+        print(f"  Extraction PDF : {len(pdf_jobs)} fichier(s), {min(workers, len(pdf_jobs))} processus")
+    pdf_reads = _iter_pdf_reads(pdf_jobs, workers, PDF_BACKEND)
+
+    # Chaque source produit un segment : ("old", début, fin) lignes recopiées de l'index
+    # précédent, ou ("new", docs, metas) chunks fraîchement extraits à encoder.
+    segments = []
+    new_files = {}
+    n_kept = n_changed = 0
+    current_kind = None
+    for kind, path, key, action, info in plan:
+        if kind != current_kind:
+            current_kind = kind
+            count = sum(k == kind for k, _ in sources)
+            if kind == "md":
+                print(f"\n--- Fichiers .md / sites web ({count} fichier(s)) ---\n")
+            elif kind == "image":
+                print(f"\n--- Images source/images/ ({count} fichier(s)) ---\n")
+            elif do_pdfs:
+                print(f"\n--- PDFs (static + journal) : {count} fichier(s) ---\n")
+            else:
+                print("\n--- PDFs : déjà dans vector_db, non rechargés. ---\n")
+
+        if action == "old":
+            segments.append(("old", *info["rows"]))
+            new_files[key] = info
+            n_kept += 1
+            continue
+
+        ckpt.update(files_done=ckpt.progress["files_total"] - len(remaining), current_file=key,
+                    remaining_files=list(remaining))
+        remaining.pop(key, None)
+        saved = resumed.pop(key, None)
+        try:
+            if saved is not None:
+                docs, metas = saved
+                print(f"  {path.name} -> {len(docs)} chunks (reprise)")
+            elif kind == "pdf":
+                date_iso, _ = extract_date(path.name)
+                read, error = next(pdf_reads)
+                print(f"  [{date_iso}] {path.name}", end=" ... ", flush=True)
+                if error:
+                    print(error)
+                    skipped.append(path.name)
                     continue
-                label = f"[Web] {md_path.stem}"
-                print(f"  [web] {md_path.name} -> {len(chunks)} chunks")
-                for i, chunk in enumerate(chunks):
-                    all_docs.append(chunk)
-                    meta = {
-                        "filename": label,
-                        "rel_path": source_url or md_path.name,
-                        "date": "web",
-                        "year": "web",
-                        "chunk": i,
-                        "total_chunks": len(chunks),
-                    }
-                    if source_url:
-                        meta["source_url"] = source_url
-                    all_metadatas.append(meta)
-            except Exception as e:
-                print(f"  ERREUR {md_path.name} : {e}")
-                skipped.append(md_path.name)
+                docs, metas, msg = _extract_pdf(path, read, pdf_hash=info, workers=workers)
+                print(msg)
+            elif kind == "md":
+                docs, metas = _extract_md(path)
+                if docs:
+                    print(f"  [web] {path.name} -> {len(docs)} chunks")
+            else:
+                print(f"  [image] {path.name}", end=" ... ")
+                docs, metas, msg = _extract_image(path)
+                print(msg)
+        except Exception as e:
+            print(f"  ERREUR {path.name} : {e}")
+            skipped.append(path.name)
+            continue
+        if saved is None:
+            ckpt.save(key, info, docs, metas)
 
-    if md_files:
-        print(f"\n  .md / sites web : {sum(m['year'] == 'web' for m in all_metadatas)} chunks.\n")
+        n_changed += 1
+        if not docs:
+            skipped.append(path.name)
+        segments.append(("new", docs, metas))
+        new_files[key] = {"kind": kind, "hash": info, "rows": None}
+    close_ocr_pool()
+    if not _OCR_AVAILABLE and any(kind == "image" for kind, _ in sources):
+        print("  [!] OCR non disponible - images modifiees ignorees (pip install easyocr).")
 
-    # -- 1b. Images source/images/ (OCR direct) --
-    _IMAGE_EXT = {".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".webp"}
-    img_files = []
-    if IMAGES_DIR.exists():
-        img_files = sorted(
-            p for p in IMAGES_DIR.iterdir()
-            if p.is_file() and p.suffix.lower() in _IMAGE_EXT
-        )
-    if img_files:
-        print(f"\n--- Images source/images/ ({len(img_files)} fichier(s)) ---\n")
-        if not _OCR_AVAILABLE:
-            print("  [!] OCR non disponible - images ignorees (pip install easyocr).")
+    n_deleted = len(set(old_files) - set(new_files))
+    if manifest:
+        print(f"\n  Incremental : {n_kept} fichier(s) inchange(s), {n_changed} nouveau(x)/modifie(s), "
+              f"{n_deleted} supprime(s).")
+
+    # Assemblage : lignes recopiées + nouveaux chunks, dans l'ordre des sources
+    old_emb, old_docs, old_metas = previous if previous else (None, None, None)
+    previous = None
+    row_docs, row_metas, row_src, row_keys, row_kinds = [], [], [], [], []
+    for key, seg in zip(list(new_files), segments):
+        if seg[0] == "old":
+            s, e = seg[1], seg[2]
+            row_docs.extend(old_docs[s:e])
+            for meta in old_metas[s:e]:
+                # Les références vers des fichiers réextraits ou supprimés sont recalculées ci-dessous
+                refs = [r for r in meta.get("sources", ()) if r.get("source_key") not in stale]
+                meta = {k: v for k, v in meta.items() if k != "sources"}
+                if refs:
+                    meta["sources"] = refs
+                row_metas.append(meta)
+            row_src.extend(range(s, e))
         else:
-            for img_path in img_files:
-                print(f"  [image] {img_path.name}", end=" ... ")
-                text = _ocr_image_file(img_path)
-                if not text:
-                    print("aucun texte")
-                    skipped.append(img_path.name)
-                    continue
-                chunks = chunk_text(text)
-                if not chunks and len(text) > 80:
-                    chunks = [text]
-                if not chunks:
-                    print("aucun chunk")
-                    skipped.append(img_path.name)
-                    continue
-                print(f"{len(chunks)} chunks")
-                date_iso, year = extract_date(img_path.name)
-                for i, chunk in enumerate(chunks):
-                    all_docs.append(chunk)
-                    all_metadatas.append({
-                        "filename": img_path.name,
-                        "rel_path": f"source/images/{img_path.name}",
-                        "date": date_iso,
-                        "year": year,
-                        "chunk": i,
-                        "total_chunks": len(chunks),
-                    })
-
-
-    # ── 2. PDFs (PV, L'ECHO) si demandé ─────────────────────────────────────────
-    pdf_files = []
-    if STATIC_DIR.exists():
-        for p in sorted(STATIC_DIR.rglob("*.pdf")):
-            if p.is_file():
-                pdf_files.append(p)
+            row_docs.extend(seg[1])
+            row_metas.extend(seg[2])
+            row_src.extend([-1] * len(seg[1]))
+        row_keys.extend([key] * (len(row_docs) - len(row_keys)))
+        row_kinds.extend([new_files[key]["kind"]] * (len(row_docs) - len(row_kinds)))
+    if hasattr(old_docs, "close"):
+        old_docs.close()   # texts.bin de la version active : plus utile une fois les lignes recopiées
+    old_docs = old_metas = None
 
-    do_pdfs = not getattr(args, "md_only", False)
-    if not do_pdfs:
-        print("--- PDFs : déjà dans vector_db, non rechargés. ---\n")
+    # Fusion des quasi-doublons puis compactage : les lignes gardées d'un fichier restent contiguës
+    if DEDUP:
+        keeper = collapse_near_duplicates(row_docs, row_metas, row_keys, row_kinds)
     else:
-        print(f"--- PDFs (static + journal) : {len(pdf_files)} fichier(s) ---\n")
+        keeper = list(range(len(row_docs)))
+    all_docs, all_metadatas, src, kept_rows_keys = [], [], [], []
+    merged_into = {key: set() for key in new_files}
+    for i, k in enumerate(keeper):
+        if k != i:
+            if row_keys[k] != row_keys[i]:
+                merged_into[row_keys[i]].add(row_keys[k])
+            continue
+        all_docs.append(row_docs[i])
+        all_metadatas.append(row_metas[i])
+        src.append(row_src[i])
+        kept_rows_keys.append(row_keys[i])
+    n_merged = len(row_docs) - len(all_docs)
+    row_docs = row_metas = row_src = None
+    pos = 0
+    for key in new_files:
+        start = pos
+        while pos < len(kept_rows_keys) and kept_rows_keys[pos] == key:
+            pos += 1
+        # Fichier recopié : ses copies fusionnées lors d'un run précédent ne sont plus dans les lignes
+        merged = merged_into[key] | set(new_files[key].get("merged_into", ()))
+        entry = {k: v for k, v in new_files[key].items() if k != "merged_into"}
+        entry["rows"] = [start, pos]
+        if merged:
+            entry["merged_into"] = sorted(merged)
+        new_files[key] = entry
+    if n_merged:
+        print(f"\n  Quasi-doublons : {n_merged} chunk(s) fusionne(s) ({len(all_docs)} lignes gardees).")
+    src = np.asarray(src, dtype=np.int64)
+    dest = np.flatnonzero(src < 0)
+    to_encode = [all_docs[i] for i in dest]
 
-    for pdf_path in pdf_files:
-        if not do_pdfs:
-            break
-        date_iso, year = extract_date(pdf_path.name)
-        if "journal" in str(pdf_path).replace("\\", "/"):
-            rel_path = f"journal/{pdf_path.name}"
+    # Nouvelle version : tout est écrit dans out_dir, la version active reste intacte et lisible
+    # par l'appli jusqu'à la bascule du pointeur CURRENT (fin de main).
+    out_dir = index_store.new_version_dir(DB_DIR)
+
+    # Embeddings écrits lot par lot dans un .npy préalloué (memmap), normalisés sur place,
+    # puis renommé en embeddings.npy : la mémoire reste bornée à un lot quelle que soit la taille du corpus.
+    print(f"\nGeneration de {len(to_encode)} embeddings...")
+    ckpt.update(stage="embeddings", files_done=ckpt.progress["files_total"], current_file=None,
+                remaining_files=[], chunks_total=len(to_encode), chunks_encoded=0)
+    emb_path = out_dir / index_store.EMBEDDINGS_FILE
+    tmp_path = out_dir / (index_store.EMBEDDINGS_FILE + ".tmp")
+    cache = EmbeddingCache(EMBED_CACHE_FILE, MODEL_NAME)
+    try:
+        batches = cache.iter_encode(to_encode, _load_model, batch_size=64)
+        first = next(batches, None)
+        if old_emb is not None:
+            dim = old_emb.shape[1]
         else:
-            rel_path = pdf_path.name
-        print(f"  [{date_iso}] {pdf_path.name}", end=" ... ")
+            dim = first.shape[1] if first is not None else 0
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(all_docs), dim))
+        for i in range(0, len(src), 4096):
+            block = np.flatnonzero(src[i : i + 4096] >= 0) + i
+            if len(block):
+                out[block] = old_emb[src[block]]
+        done = 0
+        for embs in chain([first] if first is not None else [], batches):
+            # Normalisation pour cosine similarity via produit scalaire
+            embs /= np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-9)
+            out[dest[done : done + len(embs)]] = embs
+            done += len(embs)
+            ckpt.update(chunks_encoded=done)
+            print(f"  {done}/{len(to_encode)} a encoder", end="\r")
+        if to_encode:
+            print()
+        out.flush()
+        del out
+    finally:
+        cache.close()
+    if to_encode:
+        print(f"  {cache.stats_line()}")
 
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                pages_text = []
-                all_table_texts = []
-                for p in pdf.pages:
-                    page_content, table_texts = _extract_page_text_and_tables(p)
-                    if page_content:
-                        pages_text.append(page_content)
-                    all_table_texts.extend(table_texts)
-
-            is_journal = "journal" in str(pdf_path).replace("\\", "/")
-            if not pages_text and _OCR_AVAILABLE:
-                if is_journal and not OCR_JOURNAL:
-                    print("ignore (OCR journaux desactive, INGEST_OCR_JOURNAL=0 pour desactiver)")
-                    skipped.append(pdf_path.name)
-                    continue
-                try:
-                    pages_text = extract_text_ocr(pdf_path)
-                    if pages_text:
-                        print("OCR", end=" ... ")
-                except Exception as e:
-                    print(f"OCR echoue ({e!r})", end=" ... ")
-                    pages_text = []
-
-            if not pages_text:
-                if not _OCR_AVAILABLE:
-                    print("aucun texte (PDF scanne ? pip install easyocr pour l'OCR)")
-                else:
-                    print("aucun texte (OCR echoue ?)")
-                skipped.append(pdf_path.name)
-                continue
-
-            full_text = "\n".join(pages_text)
-            chunks = chunk_text(full_text)
-            if not chunks and len(full_text) > 80:
-                chunks = [full_text]
-            total_chunks = len(chunks) + len(all_table_texts)
-            if all_table_texts:
-                print(f"{len(chunks)} chunks + {len(all_table_texts)} tableau(x)", end=" ")
-            else:
-                print(f"{len(chunks)} chunks", end=" ")
-
-            for i, chunk in enumerate(chunks):
-                all_docs.append(chunk)
-                all_metadatas.append({
-                    "filename": pdf_path.name,
-                    "rel_path": rel_path,
-                    "date": date_iso,
-                    "year": year,
-                    "chunk": i,
-                    "total_chunks": total_chunks,
-                })
-            # Chunks dédiés aux tableaux (barèmes, tarifs) pour améliorer la recherche sémantique
-            for j, table_str in enumerate(all_table_texts):
-                if len(table_str.strip()) < 20:
-                    continue
-                all_docs.append("[Tableau] " + table_str.strip())
-                all_metadatas.append({
-                    "filename": pdf_path.name,
-                    "rel_path": rel_path,
-                    "date": date_iso,
-                    "year": year,
-                    "chunk": len(chunks) + j,
-                    "total_chunks": total_chunks,
-                    "is_table": True,
-                })
-            print("")
+    # Sauvegarde dans out_dir (manifest en dernier), puis bascule du pointeur CURRENT.
+    # L'ancien embeddings.npy est encore mappé via old_emb : libéré pour pouvoir supprimer sa version (Windows).
+    old_emb = None
+    os.replace(tmp_path, emb_path)
+    quantization = QUANTIZE if QUANTIZE in index_store.QUANTIZATIONS else None
+    if QUANTIZE and not quantization:
+        print(f"INGEST_QUANTIZE={QUANTIZE!r} inconnu : pas de copie quantifiee.")
+    index_store.save_quantized(out_dir, quantization)
+    # Index approché (IVF) pour les grandes bases
+    emb = np.load(emb_path, mmap_mode="r")
+    ivf = ann_index.write_ivf(out_dir, emb)
+    del emb
+    if ivf is not None:
+        print(f"Index IVF : {ivf.nlist} groupes, {ivf.rows} lignes")
+    # Matrice BM25 (poids précalculés) : reconstruite en entier, idf et longueur moyenne étant globaux
+    bm25_index.write_bm25(out_dir, all_docs)
+    # Étiquettes des chunks (Horizon, cantine, voirie, montants…) pour les passes forcées de l'agent
+    chunk_tags.write_tags(out_dir, all_docs, [m.get("filename", "") for m in all_metadatas])
+    index_store.save_index(out_dir, all_docs, all_metadatas, dim, quantization=quantization)
+    save_manifest(out_dir, new_files, len(all_docs))
 
-        except Exception as e:
-            print(f"ERREUR : {e}")
-            skipped.append(pdf_path.name)
-
-    # Génération des embeddings
-    print(f"\nGeneration de {len(all_docs)} embeddings...")
-    BATCH = 64
-    all_embeddings = []
-    for i in range(0, len(all_docs), BATCH):
-        batch = all_docs[i : i + BATCH]
-        embs = model.encode(batch, show_progress_bar=False)
-        all_embeddings.extend(embs.tolist())
-        print(f"  {min(i + BATCH, len(all_docs))}/{len(all_docs)}", end="\r")
-    print()
-
-    # Normalisation pour cosine similarity via produit scalaire
-    emb_array = np.array(all_embeddings, dtype=np.float32)
-    norms = np.linalg.norm(emb_array, axis=1, keepdims=True)
-    emb_array = emb_array / np.maximum(norms, 1e-9)
-
-    # Sauvegarde
-    np.save(DB_DIR / "embeddings.npy", emb_array)
-    with open(DB_DIR / "documents.pkl", "wb") as f:
-        pickle.dump(all_docs, f)
-    with open(DB_DIR / "metadata.pkl", "wb") as f:
-        pickle.dump(all_metadatas, f)
-
-    print(f"\n Indexation terminee : {len(all_docs)} chunks sauvegardes dans '{DB_DIR}'.")
+    # Bascule atomique : l'appli charge la nouvelle version en tâche de fond. La précédente est
+    # gardée pour les requêtes encore en cours d'un processus local ; les plus anciennes (et les runs
+    # interrompus) sont supprimées. deploy.bat ne commite que la version courante.
+    previous_version = index_store.publish_version(DB_DIR, out_dir)
+    index_store.prune_versions(DB_DIR, keep={out_dir.name, previous_version})
+    _remove_flat_layout()
+    ckpt.finish()
+
+    print(f"\n Indexation terminee : {len(all_docs)} chunks sauvegardes dans '{out_dir}'.")
     if skipped:
         print(f"Fichiers ignores ({len(skipped)}) :")
         for f in skipped:
@@ -539,4 +1309,12 @@ if __name__ == "__main__":
                         help="Indexer uniquement les .md (sites web), pas les PDFs")
     parser.add_argument("--md-dir", metavar="DIR", default=None,
                         help="Répertoire source des .md (défaut: knowledge_sites/, recommandé: input/)")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignorer le manifest et réindexer tous les fichiers")
+    parser.add_argument("--workers", type=int, default=None, metavar="N",
+                        help="Processus d'extraction PDF en parallèle (défaut: INGEST_WORKERS ou nb de cœurs, 1 = séquentiel)")
+    parser.add_argument("--pdf-backend", choices=PDF_BACKENDS, default=None,
+                        help="Moteur d'extraction du texte PDF (défaut: INGEST_PDF_BACKEND ou pdfplumber)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reprendre un run interrompu (chunks deja extraits, embeddings deja calcules)")
     main(parser.parse_args())
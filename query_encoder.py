@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+query_encoder.py — Encodeur de requêtes ONNX int8 (CPU), avec repli sur SentenceTransformer
+
+À la recherche, le modèle ne sert qu'à encoder une requête courte à la fois. Charger torch et
+le SentenceTransformer complet pour ça coûte plusieurs secondes et quelques centaines de Mo par
+processus. `export_onnx()` exporte le même modèle (transformer + mean pooling) en ONNX, le
+quantifie en int8 (poids des MatMul et de la table d'embeddings) et vérifie la parité avec le
+modèle de référence sur un jeu de requêtes : cosinus minimal ≥ 0,99, sinon l'export est refusé.
+
+Fichiers (models/<modèle>-onnx-int8/, hors git : le modèle int8 dépasse 100 Mo) :
+    model.onnx       graphe quantifié, entrées input_ids / attention_mask → sentence_embedding
+    tokenizer.json   tokenizer « fast » (bibliothèque tokenizers, sans transformers ni torch)
+    encoder.json     modèle source, longueur max, dimension, résultat du contrôle de parité
+
+Usage :
+    encoder = load_query_encoder(MODEL_NAME)       # ONNX si exporté et valide, sinon torch
+    q_emb = encoder.encode([question], convert_to_numpy=True)[0]
+
+QUERY_ENCODER=torch force le modèle de référence ; QUERY_ENCODER_DIR change le dossier des
+modèles exportés. Export : python scripts/export_query_encoder.py
+"""
+
+import importlib.util
+import inspect
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# onnxruntime et tokenizers ne sont importés qu'au chargement de l'encodeur
+_ORT_OK = (importlib.util.find_spec("onnxruntime") is not None
+           and importlib.util.find_spec("tokenizers") is not None)
+
+MODELS_DIR = Path(os.environ.get("QUERY_ENCODER_DIR", Path(__file__).resolve().parent / "models"))
+BACKEND = os.environ.get("QUERY_ENCODER", "auto").strip().lower()   # auto | onnx | torch
+
+MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MANIFEST_FILE = "encoder.json"
+MIN_COSINE = 0.99
+
+# Requêtes de contrôle : questions typiques posées à l'appli (mots courts, dates, montants, noms propres)
+PARITY_QUERIES = [
+    "Quels logiciels Horizon la mairie a-t-elle renouvelés ?",
+    "Quels travaux de voirie rue de l'Armistice et pour quel montant ?",
+    "Quel est le tarif de la cantine scolaire ?",
+    "Qui était Viollet-le-Duc et la restauration du château ?",
+    "Quand a lieu le marché ?",
+    "budget 2024 investissements",
+    "compte rendu du conseil municipal du 13 novembre 2025",
+    "subvention aux associations sportives",
+    "horaires d'ouverture de la mairie",
+    "taxe foncière",
+    "PLU zone constructible",
+    "éclairage public rénovation LED",
+    "recrutement d'un agent technique",
+    "convention avec la communauté de communes",
+    "forêt de Compiègne",
+    "Pierrefonds",
+    "délibération",
+    "Quels sont les projets pour l'école maternelle et combien vont-ils coûter ?",
+    # Requête longue : au-delà de max_seq_length, la troncature doit être la même des deux côtés
+    " ".join(["Le conseil municipal approuve à l'unanimité la convention de mise à disposition "
+              "des locaux de la salle des fêtes à l'association des parents d'élèves"] * 8),
+]
+
+
+def onnx_dir(model_name: str, root: Path = None) -> Path:
+    """Dossier de l'export ONNX int8 d'un modèle."""
+    return Path(root or MODELS_DIR) / f"{Path(model_name).name}-onnx-int8"
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+
+
+# ── Encodeur ONNX ─────────────────────────────────────────────────────────────
+class OnnxQueryEncoder:
+    """
+    Même interface que SentenceTransformer.encode pour les appels de recherche :
+    encode(textes) → np.ndarray (n, dim) float32, vecteurs bruts (non normalisés) comme le
+    modèle de référence, sauf normalize_embeddings=True.
+    """
+
+    def __init__(self, path: Path, threads: int = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / MANIFEST_FILE).read_text(encoding="utf-8"))
+        self.max_seq_length = int(self.manifest["max_seq_length"])
+        self.dim = int(self.manifest["dim"])
+
+        self.tokenizer = Tokenizer.from_file(str(self.path / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=int(self.manifest["pad_id"]),
+                                      pad_token=self.manifest["pad_token"])
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Une requête à la fois : peu de threads suffisent, et plusieurs processus cohabitent
+        opts.intra_op_num_threads = threads or min(4, os.cpu_count() or 1)
+        self.session = ort.InferenceSession(str(self.path / MODEL_FILE), opts,
+                                            providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **_kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feeds = {
+                "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in batch], dtype=np.int64),
+            }
+            out[start:start + len(batch)] = self.session.run(None, feeds)[0]
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out[0] if single else out
+
+
+def onnx_available(model_name: str, root: Path = None, min_cosine: float = MIN_COSINE) -> bool:
+    """Vrai si un export ONNX du modèle existe, est utilisable ici et a passé le contrôle de parité."""
+    path = onnx_dir(model_name, root)
+    if not _ORT_OK or not (path / MODEL_FILE).exists() or not (path / MANIFEST_FILE).exists():
+        return False
+    try:
+        manifest = json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    parity = manifest.get("parity") or {}
+    return (manifest.get("model") == model_name and manifest.get("ok", False)
+            and parity.get("min_cosine", 0.0) >= min_cosine)
+
+
+def load_query_encoder(model_name: str, root: Path = None, backend: str = None):
+    """
+    Encodeur de requêtes : OnnxQueryEncoder si l'export existe et a passé la parité, sinon
+    SentenceTransformer (import de torch différé jusqu'ici).
+    """
+    backend = (backend or BACKEND)
+    if backend != "torch" and onnx_available(model_name, root):
+        return OnnxQueryEncoder(onnx_dir(model_name, root))
+    if backend == "onnx":
+        raise FileNotFoundError(
+            f"Encodeur ONNX absent ou invalide : {onnx_dir(model_name, root)} "
+            "(python scripts/export_query_encoder.py)")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+# ── Export ────────────────────────────────────────────────────────────────────
+def export_onnx(model_name: str, root: Path = None, queries: list = None,
+                min_cosine: float = MIN_COSINE, opset: int = 17) -> dict:
+    """
+    Exporte model_name en ONNX int8 dans onnx_dir(model_name, root) et contrôle la parité.
+    Retourne le manifest écrit. Lève ValueError si le cosinus minimal avec le modèle de
+    référence est sous min_cosine (le manifest est alors écrit avec ok=False et l'encodeur
+    n'est pas utilisé).
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = reference[0], reference[1]
+    # sentence-transformers ≥ 6 : attribut pooling_mode ; avant : get_pooling_mode_str()
+    mode = getattr(pooling, "pooling_mode", None) or pooling.get_pooling_mode_str()
+    if mode != "mean" or len(reference) > 2:
+        raise ValueError(f"Export prévu pour transformer + mean pooling seulement : {reference}")
+    tokenizer = transformer.tokenizer
+
+    class _MeanPooled(torch.nn.Module):
+        """Transformer + mean pooling sur les jetons non masqués (comme sentence_transformers)."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            hidden = self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+    out = onnx_dir(model_name, root)
+    out.mkdir(parents=True, exist_ok=True)
+    fp32_path = out / "model.fp32.onnx"
+    sample = tokenizer(["exemple de requête"], return_tensors="pt")
+    wrapper = _MeanPooled(transformer.auto_model).eval()
+    # torch ≥ 2.9 exporte par défaut via dynamo (onnxscript) : on garde l'exporteur TorchScript
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, (sample["input_ids"], sample["attention_mask"]), str(fp32_path),
+            input_names=["input_ids", "attention_mask"], output_names=["sentence_embedding"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "seq"},
+                          "attention_mask": {0: "batch", 1: "seq"},
+                          "sentence_embedding": {0: "batch"}},
+            opset_version=opset, **legacy,
+        )
+    quantize_dynamic(str(fp32_path), str(out / MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+    tokenizer.backend_tokenizer.save(str(out / TOKENIZER_FILE))
+
+    # sentence-transformers ≥ 6 : get_embedding_dimension ; avant : get_sentence_embedding_dimension
+    dim_fn = getattr(reference, "get_embedding_dimension", None) or reference.get_sentence_embedding_dimension
+    manifest = {
+        "model": model_name,
+        "max_seq_length": int(reference.max_seq_length),
+        "dim": int(dim_fn()),
+        "pad_id": int(tokenizer.pad_token_id),
+        "pad_token": tokenizer.pad_token,
+        "quantization": "int8 dynamique (poids)",
+    }
+    (out / MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    # Contrôle de parité : mêmes requêtes, modèle de référence vs ONNX int8
+    queries = queries or PARITY_QUERIES
+    expected = reference.encode(queries, convert_to_numpy=True, show_progress_bar=False)
+    got = OnnxQueryEncoder(out).encode(queries)
+    cos = _cosines(expected, got)
+    worst = int(np.argmin(cos))
+    manifest["parity"] = {"queries": len(queries), "min_cosine": round(float(cos.min()), 5),
+                          "mean_cosine": round(float(cos.mean()), 5), "worst": queries[worst][:80]}
+    manifest["ok"] = bool(cos.min() >= min_cosine)
+    (out / MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    if not manifest["ok"]:
+        raise ValueError(f"Parité insuffisante : cosinus min {cos.min():.4f} < {min_cosine} "
+                         f"(« {queries[worst][:80]} »)")
+    return manifest
@@ -4,18 +4,21 @@ Interroge la base vectorielle par similarité sémantique.
 Usage: python query_vector_store.py "votre question"
        python query_vector_store.py   (mode interactif)
 Applique le même seuil de similarité et filtre « mot présent » que l’appli web.
+Si build_vector_store.py a écrit un index IVF (ivf.npz, grandes bases), seules les lignes
+des groupes les plus proches sont scorées ; sinon parcours complet.
+La requête est encodée par l'export ONNX int8 du modèle s'il existe (query_encoder.py).
 """
 import re
 import sys
-import json
 from pathlib import Path
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+import ann_index
+import index_store
+import query_encoder
 
 DOSSIER = Path(__file__).resolve().parent
 STORE_DIR = DOSSIER / "base_vectorielle"
-EMBEDDINGS_FILE = STORE_DIR / "embeddings.npz"
-META_FILE = STORE_DIR / "metadata.json"
 EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 N_RESULTS = 8
 MIN_SIMILARITY = 0.55
@@ -23,10 +26,10 @@ MIN_SIMILARITY_IF_KEYWORD_MATCH = 0.15
 KEYWORD_FILTER_MAX_WORDS = 3
 
 
-def cosine_similarity(a, b):
-    a = np.asarray(a, dtype=np.float32)
-    b = np.asarray(b, dtype=np.float32)
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9)
+def cosine_scores(q, embeddings, norms):
+    """Similarité cosinus de q avec chaque ligne de embeddings (norms : normes des lignes)."""
+    q = np.asarray(q, dtype=np.float32)
+    return (embeddings @ q) / (norms * np.linalg.norm(q) + 1e-9)
 
 
 def query_words(question):
@@ -42,39 +45,43 @@ def text_contains_any_word(text, words):
 
 
 def main():
-    if not STORE_DIR.exists() or not EMBEDDINGS_FILE.exists() or not META_FILE.exists():
+    if not index_store.simple_index_exists(STORE_DIR):
         print("La base vectorielle n'existe pas. Exécutez d'abord : python build_vector_store.py")
         sys.exit(1)
 
     print("Chargement du modèle et de la base...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    data = np.load(EMBEDDINGS_FILE)
-    embeddings = data["embeddings"]
-    with open(META_FILE, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    documents = meta["documents"]
-    metadatas = meta["metadatas"]
+    model = query_encoder.load_query_encoder(EMBEDDING_MODEL)   # ONNX int8 si exporté, sinon torch
+    # embeddings et textes en mmap (lecture seule), partagés avec les autres processus
+    embeddings, documents, metadatas = index_store.load_simple_index(STORE_DIR)
+    norms = np.linalg.norm(embeddings, axis=1)
+    ivf = ann_index.load_ivf(STORE_DIR, embeddings)
 
     def requete(question, n=N_RESULTS):
         q_emb = model.encode([question], convert_to_numpy=True)[0]
-        scores = np.array([cosine_similarity(q_emb, e) for e in embeddings])
         words = query_words(question)
         use_keyword_filter = len(words) <= KEYWORD_FILTER_MAX_WORDS and len(words) >= 1
         if use_keyword_filter:
+            # Tous les passages contenant un mot sont scorés (pas seulement les voisins approchés)
             indices_with_word = [
-                i for i in range(len(documents))
-                if text_contains_any_word(documents[i], words)
+                i for i, doc in enumerate(documents)
+                if text_contains_any_word(doc, words)
             ]
+            rows = np.array(indices_with_word, dtype=np.int64)
+            scores = dict(zip(indices_with_word, cosine_scores(q_emb, embeddings[rows], norms[rows]).tolist()))
             candidates = [
-                (i, float(scores[i]))
+                (i, scores[i])
                 for i in indices_with_word
                 if scores[i] >= MIN_SIMILARITY_IF_KEYWORD_MATCH
             ]
             candidates.sort(key=lambda x: -x[1])
             idx = [i for i, _ in candidates[:n]]
         else:
-            idx = np.argsort(-scores)[:n]
-            idx = [i for i in idx if scores[i] >= MIN_SIMILARITY]
+            # Index IVF si présent : lignes des groupes proches seulement ; sinon toute la base
+            rows = ivf.candidates(q_emb) if ivf is not None else np.arange(len(embeddings))
+            row_scores = cosine_scores(q_emb, embeddings[rows], norms[rows])
+            top = np.argsort(-row_scores, kind="stable")[:n]
+            scores = dict(zip(rows[top].tolist(), row_scores[top].tolist()))
+            idx = [i for i in rows[top].tolist() if scores[i] >= MIN_SIMILARITY]
         return [(documents[i], metadatas[i], float(1 - scores[i]), float(scores[i])) for i in idx]
 
     if len(sys.argv) > 1:
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+result_cache.py — Cache de résultats partagé par les sessions (LRU en mémoire + SQLite optionnel)
+
+Clé : un tuple sérialisable en JSON (ex. ("search", requête normalisée, années, exact, n)) et la
+version de l'index qui a produit le résultat → valeur sérialisable en JSON. Le LRU en mémoire
+est commun à toutes les sessions Streamlit du processus ; la couche SQLite (optionnelle) garde
+les résultats entre deux redémarrages et entre processus.
+
+Un résultat n'est jamais servi pour une autre version de l'index : la version fait partie de
+la clé, en mémoire comme sur disque. Pendant une bascule de version (vector_db/CURRENT), les
+sessions encore sur l'ancienne et celles déjà sur la nouvelle gardent chacune leurs entrées ;
+prune(versions) supprime celles des versions qui ne sont plus servies.
+
+Éviction : LRU au-delà de `size` entrées en mémoire ; sur disque, les entrées utilisées le
+moins récemment au-delà de `max_disk_entries` (RESULT_CACHE_DISK_MAX pour changer la limite).
+Avec `ttl` (secondes), une entrée écrite depuis plus longtemps n'est plus servie et est supprimée.
+
+Usage :
+    cache = ResultCache(256, CACHE_DIR / "retrieval.sqlite")   # path=None : mémoire seule
+    answers = ResultCache(128, CACHE_DIR / "answers.sqlite", ttl=7 * 86400)
+    value = cache.get(key, version)                             # None si absent
+    cache.put(key, version, value)
+    cache.prune({version_courante, version_précédente})          # versions encore servies
+    cache.stats()                                               # hits mémoire / disque, misses, expirés
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_MAX_DISK_ENTRIES = int(os.environ.get("RESULT_CACHE_DISK_MAX", "5000"))
+# Éviction disque tous les N ajouts (un COUNT(*) par ajout serait inutilement coûteux)
+_EVICT_EVERY = 100
+
+
+class ResultCache:
+    """Cache (clé, version de l'index) → valeur, en mémoire et optionnellement sur disque, avec compteurs et TTL optionnel."""
+
+    def __init__(self, size: int, path: Path | None = None,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES, ttl: float | None = None):
+        self.size = size
+        self.path = Path(path) if path else None
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lru = OrderedDict()       # (version, clé JSON) → (valeur, date d'écriture)
+        self._lock = threading.Lock()   # sessions Streamlit = threads partageant le cache
+        self._kept = None               # versions passées au dernier prune()
+        self._puts = 0
+        self._conn = None
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                # Ancien format (une ligne par clé, toutes versions confondues) : simple cache, abandonné
+                self._conn.execute("DROP TABLE IF EXISTS results")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, "
+                    "last_used REAL NOT NULL, created REAL NOT NULL, PRIMARY KEY (key, version))"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+                self._conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                # Disque en lecture seule, fichier verrouillé… : le cache reste en mémoire
+                print(f"[result_cache] Couche disque désactivée ({self.path}) : {e}")
+                self._conn = None
+
+    @staticmethod
+    def _key(key: tuple) -> str:
+        return json.dumps(key, ensure_ascii=False, separators=(",", ":"))
+
+    def _disk(self, sql: str, params: tuple = ()):
+        """Exécute une requête sur la couche disque ; en cas d'erreur, la couche est désactivée."""
+        if self._conn is None:
+            return None
+        try:
+            cur = self._conn.execute(sql, params)
+            if not sql.startswith("SELECT"):
+                self._conn.commit()
+            return cur
+        except sqlite3.Error as e:
+            print(f"[result_cache] Couche disque désactivée : {e}")
+            self._conn.close()
+            self._conn = None
+            return None
+
+    def _remember(self, key: tuple, value, created: float) -> None:
+        self._lru[key] = (value, created)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def _stale(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    # ── Lecture / écriture ────────────────────────────────────────────────────
+    def get(self, key: tuple, version: str):
+        """Valeur en cache pour `key` calculée sur la version `version` de l'index, ou None."""
+        k = self._key(key)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get((version, k))
+            if entry is not None and self._stale(entry[1], now):
+                # Expirée : ni la mémoire ni le disque (même date d'écriture) ne la servent plus
+                del self._lru[(version, k)]
+                self._disk("DELETE FROM entries WHERE key = ? AND version = ?", (k, version))
+                self.expired += 1
+                self.misses += 1
+                return None
+            if entry is not None:
+                self._lru.move_to_end((version, k))
+                self.hits += 1
+                return entry[0]
+            if self._conn is not None:
+                cur = self._disk("SELECT value, created FROM entries WHERE key = ? AND version = ?", (k, version))
+                row = cur.fetchone() if cur is not None else None
+                if row is not None and self._stale(row[1], now):
+                    self._disk("DELETE FROM entries WHERE key = ? AND version = ?", (k, version))
+                    self.expired += 1
+                elif row is not None:
+                    value = json.loads(row[0])
+                    self._disk("UPDATE entries SET last_used = ? WHERE key = ? AND version = ?", (now, k, version))
+                    self._remember((version, k), value, row[1])
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, version: str, value) -> None:
+        """Enregistre `value` (sérialisable en JSON pour la couche disque)."""
+        k = self._key(key)
+        now = time.time()
+        with self._lock:
+            self._remember((version, k), value, now)
+            if self._conn is None:
+                return
+            try:
+                blob = json.dumps(value, ensure_ascii=False)
+            except (TypeError, ValueError):
+                return   # valeur non sérialisable (ancienne base en pickles) : mémoire seule
+            self._disk("INSERT OR REPLACE INTO entries (key, version, value, last_used, created) "
+                       "VALUES (?, ?, ?, ?, ?)", (k, version, blob, now, now))
+            self._puts += 1
+            if self._puts % _EVICT_EVERY == 0:
+                self._evict()
+
+    def prune(self, versions) -> None:
+        """
+        Supprime les entrées des versions absentes de `versions` (celles encore servies).
+        Sans effet si les versions n'ont pas changé depuis l'appel précédent.
+        """
+        keep = frozenset(versions)
+        with self._lock:
+            if keep == self._kept:
+                return
+            self._kept = keep
+            for key in [key for key in self._lru if key[0] not in keep]:
+                del self._lru[key]
+            if self._conn is not None and keep:
+                marks = ",".join("?" * len(keep))
+                self._disk(f"DELETE FROM entries WHERE version NOT IN ({marks})", tuple(sorted(keep)))
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            self._disk("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+        cur = self._disk("SELECT COUNT(*) FROM entries")
+        excess = (cur.fetchone()[0] if cur is not None else 0) - self.max_disk_entries
+        if excess > 0:
+            self._disk("DELETE FROM entries WHERE rowid IN "
+                       "(SELECT rowid FROM entries ORDER BY last_used ASC LIMIT ?)", (excess,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "expired": self.expired,
+                    "entries": len(self._lru), "disk": self._conn is not None,
+                    "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0}
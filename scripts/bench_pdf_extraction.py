@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Mesure la vitesse d'extraction des PDFs (pages/s) pour chaque moteur de ingest.py.
+
+Configurations comparées (un seul processus, sans OCR) :
+  - pdfplumber, détection de tableaux sur toutes les pages (comportement historique)
+  - pdfplumber, détection de tableaux seulement sur les pages avec filets
+  - pymupdf pour le texte, pdfplumber pour les tableaux des pages avec filets
+
+Usage :
+  python scripts/bench_pdf_extraction.py               # tous les PDFs de static/
+  python scripts/bench_pdf_extraction.py --limit 20    # 20 premiers PDFs seulement
+  python scripts/bench_pdf_extraction.py DOSSIER       # autre dossier
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+
+CONFIGS = [
+    ("pdfplumber (tous tableaux)", "pdfplumber", False),
+    ("pdfplumber (filets)", "pdfplumber", True),
+    ("pymupdf (filets)", "pymupdf", True),
+]
+
+
+def bench(pdfs: list, backend: str, gate_tables: bool) -> tuple:
+    """Lit tous les PDFs. Retourne (pages, tableaux, caractères, secondes)."""
+    n_pages = n_tables = n_chars = 0
+    start = time.perf_counter()
+    for pdf in pdfs:
+        try:
+            pages_text, tables, _ = ingest._read_pdf(pdf, backend, gate_tables)
+        except Exception as e:
+            print(f"  ERREUR {pdf.name} : {e}")
+            continue
+        n_pages += len(pages_text)
+        n_tables += len(tables)
+        n_chars += sum(len(t) for t in pages_text)
+    return n_pages, n_tables, n_chars, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des moteurs d'extraction PDF de ingest.py")
+    parser.add_argument("dossier", nargs="?", default=str(ingest.STATIC_DIR),
+                        help="Dossier des PDFs (défaut: static/)")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximal de PDFs")
+    args = parser.parse_args()
+
+    pdfs = sorted(Path(args.dossier).rglob("*.pdf"))[: args.limit]
+    if not pdfs:
+        print(f"Aucun PDF dans {args.dossier}")
+        return
+    print(f"{len(pdfs)} PDF(s) dans {args.dossier}\n")
+    print(f"{'Moteur':<28} {'pages':>6} {'tableaux':>9} {'caractères':>11} {'secondes':>9} {'pages/s':>8}")
+    for label, backend, gate in CONFIGS:
+        if backend == "pymupdf" and not ingest._FITZ_OK:
+            print(f"{label:<28} (PyMuPDF non installé : pip install pymupdf)")
+            continue
+        pages, tables, chars, secs = bench(pdfs, backend, gate)
+        print(f"{label:<28} {pages:>6} {tables:>9} {chars:>11} {secs:>9.1f} {pages / secs if secs else 0:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
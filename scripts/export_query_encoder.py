@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Exporte l'encodeur de requêtes en ONNX int8 et le compare au modèle de référence (torch).
+
+Étapes (query_encoder.export_onnx) : export ONNX du transformer + mean pooling, quantification
+int8 dynamique, copie du tokenizer, contrôle de parité sur query_encoder.PARITY_QUERIES (cosinus
+minimal ≥ 0,99, sinon l'export est marqué invalide et l'appli garde torch). Avec --bench, chaque
+encodeur est ensuite chargé dans un processus neuf pour mesurer : temps de chargement (imports
+compris), latence d'encodage d'une requête (médiane), mémoire maximale du processus.
+
+Nécessite torch, sentence-transformers, onnxruntime et onnx (pip install -r requirements-onnx.txt ;
+l'appli n'a ensuite besoin que d'onnxruntime et tokenizers).
+
+Usage :
+  python scripts/export_query_encoder.py                 # export + parité
+  python scripts/export_query_encoder.py --bench         # + comparaison torch / ONNX
+  python scripts/export_query_encoder.py --bench-only    # comparaison sur un export existant
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import query_encoder  # noqa: E402
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+# ── Mesure dans un processus neuf ─────────────────────────────────────────────
+def _peak_rss_mb() -> float:
+    """Mémoire résidente maximale du processus (VmHWM sous Linux : ru_maxrss hérite du parent)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import psutil                                            # Windows / macOS
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 2**20
+
+
+def _measure(backend: str, model: str, root: str) -> None:
+    """Exécuté dans le sous-processus : affiche une ligne JSON de mesures."""
+    t0 = time.perf_counter()
+    encoder = query_encoder.load_query_encoder(model, Path(root), backend=backend)
+    load_s = time.perf_counter() - t0
+    encoder.encode(["préchauffage"], show_progress_bar=False)
+    times = []
+    for q in query_encoder.PARITY_QUERIES:
+        t = time.perf_counter()
+        encoder.encode([q], show_progress_bar=False)
+        times.append(time.perf_counter() - t)
+    times.sort()
+    print(json.dumps({"load_s": load_s, "median_ms": 1000 * times[len(times) // 2],
+                      "max_ms": 1000 * times[-1], "peak_rss_mb": _peak_rss_mb()}))
+
+
+def bench(model: str, root: Path) -> None:
+    print(f"\n{'encodeur':<10}{'chargement (s)':>16}{'requête méd. (ms)':>19}{'max (ms)':>10}{'mémoire max (Mo)':>18}")
+    for backend in ("torch", "onnx"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--measure", backend, "--model", model, "--out", str(root)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{backend:<10}échec : {proc.stderr.strip().splitlines()[-1:]}")
+            continue
+        m = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{backend:<10}{m['load_s']:16.2f}{m['median_ms']:19.1f}{m['max_ms']:10.1f}{m['peak_rss_mb']:18.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ONNX int8 de l'encodeur de requêtes")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Modèle SentenceTransformer (défaut : {MODEL_NAME})")
+    parser.add_argument("--out", default=str(query_encoder.MODELS_DIR), help="Dossier des modèles exportés")
+    parser.add_argument("--min-cosine", type=float, default=query_encoder.MIN_COSINE,
+                        help=f"Cosinus minimal exigé avec le modèle de référence (défaut : {query_encoder.MIN_COSINE})")
+    parser.add_argument("--bench", action="store_true", help="Comparer ensuite torch et ONNX")
+    parser.add_argument("--bench-only", action="store_true", help="Comparer sans réexporter")
+    parser.add_argument("--measure", choices=["torch", "onnx"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    root = Path(args.out)
+    if args.measure:
+        _measure(args.measure, args.model, str(root))
+        return
+
+    if not args.bench_only:
+        print(f"Export de '{args.model}' vers {query_encoder.onnx_dir(args.model, root)}...")
+        try:
+            manifest = query_encoder.export_onnx(args.model, root, min_cosine=args.min_cosine)
+        except ValueError as e:
+            print(f"ÉCHEC : {e}")
+            sys.exit(1)
+        parity = manifest["parity"]
+        size = (query_encoder.onnx_dir(args.model, root) / query_encoder.MODEL_FILE).stat().st_size
+        print(f"Parité sur {parity['queries']} requêtes : cosinus min {parity['min_cosine']:.5f}, "
+              f"moyen {parity['mean_cosine']:.5f} (pire : « {parity['worst']} »)")
+        print(f"model.onnx : {size / 2**20:.1f} Mo")
+
+    if args.bench or args.bench_only:
+        bench(args.model, root)
+
+
+if __name__ == "__main__":
+    main()
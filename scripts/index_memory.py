@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Mesure la mémoire réellement partagée par les processus qui lisent la base vectorielle.
+
+Les fichiers de l'index (embeddings, copie int8, textes, BM25…) sont ouverts en mmap, en
+lecture seule : leurs pages sont dans le cache du système, une seule fois, quel que soit le
+nombre de processus (appli Streamlit, workers Django, pytest). Pour chaque processus et chaque
+fichier mappé, le rapport donne :
+  RSS      pages résidentes vues par le processus
+  PSS      part proportionnelle (une page partagée par 3 processus compte pour 1/3)
+  partagé  pages aussi mappées par un autre processus
+  privé    pages propres au processus (copie non partagée)
+La somme des PSS est la mémoire physique effectivement occupée ; si la base est bien partagée,
+elle reste proche de la taille des fichiers quand le nombre de processus augmente.
+
+Usage :
+  python scripts/index_memory.py                      # 3 processus lisent vector_db/
+  python scripts/index_memory.py --workers 5          # 5 processus
+  python scripts/index_memory.py --base base_vectorielle   # base de build_vector_store.py (Django)
+  python scripts/index_memory.py --model              # chaque processus charge aussi le modèle
+  python scripts/index_memory.py --pid 1234 5678      # processus déjà lancés (streamlit, django…)
+
+Linux : /proc/<pid>/smaps. Ailleurs : psutil si installé (RSS et mémoire privée seulement).
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+import bm25_index   # noqa: E402
+import index_store  # noqa: E402
+
+try:
+    import psutil
+    _PSUTIL_OK = True
+except ImportError:
+    _PSUTIL_OK = False
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+# ── Lecture de la mémoire d'un processus ──────────────────────────────────────
+def _read_smaps(pid: int) -> tuple:
+    """({chemin: {rss, pss, shared, private}} en Ko, totaux du processus) depuis /proc/<pid>/smaps."""
+    files, total = {}, {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    current = None
+    with open(f"/proc/{pid}/smaps", "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split(maxsplit=5)
+            if not parts:
+                continue
+            if not parts[0].endswith(":"):
+                # En-tête de mapping : adresses perms offset dev inode [chemin]
+                path = parts[5].strip() if len(parts) > 5 else ""
+                current = files.setdefault(path, {"rss": 0, "pss": 0, "shared": 0, "private": 0}) \
+                    if path.startswith("/") else None
+                continue
+            key, value = parts[0][:-1], int(parts[1]) if parts[1].isdigit() else 0
+            field = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+                     "Private_Clean": "private", "Private_Dirty": "private"}.get(key)
+            if field is None:
+                continue
+            total[field] += value
+            if current is not None:
+                current[field] += value
+    return files, total
+
+
+def _read_psutil(pid: int) -> tuple:
+    """Équivalent (partiel) de _read_smaps via psutil : RSS par fichier, mémoire privée (USS)."""
+    proc = psutil.Process(pid)
+    files = {}
+    for m in proc.memory_maps(grouped=True):
+        rss = getattr(m, "rss", 0) // 1024
+        private = (getattr(m, "private_clean", 0) + getattr(m, "private_dirty", 0)) // 1024
+        files[m.path] = {"rss": rss, "pss": getattr(m, "pss", 0) // 1024,
+                         "shared": max(0, rss - private) if private else 0, "private": private}
+    info = proc.memory_full_info()
+    total = {"rss": info.rss // 1024, "pss": getattr(info, "pss", 0) // 1024,
+             "shared": 0, "private": getattr(info, "uss", 0) // 1024}
+    return files, total
+
+
+def process_memory(pid: int) -> tuple:
+    if os.path.exists(f"/proc/{pid}/smaps"):
+        return _read_smaps(pid)
+    if _PSUTIL_OK:
+        return _read_psutil(pid)
+    raise SystemExit("Mesure impossible : ni /proc (Linux) ni psutil (pip install psutil).")
+
+
+# ── Processus de test ─────────────────────────────────────────────────────────
+def _touch_index(base: Path, simple: bool) -> tuple:
+    """Ouvre la base comme l'appli et lit toutes ses pages. Retourne les objets ouverts."""
+    if simple:
+        embeddings, documents, metadata = index_store.load_simple_index(base)
+        bm25 = None
+    else:
+        embeddings, documents, metadata = index_store.load_index(base, quantized=True)
+        bm25 = bm25_index.load_bm25(index_store.active_dir(base), len(documents))
+    q = np.ones(embeddings.shape[1], dtype=np.float32)
+    if isinstance(embeddings, index_store.QuantizedEmbeddings):
+        embeddings.approx_scores(q)
+        embeddings.full @ q
+    else:
+        embeddings @ q
+    if bm25 is not None:
+        np.asarray(bm25.weights).sum()
+        np.asarray(bm25.docs).sum()
+    if hasattr(documents, "contains_any"):
+        documents.contains_any(["\x00"])          # parcourt tout texts.bin
+    else:
+        sum(len(doc) for doc in documents)
+    return embeddings, documents, metadata, bm25
+
+
+def _worker(base: str, simple: bool, load_model: bool, ready, stop) -> None:
+    keep = [_touch_index(Path(base), simple)]   # gardés ouverts jusqu'à la fin de la mesure
+    if load_model:
+        from sentence_transformers import SentenceTransformer
+        keep.append(SentenceTransformer(MODEL_NAME))
+    ready.release()
+    stop.wait()
+
+
+# ── Rapport ───────────────────────────────────────────────────────────────────
+def _mb(kb: int) -> str:
+    return f"{kb / 1024:8.1f}"
+
+
+def report(pids: list, base: Path) -> None:
+    base = base.resolve()
+    grand = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    sizes = {}
+    print(f"{'pid':>8}  {'fichier':<50}{'RSS':>9}{'PSS':>9}{'partagé':>9}{'privé':>9}  (Mo)")
+    for pid in pids:
+        files, total = process_memory(pid)
+        for path, mem in sorted(files.items()):
+            p = Path(path)
+            if base not in p.parents:
+                continue
+            sizes[path] = p.stat().st_size if p.exists() else 0
+            print(f"{pid:>8}  {str(p.relative_to(base)):<50}"
+                  f"{_mb(mem['rss'])} {_mb(mem['pss'])} {_mb(mem['shared'])} {_mb(mem['private'])}")
+            for k in grand:
+                grand[k] += mem[k]
+        print(f"{pid:>8}  {'(processus entier)':<50}"
+              f"{_mb(total['rss'])} {_mb(total['pss'])} {_mb(total['shared'])} {_mb(total['private'])}")
+    on_disk = sum(sizes.values()) // 1024
+    print(f"\nIndex ({base.name}/) sur {len(pids)} processus :")
+    print(f"  taille des fichiers mappés   {_mb(on_disk)} Mo")
+    print(f"  RSS cumulée                  {_mb(grand['rss'])} Mo  (ce que montre le gestionnaire de tâches)")
+    if grand["pss"]:
+        print(f"  PSS cumulée                  {_mb(grand['pss'])} Mo  (mémoire physique réellement occupée)")
+    if grand["rss"]:
+        print(f"  pages partagées              {100 * grand['shared'] / grand['rss']:8.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire partagée entre processus lisant la base vectorielle")
+    parser.add_argument("--base", default=str(ROOT / "vector_db"),
+                        help="Base à mesurer : vector_db/ (défaut) ou base_vectorielle/")
+    parser.add_argument("--workers", type=int, default=3, help="Nombre de processus lancés (défaut : 3)")
+    parser.add_argument("--model", action="store_true", help="Chaque processus charge aussi le modèle")
+    parser.add_argument("--pid", type=int, nargs="+", help="Mesurer des processus existants au lieu d'en lancer")
+    args = parser.parse_args()
+
+    base = Path(args.base)
+    if args.pid:
+        report(args.pid, base)
+        return
+    simple = index_store.simple_index_exists(base) and not index_store.index_exists(base)
+    if not simple and not index_store.index_exists(base):
+        raise SystemExit(f"Base absente : {base}")
+
+    ctx = mp.get_context("spawn")
+    ready, stop = ctx.Semaphore(0), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(str(base), simple, args.model, ready, stop))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        for _ in procs:
+            ready.acquire()
+        report([p.pid for p in procs], base)
+    finally:
+        stop.set()
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Profil du démarrage à froid de app.py (temps d'import et premier rendu).
+
+Les bibliothèques lourdes (torch via sentence_transformers, onnxruntime, groq, rank_bm25,
+plotly) ne sont importées qu'au moment où elles servent : chargement de l'encodeur, appel au
+LLM, ancien format BM25, onglet Statistiques. Ce script vérifie que ça reste le cas :
+  1. lance `python -X importtime -c "import app"` dans un processus neuf et affiche les
+     modules les plus coûteux (temps cumulé, imports enfants compris) ;
+  2. signale tout module lourd importé au démarrage (code de sortie 1) ;
+  3. avec --render, chronomètre le premier rendu de la page d'accueil (streamlit AppTest).
+
+Usage :
+  python scripts/profile_startup.py              # profil d'import, 25 modules les plus lents
+  python scripts/profile_startup.py --top 50
+  python scripts/profile_startup.py --render     # + temps du premier rendu de la page
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules qui ne doivent pas être chargés par un simple `import app`
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "onnxruntime", "groq", "rank_bm25")
+
+
+# ── Profil d'import ───────────────────────────────────────────────────────────
+def import_profile() -> tuple:
+    """([(cumulé µs, propre µs, module)], temps mur s) pour `import app` dans un processus neuf."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.splitlines()[-15:])
+        raise SystemExit(f"`import app` a échoué :\n{tail}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumul_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumul_us), int(self_us), name.rstrip()))
+    return rows, wall
+
+
+def heavy_imported(rows: list) -> list:
+    names = {name.strip() for _, _, name in rows}
+    return [m for m in HEAVY_MODULES if m in names]
+
+
+# ── Premier rendu ─────────────────────────────────────────────────────────────
+def first_render() -> float:
+    """Durée (s) du premier passage du script Streamlit sur la page d'accueil."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=120)
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        print(f"  (exception pendant le rendu : {at.exception[0].message})")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil du démarrage à froid de app.py")
+    parser.add_argument("--top", type=int, default=25, help="Nombre de modules affichés (défaut : 25)")
+    parser.add_argument("--render", action="store_true", help="Chronométrer aussi le premier rendu")
+    args = parser.parse_args()
+
+    rows, wall = import_profile()
+    total = next((c for c, _, name in rows if name.strip() == "app"), 0)
+    print(f"{'cumulé (ms)':>12}{'propre (ms)':>12}  module")
+    for cumul, own, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumul / 1000:12.1f}{own / 1000:12.1f}  {name}")
+    print(f"\nimport app : {total / 1e6:.2f} s (processus complet : {wall:.2f} s)")
+
+    if args.render:
+        print(f"premier rendu (AppTest) : {first_render():.2f} s")
+
+    heavy = heavy_imported(rows)
+    if heavy:
+        print(f"\nModules lourds importés au démarrage : {', '.join(heavy)}")
+        sys.exit(1)
+    print("Aucun module lourd importé au démarrage.")
+
+
+if __name__ == "__main__":
+    main()
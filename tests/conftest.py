@@ -0,0 +1,156 @@
+"""
+Outils communs aux tests : encodeur déterministe à la place du modèle d'embeddings, et
+arborescence du projet dans un répertoire temporaire pour lancer ingest.main.
+"""
+
+import argparse
+import json
+import re
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+
+class FakeModel:
+    """
+    Encodeur déterministe (interface SentenceTransformer.encode) : un vecteur pseudo-aléatoire
+    par texte, ou avec per_word=True la somme des vecteurs de ses mots en minuscules (les textes
+    qui partagent des mots sont proches, pour la recherche). Garde les textes encodés.
+    """
+
+    def __init__(self, dim: int = 16, per_word: bool = False):
+        self.dim = dim
+        self.per_word = per_word
+        self.encoded = []
+
+    def _vector(self, token: str) -> np.ndarray:
+        return np.random.default_rng(zlib.crc32(token.encode("utf-8"))).normal(size=self.dim)
+
+    def encode(self, texts, show_progress_bar=False):
+        texts = list(texts)
+        self.encoded.extend(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for k, text in enumerate(texts):
+            if self.per_word:
+                for token in re.findall(r"\w+", text.lower()):
+                    out[k] += self._vector(token)
+                out[k, 0] += 1e-3   # texte vide : vecteur non nul
+            else:
+                out[k] = self._vector(text)
+        return out
+
+
+@pytest.fixture
+def fake_model():
+    """Fabrique d'encodeurs déterministes : fake_model(dim=32, per_word=True)."""
+    return FakeModel
+
+
+# ── Indexation (ingest.main) sur un petit corpus ──────────────────────────────
+WORDS = ("conseil municipal délibération budget voirie cantine scolaire tarifs éclairage public "
+         "travaux école garderie château Pierrefonds forêt Compiègne marché subvention association "
+         "église mairie parking sentier").split()
+
+
+def paragraph(seed: int) -> str:
+    """Paragraphe synthétique (≈ 250 caractères) propre à `seed`."""
+    rng = np.random.default_rng(seed)
+    return " ".join(rng.choice(WORDS, size=30).tolist()).capitalize() + f" (montant {seed} €)."
+
+
+def md_page(*seeds) -> str:
+    """Contenu d'un .md de site web : en-tête puis un paragraphe par graine."""
+    return "Source : https://example.org/page\n---\n" + "\n".join(paragraph(s) for s in seeds)
+
+
+def write_pdf(path, pages: list, image_pages=(), tables=None) -> None:
+    """
+    PDF de test (PyMuPDF) : une page par texte de `pages` ("" : page vide). Les pages de
+    `image_pages` reçoivent une petite image, comme une page scannée ; tables : {n° de page:
+    lignes de cellules}, dessinées sous le texte comme un tableau à filets.
+    """
+    import fitz
+
+    doc = fitz.open()
+    for i, text in enumerate(pages):
+        page = doc.new_page(width=595, height=842)
+        if text:
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+        if i in image_pages:
+            pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+            pix.set_rect(pix.irect, (90, 90, 90))
+            page.insert_image(fitz.Rect(50, 200, 450, 600), pixmap=pix)
+        for r, row in enumerate((tables or {}).get(i, [])):
+            for c, cell in enumerate(row):
+                rect = fitz.Rect(50 + 160 * c, 400 + 24 * r, 210 + 160 * c, 424 + 24 * r)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+                page.insert_textbox(rect + (4, 6, -4, 0), cell, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def snapshot(db_dir) -> dict:
+    """Textes, métadonnées, manifest et embeddings de la version active de db_dir."""
+    import index_store
+    import ingest
+
+    version = index_store.active_dir(db_dir)
+    embeddings, documents, metadata = index_store.load_index(db_dir)
+    manifest = json.loads((version / ingest.MANIFEST_NAME).read_text(encoding="utf-8"))
+    snap = {"documents": list(documents), "metadata": list(metadata), "files": manifest["files"],
+            "embeddings": np.array(embeddings)}
+    documents.close()
+    return snap
+
+
+def assert_same_index(db_dir, other_dir) -> None:
+    """Les deux bases ont les mêmes lignes, métadonnées, manifest et embeddings."""
+    got, expected = snapshot(db_dir), snapshot(other_dir)
+    assert got["documents"] == expected["documents"]
+    assert got["metadata"] == expected["metadata"]
+    assert got["files"] == expected["files"]
+    np.testing.assert_allclose(got["embeddings"], expected["embeddings"], rtol=1e-6, atol=1e-7)
+
+
+@pytest.fixture
+def ingest_workspace(tmp_path, monkeypatch, fake_model):
+    """
+    Projet dans tmp_path pour ingest.main : knowledge_sites/ et static/ vides, caches et
+    vector_db/ à part, modèle factice. run(db_name, **options) lance une indexation ; page(),
+    write_pdf(), snapshot() et assert_same_index() pour écrire les sources et comparer les bases.
+    """
+    ingest = pytest.importorskip("ingest")
+    knowledge = tmp_path / "knowledge_sites"
+    knowledge.mkdir()
+    static = tmp_path / "static"
+    static.mkdir()
+    cache = tmp_path / "cache"
+    model = fake_model()
+    monkeypatch.setattr(ingest, "APP_DIR", tmp_path)
+    monkeypatch.setattr(ingest, "KNOWLEDGE_DIR", knowledge)
+    monkeypatch.setattr(ingest, "STATIC_DIR", static)
+    monkeypatch.setattr(ingest, "JOURNAL_DIR", tmp_path / "journal")
+    monkeypatch.setattr(ingest, "IMAGES_DIR", tmp_path / "source" / "images")
+    monkeypatch.setattr(ingest, "CACHE_DIR", cache)
+    monkeypatch.setattr(ingest, "EMBED_CACHE_FILE", cache / "embeddings.sqlite")
+    monkeypatch.setattr(ingest, "OCR_CACHE_FILE", cache / "ocr_pages.sqlite")
+    monkeypatch.setattr(ingest, "CHECKPOINT_DIR", cache / "ingest_checkpoint")
+    monkeypatch.setattr(ingest, "PROGRESS_FILE", cache / "ingest_progress.json")
+    monkeypatch.setattr(ingest, "PDF_BACKEND", "pdfplumber")
+    monkeypatch.setattr(ingest, "DEDUP", True)
+    monkeypatch.setattr(ingest, "QUANTIZE", "int8")
+    monkeypatch.setattr(ingest, "_load_model", lambda: model)
+
+    def run(db_name: str = "vector_db", full: bool = False, resume: bool = False, workers: int = 1,
+            pdf_backend: str | None = None):
+        monkeypatch.setattr(ingest, "DB_DIR", tmp_path / db_name)
+        model.encoded.clear()
+        ingest.main(argparse.Namespace(md_only=False, md_dir=None, full=full, workers=workers,
+                                       resume=resume, pdf_backend=pdf_backend))
+        return tmp_path / db_name
+
+    return types.SimpleNamespace(root=tmp_path, knowledge=knowledge, static=static, cache=cache,
+                                 model=model, run=run, page=md_page, write_pdf=write_pdf, snapshot=snapshot,
+                                 assert_same_index=assert_same_index)
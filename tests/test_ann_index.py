@@ -0,0 +1,59 @@
+"""
+Index approché IVF (ann_index.py) : partition de toutes les lignes, résultat exact quand tous
+les groupes sont sondés, bon rappel avec quelques groupes, fichier ivf.npz périmé ignoré.
+"""
+
+import numpy as np
+
+import ann_index
+
+
+def _clustered(n: int = 2000, dim: int = 24, centers: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    c = rng.normal(size=(centers, dim))
+    x = c[rng.integers(centers, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x.astype(np.float32)
+
+
+def test_lists_partition_all_rows():
+    emb = _clustered()
+    ivf = ann_index.build_ivf(emb, nlist=32)
+    assert ivf.nlist == 32 and ivf.rows == len(emb)
+    assert np.array_equal(np.sort(ivf.ids), np.arange(len(emb)))
+    assert ivf.offsets[0] == 0 and ivf.offsets[-1] == len(emb)
+
+
+def test_full_probe_is_exact_and_few_probes_recall():
+    emb = _clustered()
+    ivf = ann_index.build_ivf(emb, nlist=32)
+    queries = _clustered(n=20, seed=1)
+    recall = []
+    for q in queries:
+        exact = np.argsort(emb @ q)[::-1][:10]
+        rows, scores = ivf.search(emb, q, 10, nprobe=ivf.nlist)
+        assert rows.tolist() == exact.tolist()
+        np.testing.assert_allclose(scores, (emb @ q)[exact], rtol=1e-6)
+        approx, _ = ivf.search(emb, q, 10, nprobe=4)
+        recall.append(len(set(approx.tolist()) & set(exact.tolist())) / 10)
+    assert np.mean(recall) >= 0.9
+
+
+def test_write_and_load(tmp_path):
+    emb = _clustered(n=300)
+    assert ann_index.write_ivf(tmp_path, emb, force=False) is None
+    assert ann_index.load_ivf(tmp_path, emb) is None
+    ivf = ann_index.write_ivf(tmp_path, emb, force=True)
+    loaded = ann_index.load_ivf(tmp_path, emb)
+    assert loaded is not None and loaded.nlist == ivf.nlist
+    np.testing.assert_array_equal(loaded.ids, ivf.ids)
+    q = emb[7]
+    np.testing.assert_array_equal(loaded.candidates(q, 3), ivf.candidates(q, 3))
+    # Autres embeddings (base réindexée sans ivf.npz à jour) : index ignoré
+    assert ann_index.load_ivf(tmp_path, emb[:-1]) is None
+    changed = emb.copy()
+    changed[len(emb) // 2] *= -1
+    assert ann_index.load_ivf(tmp_path, changed) is None
+    # Base devenue petite : ivf.npz supprimé
+    assert ann_index.write_ivf(tmp_path, emb, force=False) is None
+    assert not (tmp_path / ann_index.IVF_FILE).exists()
@@ -0,0 +1,136 @@
+"""
+Cache des réponses du LLM (app.ask_claude_stream) : rejeu, clé, TTL, flux incomplets.
+Groq est remplacé par un faux client qui compte les appels ; aucune base ni clé réelle.
+"""
+
+import importlib.machinery
+import sys
+import types
+
+import pytest
+
+import app
+import result_cache
+
+
+QUESTION = "Comment ont évolué les tarifs de la cantine ?"
+PASSAGES = [
+    ("Tarifs de la restauration scolaire 2024 : 3,10 €.", {"filename": "PV-2024.pdf", "chunk": 3, "year": "2024"}, 0.8),
+    ("Voirie : réfection de la rue de l'Armistice.", {"filename": "PV-2025.pdf", "chunk": 1, "year": "2025"}, 0.6),
+]
+ANSWER = ["Les tarifs ", "ont augmenté [1].\n", "Voir aussi [2]."]
+
+
+class _FakeGroq:
+    """Client Groq minimal : chaque appel streame ANSWER puis l'usage (comme x_groq)."""
+
+    calls = 0
+    fail_after = None   # nombre de morceaux avant une erreur réseau simulée
+
+    def __init__(self, api_key):
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        _FakeGroq.calls += 1
+        return self._stream()
+
+    def _stream(self):
+        for i, piece in enumerate(ANSWER):
+            if _FakeGroq.fail_after is not None and i == _FakeGroq.fail_after:
+                raise ConnectionError("flux interrompu")
+            delta = types.SimpleNamespace(content=piece)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+        usage = types.SimpleNamespace(total_tokens=321)
+        yield types.SimpleNamespace(choices=[], x_groq=types.SimpleNamespace(usage=usage))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge du cache, avancée à la main."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def cache(monkeypatch, clock):
+    groq = types.ModuleType("groq")
+    groq.__spec__ = importlib.machinery.ModuleSpec("groq", None)
+    groq.Groq = _FakeGroq
+    monkeypatch.setitem(sys.modules, "groq", groq)
+    monkeypatch.setattr(app, "_GROQ_OK", True)
+    monkeypatch.setattr(app.st, "secrets", {"GROQ_API_KEY": "gsk_test"})
+    monkeypatch.setattr(_FakeGroq, "calls", 0)
+    monkeypatch.setattr(_FakeGroq, "fail_after", None)
+    answers = app._AnswerCache(16, None, ttl=3600, max_disk_entries=100)
+    monkeypatch.setattr(app, "_answer_cache", lambda: answers)
+    return answers
+
+
+def _ask(question=QUESTION, passages=PASSAGES, **kw):
+    return "".join(app.ask_claude_stream(question, passages, **kw))
+
+
+def test_hit_replays_answer_without_calling_groq(cache, monkeypatch):
+    first = _ask()
+    # Rejouée même sans clé : aucun appel à Groq
+    monkeypatch.setattr(app.st, "secrets", {})
+    second = _ask()
+    assert first == second == "".join(ANSWER)
+    assert _FakeGroq.calls == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["saved_tokens"] == 321
+
+
+def test_replay_keeps_streaming_interface(cache):
+    _ask()
+    pieces = list(app.ask_claude_stream(QUESTION, PASSAGES))
+    assert len(pieces) > 1 and "".join(pieces) == "".join(ANSWER)
+
+
+def test_miss_when_question_or_passages_differ(cache):
+    _ask()
+    _ask(question="Quels travaux de voirie ?")
+    _ask(passages=PASSAGES[:1])
+    # Même fichier et chunk mais autre texte (réindexation) : autre message envoyé, autre clé
+    changed = [(doc + " (corrigé)", meta, score) for doc, meta, score in PASSAGES]
+    _ask(passages=changed)
+    assert _FakeGroq.calls == 4
+    assert cache.stats()["hits"] == 0
+
+
+def test_expired_answer_is_regenerated(cache, clock):
+    _ask()
+    clock[0] += 3599
+    _ask()
+    assert _FakeGroq.calls == 1
+    clock[0] += 2   # écrite il y a 3601 s > TTL
+    _ask()
+    assert _FakeGroq.calls == 2
+    assert cache.stats()["expired"] == 1
+
+
+def test_abandoned_stream_is_not_stored(cache):
+    stream = app.ask_claude_stream(QUESTION, PASSAGES)
+    next(stream)
+    stream.close()   # l'utilisateur a quitté la page en cours de réponse
+    _ask()
+    assert _FakeGroq.calls == 2
+
+
+def test_failed_stream_is_not_stored(cache):
+    _FakeGroq.fail_after = 2
+    with pytest.raises(ConnectionError):
+        _ask()
+    _FakeGroq.fail_after = None
+    assert _ask() == "".join(ANSWER)
+    assert _FakeGroq.calls == 2
+    assert cache.stats()["hits"] == 0
+
+
+def test_use_cache_false_always_calls_groq(cache):
+    _ask()
+    _ask(use_cache=False)
+    assert _FakeGroq.calls == 2
+    assert cache.stats()["hits"] == 0
@@ -0,0 +1,64 @@
+"""
+Matrice BM25 précalculée (bm25_index.py) : mêmes scores que rank_bm25.BM25Okapi sur un petit
+corpus synthétique, y compris l'idf négatif remplacé par epsilon × idf moyen.
+"""
+
+import numpy as np
+import pytest
+
+import bm25_index
+
+BM25Okapi = pytest.importorskip("rank_bm25").BM25Okapi
+
+
+DOCUMENTS = [
+    "Le conseil municipal approuve les tarifs de la cantine scolaire.",
+    "Le conseil municipal vote le budget : voirie, éclairage public.",
+    "Réfection de la rue de l'Armistice, le conseil valide le devis.",
+    "Le conseil municipal fixe les tarifs de la cantine et de la garderie.",
+    "Histoire du château de Pierrefonds.",
+    "",
+    "Le conseil : le le le conseil, tarifs, tarifs.",
+]
+QUERIES = [
+    "tarifs de la cantine",
+    "conseil municipal",          # termes présents dans la plupart des chunks : idf ≤ 0
+    "Château PIERREFONDS",
+    "tarifs tarifs cantine",      # répétitions comptées
+    "mot absent du corpus",
+    "",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    bm25_index.write_bm25(tmp_path, DOCUMENTS)
+    return bm25_index.load_bm25(tmp_path, len(DOCUMENTS))
+
+
+@pytest.fixture
+def reference():
+    return BM25Okapi([bm25_index.tokenize(d) for d in DOCUMENTS])
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_bm25okapi(index, reference, query):
+    tokens = bm25_index.tokenize(query)
+    np.testing.assert_allclose(index.get_scores(tokens), reference.get_scores(tokens),
+                               rtol=1e-5, atol=1e-6)
+
+
+def test_scores_many_match_single_queries(index, reference):
+    queries = [bm25_index.tokenize(q) for q in QUERIES]
+    scores = index.get_scores_many(queries)
+    assert scores.shape == (len(QUERIES), len(DOCUMENTS))
+    for k, tokens in enumerate(queries):
+        np.testing.assert_array_equal(scores[k], index.get_scores(tokens))
+        np.testing.assert_allclose(scores[k], reference.get_scores(tokens), rtol=1e-5, atol=1e-6)
+
+
+def test_load_rejects_stale_matrix(tmp_path):
+    assert bm25_index.load_bm25(tmp_path, len(DOCUMENTS)) is None
+    bm25_index.write_bm25(tmp_path, DOCUMENTS)
+    assert bm25_index.bm25_exists(tmp_path)
+    assert bm25_index.load_bm25(tmp_path, len(DOCUMENTS) + 1) is None
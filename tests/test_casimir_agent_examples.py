@@ -5,15 +5,10 @@ from pathlib import Path
 import pytest
 
 import app
+import index_store
 
 
-VECTOR_DB_FILES = [
-    app.DB_DIR / "embeddings.npy",
-    app.DB_DIR / "documents.pkl",
-    app.DB_DIR / "metadata.pkl",
-]
-
-VECTOR_DB_PRESENT = all(p.exists() for p in VECTOR_DB_FILES)
+VECTOR_DB_PRESENT = index_store.index_exists(app.DB_DIR)
 
 requires_vector_db = pytest.mark.skipif(
     not VECTOR_DB_PRESENT,
@@ -79,7 +74,8 @@ def test_agent_answer_close_to_baseline(question: str, loaded_db):
     assert passages, f"Aucun passage trouvé pour la question : {question}"
 
     raw_chunks = []
-    for piece in app.ask_claude_stream(question, passages):
+    # Sans le cache des réponses : sinon la baseline serait rejouée telle quelle
+    for piece in app.ask_claude_stream(question, passages, use_cache=False):
         raw_chunks.append(piece)
     current_answer = "".join(raw_chunks)
     current_answer = current_answer.strip()
@@ -0,0 +1,59 @@
+"""
+Étiquettes précalculées des chunks (chunk_tags.py) : mêmes lignes que les regex appliquées
+texte par texte, aller-retour tags.npy / tags.json, fichier périmé ignoré.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import chunk_tags
+
+
+TEXTS = [
+    "Tarifs de la restauration scolaire : barème 2024, 3,10 € le repas.",
+    "Réfection de la rue de l'Armistice : crédit de 45 000 € HT.",
+    "Renouvellement des logiciels Horizon Villages Cloud (DETR).",
+    "Le château de Pierrefonds restauré par Viollet-le-Duc.",
+    "Accueil de loisirs : restauration scolaire du mercredi.",
+    "",
+    "Compte rendu sans chiffre ni sujet particulier.",
+]
+FILENAMES = ["PV-2024.pdf", "PV-2023.PDF", "[Web] horizon", "[Web] chateau", "PV-2025.pdf", "vide.pdf", "[Web] cr"]
+
+
+def _expected(name: str) -> np.ndarray:
+    _, pattern = chunk_tags.TAGS[name]
+    if pattern is None:
+        return np.array([f.lower().endswith(".pdf") for f in FILENAMES])
+    return np.array([bool(pattern.search(t)) for t in TEXTS])
+
+
+@pytest.mark.parametrize("name", list(chunk_tags.TAGS))
+def test_each_tag_matches_its_pattern(name):
+    tags = chunk_tags.ChunkTags(chunk_tags.compute_tags(TEXTS, FILENAMES))
+    np.testing.assert_array_equal(tags.mask(name), _expected(name))
+    assert [tags.has(i, name) for i in range(len(TEXTS))] == _expected(name).tolist()
+
+
+def test_combined_mask_and_select():
+    tags = chunk_tags.ChunkTags(chunk_tags.compute_tags(TEXTS, FILENAMES))
+    both = _expected("pdf") & _expected("amount")
+    np.testing.assert_array_equal(tags.mask("pdf", "amount"), both)
+    rows = np.array([0, 1, 2, 4])
+    assert tags.select(rows, "pdf", "amount").tolist() == [r for r in rows.tolist() if both[r]]
+    assert tags.mask().all()
+
+
+def test_write_and_load(tmp_path):
+    bits = chunk_tags.write_tags(tmp_path, TEXTS, FILENAMES)
+    tags = chunk_tags.load_tags(tmp_path, len(TEXTS))
+    assert tags is not None
+    np.testing.assert_array_equal(np.asarray(tags.bits), bits)
+    assert chunk_tags.load_tags(tmp_path, len(TEXTS) + 1) is None
+    # Écrit avec d'autres motifs : recalculé par l'appli
+    meta_file = tmp_path / chunk_tags.META_FILE
+    meta = json.loads(meta_file.read_text(encoding="utf-8"))
+    meta_file.write_text(json.dumps({**meta, "signature": "autre"}), encoding="utf-8")
+    assert chunk_tags.load_tags(tmp_path, len(TEXTS)) is None
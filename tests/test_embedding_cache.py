@@ -0,0 +1,66 @@
+"""
+Cache disque des embeddings (embedding_cache.EmbeddingCache) : seuls les textes absents sont
+encodés, par modèle, dans l'ordre d'entrée ; éviction LRU au-delà de max_entries.
+"""
+
+import types
+
+import numpy as np
+import pytest
+
+import embedding_cache
+
+
+@pytest.fixture
+def model(fake_model):
+    return fake_model(dim=8)
+
+
+def test_only_missing_texts_are_encoded(tmp_path, model, fake_model):
+    path = tmp_path / "embeddings.sqlite"
+    texts = [f"chunk {i}" for i in range(10)]
+    cache = embedding_cache.EmbeddingCache(path, "m")
+    first = cache.encode(texts[:6], lambda: model, batch_size=4)
+    cache.close()
+
+    cache = embedding_cache.EmbeddingCache(path, "m")
+    second = cache.encode(texts, lambda: model, batch_size=4)
+    assert model.encoded == texts[:6] + texts[6:]
+    assert (cache.hits, cache.misses) == (6, 4)
+    np.testing.assert_array_equal(second[:6], first)
+    np.testing.assert_array_equal(second, fake_model(dim=8).encode(texts))
+    cache.close()
+
+
+def test_model_not_loaded_when_everything_is_cached(tmp_path, model):
+    cache = embedding_cache.EmbeddingCache(tmp_path / "e.sqlite", "m")
+    cache.encode(["a", "b"], lambda: model)
+
+    def _fail():
+        raise AssertionError("modèle chargé inutilement")
+
+    batches = list(cache.iter_encode(["b", "a", "b"], _fail, batch_size=2))
+    assert [len(b) for b in batches] == [2, 1]
+    assert cache.encode([], _fail).shape == (0, 0)
+    cache.close()
+
+
+def test_entries_are_per_model(tmp_path, model):
+    path = tmp_path / "e.sqlite"
+    embedding_cache.EmbeddingCache(path, "m1").encode(["a"], lambda: model)
+    other = embedding_cache.EmbeddingCache(path, "m2")
+    assert other.get_many(["a"]) == [None]
+
+
+def test_evict_keeps_most_recently_used(tmp_path, model, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(embedding_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    cache = embedding_cache.EmbeddingCache(tmp_path / "e.sqlite", "m", max_entries=2)
+    for text in ("a", "b", "c"):
+        now[0] += 1
+        cache.encode([text], lambda: model)
+    now[0] += 1
+    cache.get_many(["a"])   # « a » redevient récent
+    assert cache.evict() == 1
+    assert [v is not None for v in cache.get_many(["a", "b", "c"])] == [True, False, True]
+    cache.close()
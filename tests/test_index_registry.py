@@ -0,0 +1,78 @@
+"""
+Registre des versions de vector_db/ (app._IndexRegistry) : une nouvelle version publiée est
+chargée en tâche de fond puis servie ; les runs en cours gardent l'ancienne, qui reste
+ouverte jusqu'à la bascule suivante. Petites versions synthétiques dans un répertoire temporaire.
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+import app
+import index_store
+
+
+def _publish(db_dir, documents: list, broken: bool = False) -> str:
+    out = index_store.new_version_dir(db_dir)
+    emb = np.eye(len(documents), 8, dtype=np.float32)
+    np.save(out / index_store.EMBEDDINGS_FILE, emb[:-1] if broken else emb)
+    metadata = [{"filename": f"PV-{i}.pdf", "year": "2024", "chunk": 0, "total_chunks": 1}
+                for i in range(len(documents))]
+    index_store.save_index(out, documents, metadata, emb.shape[1])
+    index_store.publish_version(db_dir, out)
+    return out.name
+
+
+def _wait_loaded(registry, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while registry.loading is not None:
+        assert time.monotonic() < deadline, "chargement en tâche de fond trop long"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_DIR", tmp_path)
+    return tmp_path
+
+
+def test_new_version_is_swapped_in_after_background_load(db_dir):
+    _publish(db_dir, ["v1 : tarifs de la cantine", "v1 : voirie"])
+    registry = app._IndexRegistry()
+    run1 = registry.get()                       # premier chargement : synchrone
+    assert list(run1[1]) == ["v1 : tarifs de la cantine", "v1 : voirie"]
+
+    second = _publish(db_dir, ["v2 : tarifs", "v2 : voirie", "v2 : château"])
+    assert registry.get() is run1               # pendant le chargement : l'ancienne est servie
+    _wait_loaded(registry)
+    run2 = registry.get()
+    assert list(run2[1])[-1] == "v2 : château"
+    assert registry.current.name == second
+
+    # Un run commencé avant la bascule garde sa version, toujours ouverte et reconnue
+    assert registry.version_for(run1[0]) == run1[6]
+    assert registry.version_for(run2[0]) == run2[6]
+    assert registry.live_versions() == {run1[6], run2[6]}
+    assert run1[1][0] == "v1 : tarifs de la cantine"
+
+    # Bascule suivante : seules la courante et la précédente restent ouvertes
+    _publish(db_dir, ["v3"])
+    registry.get()
+    _wait_loaded(registry)
+    run3 = registry.get()
+    assert registry.version_for(run1[0]) is None
+    assert registry.live_versions() == {run2[6], run3[6]}
+
+
+def test_failed_load_keeps_serving_current_version(db_dir, capsys):
+    _publish(db_dir, ["v1 : tarifs", "v1 : voirie"])
+    registry = app._IndexRegistry()
+    run1 = registry.get()
+    broken = _publish(db_dir, ["v2 : a", "v2 : b"], broken=True)   # fichiers incohérents
+    registry.get()
+    _wait_loaded(registry)
+    assert registry.get() is run1
+    assert registry.failed.name == broken
+    assert registry.loading is None             # pas de nouvel essai pour la même version
+    assert "Echec du chargement" in capsys.readouterr().out
@@ -0,0 +1,106 @@
+"""
+Format disque de la base vectorielle (index_store.py) : aller-retour save_index / load_index
+sur une petite base synthétique, dans un répertoire temporaire.
+"""
+
+import numpy as np
+import pytest
+
+import index_store
+
+
+DOCUMENTS = [
+    "Délibération n°1 : tarifs de la cantine scolaire, 3,10 € le repas.",
+    "",
+    "Réfection de la RUE DE L'ARMISTICE — crédit de 45 000 € HT.",
+    "Page web : histoire du château de Pierrefonds (Viollet-le-Duc).",
+    "[Tableau] Quotient | Tarif\n< 500 | 2,50\n≥ 500 | 3,10",
+    "Deuxième chunk du PV de 2024 : éclairage public.",
+]
+METADATA = [
+    {"filename": "PV-2024.pdf", "rel_path": "PV-2024.pdf", "date": "2024-03-12", "year": "2024",
+     "chunk": 0, "total_chunks": 3},
+    {"filename": "PV-2023.pdf", "rel_path": "PV-2023.pdf", "date": "2023-01-01", "year": "2023",
+     "chunk": 0, "total_chunks": 1},
+    {"filename": "PV-2025.pdf", "rel_path": "journal/PV-2025.pdf", "date": "2025-06-30", "year": "2025",
+     "chunk": 0, "total_chunks": 1,
+     "sources": [{"filename": "PV-2025.md", "chunk": 4}]},   # champ rare (fusion des doublons)
+    {"filename": "[Web] chateau.md", "rel_path": "chateau.md", "date": "web", "year": "web",
+     "chunk": 0, "total_chunks": 1, "source_url": "https://example.org/chateau"},
+    {"filename": "PV-2024.pdf", "rel_path": "PV-2024.pdf", "date": "2024-03-12", "year": "2024",
+     "chunk": 2, "total_chunks": 3, "is_table": True},
+    {"filename": "PV-2024.pdf", "rel_path": "PV-2024.pdf", "date": "2024-03-12", "year": "2024",
+     "chunk": 1, "total_chunks": 3},
+]
+
+
+@pytest.fixture
+def db_dir(tmp_path):
+    """vector_db/ avec une version publiée (embeddings + copie int8 + textes + métadonnées)."""
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(len(DOCUMENTS), 16)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    out = index_store.new_version_dir(tmp_path)
+    np.save(out / index_store.EMBEDDINGS_FILE, emb)
+    index_store.save_quantized(out, "int8")
+    index_store.save_index(out, DOCUMENTS, METADATA, emb.shape[1], quantization="int8")
+    index_store.publish_version(tmp_path, out)
+    return tmp_path, emb
+
+
+def test_round_trip_documents_and_metadata(db_dir):
+    root, emb = db_dir
+    embeddings, documents, metadata = index_store.load_index(root)
+    np.testing.assert_array_equal(np.asarray(embeddings), emb)
+    assert len(documents) == len(metadata) == len(DOCUMENTS)
+    assert list(documents) == DOCUMENTS
+    assert [documents[i] for i in range(len(DOCUMENTS))] == DOCUMENTS
+    assert documents[1:3] == DOCUMENTS[1:3]
+    assert list(metadata) == METADATA
+    assert [metadata[i] for i in range(len(METADATA))] == METADATA
+    assert metadata[-1] == METADATA[-1]
+
+
+def test_round_trip_columns_and_directories(db_dir):
+    root, _ = db_dir
+    _, _, metadata = index_store.load_index(root)
+    assert metadata.column("year").tolist() == [m["year"] for m in METADATA]
+    assert metadata.year_num.tolist() == [2024, 2023, 2025, 0, 2024, 2024]
+    # Répertoire des documents : lignes du fichier par n° de chunk croissant
+    assert metadata.file_rows("PV-2024.pdf").tolist() == [0, 5, 4]
+    assert metadata.file_rows("absent.pdf").tolist() == []
+    assert metadata.row_of("PV-2024.pdf", 2) == 4
+    assert metadata.row_of("PV-2024.pdf", 7) is None
+    assert metadata.year_rows(["2024", "2025"]).tolist() == [0, 2, 4, 5]
+    assert metadata.year_rows([2023]).tolist() == [1]
+
+
+def test_quantized_copy_matches_float32(db_dir):
+    root, emb = db_dir
+    embeddings, _, _ = index_store.load_index(root, quantized=True)
+    assert isinstance(embeddings, index_store.QuantizedEmbeddings)
+    q = emb[2]
+    np.testing.assert_allclose(embeddings.approx_scores(q), emb @ q, atol=0.02)
+    rows = np.array([1, 4])
+    np.testing.assert_allclose(embeddings.approx_scores(q, rows=rows), (emb @ q)[rows], atol=0.02)
+    np.testing.assert_allclose(embeddings.exact_scores(q, rows), (emb @ q)[rows], rtol=1e-6)
+
+
+def test_load_rejects_inconsistent_files(db_dir):
+    root, emb = db_dir
+    version = index_store.active_dir(root)
+    np.save(version / index_store.EMBEDDINGS_FILE, emb[:-1])
+    with pytest.raises(ValueError):
+        index_store.load_index(root)
+
+
+def test_publish_switches_active_version(db_dir):
+    root, _ = db_dir
+    first = index_store.active_dir(root)
+    out = index_store.new_version_dir(root)
+    np.save(out / index_store.EMBEDDINGS_FILE, np.eye(2, 16, dtype=np.float32))
+    index_store.save_index(out, ["a", "b"], [{"filename": "a.md", "chunk": 0}, {"filename": "b.md", "chunk": 0}], 16)
+    assert index_store.publish_version(root, out) == first.name
+    _, documents, _ = index_store.load_index(root)
+    assert list(documents) == ["a", "b"]
+    assert index_store.prune_versions(root, {out.name}) == [first.name]
@@ -0,0 +1,54 @@
+"""
+Indexation incrémentale (ingest.main) : après ajout, modification et suppression de fichiers,
+la version produite par un run incrémental est identique à celle d'un run --full, y compris
+quand le fichier supprimé gardait les chunks fusionnés d'un autre (quasi-doublons).
+Petit corpus .md dans un répertoire temporaire ; le modèle est un encodeur déterministe.
+"""
+
+import pytest
+
+ingest = pytest.importorskip("ingest")
+
+
+def test_incremental_matches_full_after_changes(ingest_workspace, capsys):
+    ws = ingest_workspace
+    for name, seeds in {"a.md": (1, 2, 3), "c.md": (4, 5, 6), "d.md": (7, 8, 9)}.items():
+        (ws.knowledge / name).write_text(ws.page(*seeds), encoding="utf-8")
+    db = ws.run()
+    rows_before = len(ws.snapshot(db)["documents"])
+
+    (ws.knowledge / "c.md").write_text(ws.page(4, 10, 6), encoding="utf-8")   # modifié
+    (ws.knowledge / "e.md").write_text(ws.page(11, 12), encoding="utf-8")     # ajouté
+    (ws.knowledge / "d.md").unlink()                                          # supprimé
+    capsys.readouterr()
+    db = ws.run()
+    assert "Incremental : 1 fichier(s) inchange(s), 2 nouveau(x)/modifie(s), 1 supprime(s)" in capsys.readouterr().out
+    # Seuls les chunks des fichiers modifiés / ajoutés sont encodés (a.md : lignes recopiées)
+    a_docs, _ = ingest._extract_md(ws.knowledge / "a.md")
+    assert ws.model.encoded and not set(ws.model.encoded) & set(a_docs)
+    assert len(ws.snapshot(db)["documents"]) != rows_before
+
+    ws.assert_same_index(db, ws.run("vector_db_full", full=True))
+
+
+def test_deleting_dedup_keeper_restores_merged_copies(ingest_workspace, capsys):
+    ws = ingest_workspace
+    (ws.knowledge / "a.md").write_text(ws.page(1, 2, 3, 4), encoding="utf-8")
+    (ws.knowledge / "b.md").write_text(ws.page(1, 2, 3, 4), encoding="utf-8")   # copie de a.md
+    (ws.knowledge / "c.md").write_text(ws.page(20, 21), encoding="utf-8")
+    db = ws.run()
+    snap = ws.snapshot(db)
+    a_key, b_key = "knowledge_sites/a.md", "knowledge_sites/b.md"
+    # b.md fusionné dans a.md : aucune ligne, mais la référence reste dans les métadonnées de a.md
+    assert snap["files"][b_key]["rows"][0] == snap["files"][b_key]["rows"][1]
+    assert snap["files"][b_key]["merged_into"] == [a_key]
+    assert any(ref["source_key"] == b_key for m in snap["metadata"] for ref in m.get("sources", ()))
+
+    (ws.knowledge / "a.md").unlink()   # la copie gardée disparaît : b.md doit être réextrait
+    capsys.readouterr()
+    db = ws.run()
+    assert "Incremental : 1 fichier(s) inchange(s), 1 nouveau(x)/modifie(s), 1 supprime(s)" in capsys.readouterr().out
+    snap = ws.snapshot(db)
+    assert snap["files"][b_key]["rows"][1] > snap["files"][b_key]["rows"][0]
+    assert not any(m.get("sources") for m in snap["metadata"])
+    ws.assert_same_index(db, ws.run("vector_db_full", full=True))
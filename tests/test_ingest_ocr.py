@@ -0,0 +1,93 @@
+"""
+OCR des pages scannées (ingest.extract_text_ocr, OcrPageCache) avec des moteurs OCR factices :
+seules les pages sans texte mais avec une image sont OCRisées, un second passage est servi par
+le cache de pages, et la clé du cache change avec le DPI et le moteur.
+"""
+
+import pytest
+
+ingest = pytest.importorskip("ingest")
+pytest.importorskip("fitz")
+
+TEXT = "Compte rendu du conseil municipal : tarifs de la cantine scolaire et travaux de voirie."
+
+
+@pytest.fixture
+def ocr(ingest_workspace, monkeypatch):
+    """Moteurs Tesseract / EasyOCR factices ; calls : (moteur, DPI, largeur du rendu) par page OCRisée."""
+    calls = []
+
+    def _engine(name):
+        def _ocr(pix):
+            calls.append((name, ingest.OCR_DPI, pix.width))
+            return f"Page scannée lue par {name} : délibération sur le budget de l'école."
+        return _ocr
+
+    monkeypatch.setattr(ingest, "_OCR_AVAILABLE", True)
+    monkeypatch.setattr(ingest, "_OCR_TESSERACT", True)
+    monkeypatch.setattr(ingest, "_ocr_tesseract", _engine("tesseract"))
+    monkeypatch.setattr(ingest, "_ocr_easyocr", _engine("easyocr"))
+    return calls
+
+
+@pytest.fixture
+def pdf(ingest_workspace):
+    # Page 0 : texte ; page 1 : image seule (scannée) ; page 2 : blanche, sans image
+    path = ingest_workspace.static / "PV-2024-03-12.pdf"
+    ingest_workspace.write_pdf(path, [TEXT, "", ""], image_pages={1})
+    return path
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pymupdf"])
+def test_only_image_pages_without_text_are_ocred(pdf, ocr, backend):
+    pages_text, _, scanned = ingest._read_pdf(pdf, backend)
+    assert scanned == [1]
+    assert pages_text[2] == ""
+    docs, _, message = ingest._extract_pdf(pdf, read=(pages_text, [], scanned))
+    assert [name for name, _, _ in ocr] == ["tesseract"]
+    assert "OCR 1 page(s)" in message
+    assert "lue par tesseract" in " ".join(docs)
+
+
+def test_rerun_is_served_from_page_cache(pdf, ocr):
+    first = ingest._extract_pdf(pdf)
+    assert len(ocr) == 1
+    assert ingest._extract_pdf(pdf) == first
+    assert len(ocr) == 1
+    # Même contenu sous un autre nom : même hash, toujours servi par le cache
+    copy = pdf.with_name("PV-2024-03-13.pdf")
+    copy.write_bytes(pdf.read_bytes())
+    ingest._extract_pdf(copy)
+    assert len(ocr) == 1
+
+
+def test_cache_key_includes_dpi_and_engine(pdf, ocr, monkeypatch):
+    ingest._extract_pdf(pdf)
+    monkeypatch.setattr(ingest, "OCR_DPI", 100)
+    ingest._extract_pdf(pdf)
+    assert [(name, dpi) for name, dpi, _ in ocr] == [("tesseract", 200), ("tesseract", 100)]
+    assert ocr[1][2] < ocr[0][2]   # page rendue à la nouvelle résolution
+
+    monkeypatch.setattr(ingest, "_OCR_TESSERACT", False)
+    docs, _, _ = ingest._extract_pdf(pdf)
+    assert ocr[-1][:2] == ("easyocr", 100)
+    assert "lue par easyocr" in " ".join(docs)
+
+    # Retour aux réglages précédents : chaque variante est restée en cache
+    ingest._extract_pdf(pdf)
+    monkeypatch.setattr(ingest, "_OCR_TESSERACT", True)
+    monkeypatch.setattr(ingest, "OCR_DPI", 200)
+    ingest._extract_pdf(pdf)
+    assert len(ocr) == 3
+
+
+def test_failed_page_is_not_cached(pdf, ocr, monkeypatch):
+    def _crash(pix):
+        raise RuntimeError("moteur OCR indisponible")
+
+    with monkeypatch.context() as m:
+        m.setattr(ingest, "_ocr_tesseract", _crash)
+        docs, _, _ = ingest._extract_pdf(pdf)
+    assert "lue par" not in " ".join(docs)
+    ingest._extract_pdf(pdf)
+    assert len(ocr) == 1   # retentée au passage suivant
@@ -0,0 +1,94 @@
+"""
+Reprise d'une indexation interrompue (ingest.main --resume, RunCheckpoint) : les sources déjà
+extraites ne sont pas réextraites, et la base finale est identique à celle d'un run --full.
+"""
+
+import json
+
+import pytest
+
+ingest = pytest.importorskip("ingest")
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Noms des .md extraits (appels à ingest._extract_md) ; interrupt_on : Ctrl+C simulé."""
+    calls = []
+    interrupt_on = set()
+    extract_md = ingest._extract_md
+
+    def _extract(path):
+        if path.name in interrupt_on:
+            raise KeyboardInterrupt
+        calls.append(path.name)
+        return extract_md(path)
+
+    monkeypatch.setattr(ingest, "_extract_md", _extract)
+    return calls, interrupt_on
+
+
+def _write_sources(ws) -> None:
+    for name, seeds in {"a.md": (1, 2), "b.md": (3, 4), "c.md": (5, 6, 7)}.items():
+        (ws.knowledge / name).write_text(ws.page(*seeds), encoding="utf-8")
+
+
+def _power_cut(texts, show_progress_bar=False):
+    raise RuntimeError("coupure pendant l'encodage")
+
+
+def _progress(ws) -> dict:
+    return json.loads((ws.cache / "ingest_progress.json").read_text(encoding="utf-8"))
+
+
+def test_resume_after_embedding_failure_skips_extraction(ingest_workspace, extracted, monkeypatch, capsys):
+    ws = ingest_workspace
+    calls, _ = extracted
+    _write_sources(ws)
+    with monkeypatch.context() as m:
+        m.setattr(ws.model, "encode", _power_cut)
+        with pytest.raises(RuntimeError):
+            ws.run()
+    assert calls == ["a.md", "b.md", "c.md"]
+    assert _progress(ws)["stage"] == "embeddings"
+    assert not (ws.root / "vector_db" / "CURRENT").exists()   # rien de publié
+
+    calls.clear()
+    capsys.readouterr()
+    db = ws.run(resume=True)
+    assert calls == []
+    assert "Reprise : 3 fichier(s) deja extrait(s), 0 restant(s)." in capsys.readouterr().out
+    assert _progress(ws)["stage"] == "termine"
+    assert not (ws.cache / "ingest_checkpoint").exists()
+    ws.assert_same_index(db, ws.run("vector_db_full", full=True))
+
+
+def test_resume_after_interrupted_extraction(ingest_workspace, extracted):
+    ws = ingest_workspace
+    calls, interrupt_on = extracted
+    _write_sources(ws)
+    interrupt_on.add("b.md")
+    with pytest.raises(KeyboardInterrupt):
+        ws.run()
+    assert calls == ["a.md"]
+    progress = _progress(ws)
+    assert progress["stage"] == "extraction"
+    assert progress["remaining_files"] == ["knowledge_sites/b.md", "knowledge_sites/c.md"]
+
+    interrupt_on.clear()
+    calls.clear()
+    db = ws.run(resume=True)
+    assert calls == ["b.md", "c.md"]   # a.md : rechargé depuis son point de reprise
+    ws.assert_same_index(db, ws.run("vector_db_full", full=True))
+
+
+def test_run_without_resume_drops_checkpoints(ingest_workspace, extracted):
+    ws = ingest_workspace
+    calls, interrupt_on = extracted
+    _write_sources(ws)
+    interrupt_on.add("c.md")
+    with pytest.raises(KeyboardInterrupt):
+        ws.run()
+    interrupt_on.clear()
+    calls.clear()
+    ws.run()
+    assert calls == ["a.md", "b.md", "c.md"]
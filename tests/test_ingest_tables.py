@@ -0,0 +1,76 @@
+"""
+Détection des tableaux limitée aux pages à filets (_plumber_has_ruling_grid,
+_fitz_has_ruling_grid) avec les deux moteurs PDF, et moteur PDF dans la configuration de
+l'index : en changer force une reconstruction complète.
+"""
+
+import pytest
+
+ingest = pytest.importorskip("ingest")
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+TARIFS = [["Quotient familial", "Tarif repas"], ["0 à 500", "1,20 euros"], ["501 à 1000", "2,50 euros"],
+          ["plus de 1000", "3,80 euros"]]
+
+
+@pytest.fixture
+def pdf(ingest_workspace):
+    # Page 0 : barème de cantine à filets ; page 1 : texte seul ; page 2 : texte souligné (un filet)
+    path = ingest_workspace.static / "PV-2024-03-12.pdf"
+    ingest_workspace.write_pdf(path, [
+        "Tarifs de la cantine scolaire votés par le conseil municipal.",
+        "Travaux de voirie rue de l'Armistice : le conseil approuve le devis.",
+        "Subvention aux associations sportives de la commune.",
+    ], tables={0: TARIFS})
+    with fitz.open(path) as doc:
+        doc[2].draw_line((50, 80), (400, 80))
+        doc.saveIncr()
+    return path
+
+
+@pytest.fixture
+def table_pages(monkeypatch):
+    """Pages (à partir de 0) sur lesquelles pdfplumber a cherché des tableaux."""
+    pages = []
+    page_tables = ingest._page_tables
+
+    def _tables(page):
+        pages.append(page.page_number - 1)
+        return page_tables(page)
+
+    monkeypatch.setattr(ingest, "_page_tables", _tables)
+    return pages
+
+
+def test_ruling_grid_detection(pdf):
+    with pdfplumber.open(pdf) as plumber_pdf:
+        assert [ingest._plumber_has_ruling_grid(p) for p in plumber_pdf.pages] == [True, False, False]
+    with fitz.open(pdf) as doc:
+        assert [ingest._fitz_has_ruling_grid(p) for p in doc] == [True, False, False]
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pymupdf"])
+def test_table_detection_skipped_on_pages_without_grid(pdf, table_pages, backend):
+    pages_text, tables, _ = ingest._read_pdf(pdf, backend)
+    assert table_pages == [0]
+    assert len(tables) == 1 and "501 à 1000 | 2,50 euros" in tables[0]
+    assert "[Tableau]" in pages_text[0]
+    assert "[Tableau]" not in pages_text[1] + pages_text[2]
+
+    table_pages.clear()
+    ungated = ingest._read_pdf(pdf, backend, gate_tables=False)
+    assert table_pages == [0, 1, 2]
+    assert ungated[1] == tables   # les pages sans filets n'avaient pas de tableau
+
+
+def test_switching_pdf_backend_forces_full_rebuild(ingest_workspace, pdf, capsys):
+    ws = ingest_workspace
+    assert ingest._index_config()["pdf_backend"] == "pdfplumber"
+    ws.run()
+    capsys.readouterr()
+    ws.run()
+    assert "Indexation complete" not in capsys.readouterr().out
+    db = ws.run(pdf_backend="pymupdf")
+    assert "Indexation complete (pas de manifest exploitable ou --full)." in capsys.readouterr().out
+    assert ingest.load_manifest(ingest.index_store.active_dir(db))["config"]["pdf_backend"] == "pymupdf"
@@ -0,0 +1,39 @@
+"""
+Extraction PDF en parallèle (ingest._iter_pdf_reads, --workers) : sur un petit corpus de PDFs,
+un run à 2 processus produit exactement la même base qu'un run séquentiel.
+"""
+
+import pytest
+
+ingest = pytest.importorskip("ingest")
+pytest.importorskip("fitz")
+
+
+@pytest.fixture
+def corpus(ingest_workspace):
+    ws = ingest_workspace
+    for k, date in enumerate(["2023-01-17", "2023-06-20", "2024-03-12", "2024-11-05", "2025-02-04"]):
+        pages = [ws.page(10 * k + j).split("---\n", 1)[1] for j in range(1 + k % 3)]
+        ws.write_pdf(ws.static / f"PV-{date}.pdf", pages)
+    (ws.static / "PV-2022-09-13.pdf").write_bytes(b"%PDF-1.4 tronque")   # illisible : ignoré
+    (ws.knowledge / "cantine.md").write_text(ws.page(99, 100), encoding="utf-8")
+    return ws
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pymupdf"])
+def test_two_workers_match_sequential_run(corpus, backend, capsys):
+    sequential = corpus.run("vector_db_seq", workers=1, pdf_backend=backend)
+    capsys.readouterr()
+    parallel = corpus.run("vector_db_par", workers=2, pdf_backend=backend)
+    assert "Extraction PDF : 6 fichier(s), 2 processus" in capsys.readouterr().out
+    corpus.assert_same_index(parallel, sequential)
+    indexed = {meta["filename"] for meta in corpus.snapshot(parallel)["metadata"]}
+    assert len(indexed) == 6 and "PV-2022-09-13.pdf" not in indexed   # 5 PDFs + le .md
+
+
+def test_reads_keep_input_order(corpus):
+    paths = sorted(corpus.static.glob("PV-*.pdf"), reverse=True)
+    sequential = list(ingest._iter_pdf_reads(paths, 1))
+    assert list(ingest._iter_pdf_reads(paths, 3)) == sequential
+    read, error = sequential[-1]   # PV-2022-09-13.pdf
+    assert read is None and error.startswith("ERREUR")
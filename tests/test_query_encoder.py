@@ -0,0 +1,118 @@
+"""
+Encodeur de requêtes (query_encoder) : l'export ONNX int8 donne les mêmes vecteurs que le
+modèle sentence-transformers de référence (petit BERT aléatoire construit sur place, sans
+téléchargement), et sans onnxruntime ou sans export valide l'appli retombe sur le modèle torch.
+"""
+
+import json
+import re
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import query_encoder
+
+
+QUERIES = query_encoder.PARITY_QUERIES + ["tarifs cantine 2025", "mot inconnu du vocabulaire"]
+
+
+# ── Parité ONNX / sentence-transformers ───────────────────────────────────────
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """Petit BERT (poids aléatoires, vocabulaire des requêtes de contrôle) au format sentence-transformers."""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+
+    root = tmp_path_factory.mktemp("tiny-bert")
+    words = sorted({w for q in QUERIES for w in re.findall(r"\w+", q.lower())})
+    vocab = {token: i for i, token in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]", *words])}
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]",
+        sep_token="[SEP]").save_pretrained(root / "hf")
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2,
+                                     num_attention_heads=2, intermediate_size=64, max_position_embeddings=64)
+    transformers.BertModel(config).save_pretrained(root / "hf")
+    # Dossier transformers seul : sentence-transformers ajoute un mean pooling
+    reference = sentence_transformers.SentenceTransformer(str(root / "hf"), device="cpu")
+    reference.max_seq_length = 32   # la requête longue est tronquée
+    reference.save(str(root / "st"))
+    return str(root / "st"), reference
+
+
+def test_onnx_export_matches_sentence_transformers(tiny_model, tmp_path):
+    model_name, reference = tiny_model
+    manifest = query_encoder.export_onnx(model_name, tmp_path)
+    assert manifest["ok"] and manifest["dim"] == 32 and manifest["max_seq_length"] == 32
+    assert query_encoder.onnx_available(model_name, tmp_path)
+
+    encoder = query_encoder.load_query_encoder(model_name, tmp_path, backend="auto")
+    assert isinstance(encoder, query_encoder.OnnxQueryEncoder)
+    expected = reference.encode(QUERIES, convert_to_numpy=True, show_progress_bar=False)
+    got = encoder.encode(QUERIES, batch_size=4)   # lots de tailles différentes : padding
+    assert got.shape == expected.shape and got.dtype == np.float32
+    assert query_encoder._cosines(expected, got).min() >= query_encoder.MIN_COSINE
+    np.testing.assert_allclose(np.linalg.norm(got, axis=1), np.linalg.norm(expected, axis=1), rtol=0.02)
+
+    single = encoder.encode(QUERIES[2], normalize_embeddings=True)
+    assert single.shape == (32,)
+    assert np.isclose(np.linalg.norm(single), 1.0, atol=1e-5)
+    # Quantification dynamique : l'échelle des activations dépend du lot, d'où la tolérance
+    np.testing.assert_allclose(single, got[2] / np.linalg.norm(got[2]), atol=1e-3)
+
+
+# ── Repli sur le modèle torch ─────────────────────────────────────────────────
+class _FakeSentenceTransformer:
+    def __init__(self, model_name, **_kwargs):
+        self.model_name = model_name
+
+
+@pytest.fixture
+def torch_model(monkeypatch):
+    """sentence_transformers factice : le repli est observable sans charger torch."""
+    module = types.SimpleNamespace(SentenceTransformer=_FakeSentenceTransformer)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+
+
+def _fake_export(root, model_name: str, ok: bool = True) -> None:
+    """Export en apparence valide : manifest et fichiers présents, parité réussie sauf ok=False."""
+    out = query_encoder.onnx_dir(model_name, root)
+    out.mkdir(parents=True)
+    (out / query_encoder.MODEL_FILE).write_bytes(b"")
+    (out / query_encoder.MANIFEST_FILE).write_text(json.dumps(
+        {"model": model_name, "ok": ok, "parity": {"min_cosine": 0.999}}), encoding="utf-8")
+
+
+def test_missing_runtime_falls_back_to_torch(tmp_path, monkeypatch, torch_model):
+    _fake_export(tmp_path, "modele-test")
+    monkeypatch.setattr(query_encoder, "_ORT_OK", False)
+    assert not query_encoder.onnx_available("modele-test", tmp_path)
+    encoder = query_encoder.load_query_encoder("modele-test", tmp_path, backend="auto")
+    assert isinstance(encoder, _FakeSentenceTransformer)
+    assert encoder.model_name == "modele-test"
+    with pytest.raises(FileNotFoundError):
+        query_encoder.load_query_encoder("modele-test", tmp_path, backend="onnx")
+
+
+def test_invalid_or_missing_export_falls_back_to_torch(tmp_path, monkeypatch, torch_model):
+    monkeypatch.setattr(query_encoder, "_ORT_OK", True)
+    assert isinstance(query_encoder.load_query_encoder("absent", tmp_path), _FakeSentenceTransformer)
+    _fake_export(tmp_path, "parite-ratee", ok=False)
+    assert not query_encoder.onnx_available("parite-ratee", tmp_path)
+    assert isinstance(query_encoder.load_query_encoder("parite-ratee", tmp_path), _FakeSentenceTransformer)
+    _fake_export(tmp_path, "modele-test")
+    assert query_encoder.onnx_available("modele-test", tmp_path)
+    # QUERY_ENCODER=torch : l'export est ignoré
+    encoder = query_encoder.load_query_encoder("modele-test", tmp_path, backend="torch")
+    assert isinstance(encoder, _FakeSentenceTransformer)
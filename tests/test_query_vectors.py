@@ -0,0 +1,63 @@
+"""
+Cache des vecteurs de requêtes (app._QueryVectorCache) : requêtes fixes encodées en un lot au
+premier appel et jamais évincées, LRU borné pour les autres, compteurs hits / misses.
+"""
+
+import numpy as np
+import pytest
+
+import app
+
+
+PINNED = ("tarifs cantine", "travaux voirie", "tarifs cantine")
+
+
+@pytest.fixture
+def model(monkeypatch, fake_model):
+    model = fake_model(dim=8, per_word=True)
+    monkeypatch.setattr(app, "load_model", lambda: model)
+    return model
+
+
+def test_pinned_queries_encoded_once_in_one_batch(model):
+    cache = app._QueryVectorCache(2, PINNED)
+    vec = cache.vector("travaux voirie")
+    assert model.encoded == ["tarifs cantine", "travaux voirie"]   # doublon retiré
+    assert np.isclose(np.linalg.norm(vec), 1.0)
+    vec[:] = 0   # copie : le vecteur partagé entre sessions n'est pas modifié
+    assert np.isclose(np.linalg.norm(cache.vector("travaux voirie")), 1.0)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["pinned"], stats["lru"]) == (2, 0, 2, 0)
+
+
+def test_lru_bound_keeps_pinned_entries(model):
+    cache = app._QueryVectorCache(2, PINNED)
+    cache.vectors(["école", "château", "mairie"])   # 3 requêtes libres pour 2 places
+    assert cache.stats()["lru"] == 2
+    model.encoded.clear()
+    cache.vectors(["château", "mairie", "tarifs cantine", "travaux voirie"])
+    assert model.encoded == []
+    cache.vector("école")                             # la plus ancienne a été évincée
+    assert model.encoded == ["école"]
+    cache.vector("tarifs cantine")                    # requête fixe : jamais évincée
+    assert model.encoded == ["école"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (5, 4)
+    assert stats["hit_rate"] == pytest.approx(5 / 9)
+
+
+def test_batch_encodes_missing_once_and_keeps_order(model):
+    cache = app._QueryVectorCache(8, ())
+    vecs = cache.vectors(["école", "mairie", "école"])
+    assert model.encoded == ["école", "mairie"]
+    np.testing.assert_array_equal(vecs[0], vecs[2])
+    np.testing.assert_array_equal(cache.vector("mairie"), vecs[1])
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_size_zero_disables_lru(model):
+    cache = app._QueryVectorCache(0, ())
+    cache.vector("école")
+    cache.vector("école")
+    assert model.encoded == ["école", "école"]
+    assert cache.stats()["lru"] == 0
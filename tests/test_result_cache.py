@@ -0,0 +1,78 @@
+"""
+Cache de résultats (result_cache.ResultCache) : entrées par version de l'index, conservées
+pendant une bascule et supprimées par prune(), couche SQLite entre deux instances, TTL.
+"""
+
+import types
+
+import pytest
+
+import result_cache
+
+
+KEY = ("search", "tarifs de la cantine", ("2024",), False, 15, True)
+VALUE = [["Tarifs 2024 : 3,10 €", {"filename": "PV-2024.pdf", "chunk": 3}, 0.8]]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_versions_are_kept_apart_during_swap():
+    cache = result_cache.ResultCache(16)
+    cache.put(KEY, "v1", VALUE)
+    assert cache.get(KEY, "v2") is None
+    cache.put(KEY, "v2", [])
+    # Sessions encore sur v1 pendant la bascule : leur entrée n'a pas été remplacée
+    assert cache.get(KEY, "v1") == VALUE
+    assert cache.get(KEY, "v2") == []
+    cache.prune({"v2"})
+    assert cache.get(KEY, "v1") is None
+    assert cache.get(KEY, "v2") == []
+
+
+def test_disk_layer_survives_restart_and_prune(tmp_path):
+    path = tmp_path / "retrieval.sqlite"
+    cache = result_cache.ResultCache(16, path)
+    cache.put(KEY, "v1", VALUE)
+    cache.put(KEY, "v2", VALUE[:0])
+    restarted = result_cache.ResultCache(16, path)
+    assert restarted.get(KEY, "v1") == VALUE
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.prune({"v2"})
+    assert result_cache.ResultCache(16, path).get(KEY, "v1") is None
+    assert result_cache.ResultCache(16, path).get(KEY, "v2") == []
+
+
+def test_lru_eviction_in_memory():
+    cache = result_cache.ResultCache(2)
+    for i in range(3):
+        cache.put(("q", i), "v1", i)
+    assert cache.get(("q", 0), "v1") is None
+    assert [cache.get(("q", i), "v1") for i in (1, 2)] == [1, 2]
+    assert cache.stats()["entries"] == 2
+
+
+def test_ttl_expires_memory_and_disk(tmp_path, clock):
+    path = tmp_path / "answers.sqlite"
+    cache = result_cache.ResultCache(16, path, ttl=60)
+    cache.put(KEY, "m", "réponse")
+    clock[0] += 59
+    assert cache.get(KEY, "m") == "réponse"
+    clock[0] += 2
+    assert cache.get(KEY, "m") is None
+    assert cache.stats()["expired"] == 1
+    # Supprimée du disque aussi : un autre processus ne la sert pas
+    assert result_cache.ResultCache(16, path, ttl=None).get(KEY, "m") is None
+
+
+def test_unwritable_disk_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / "fichier"
+    blocker.write_text("")
+    cache = result_cache.ResultCache(16, blocker / "cache.sqlite")
+    cache.put(KEY, "v1", VALUE)
+    assert cache.get(KEY, "v1") == VALUE
+    assert cache.stats()["disk"] is False
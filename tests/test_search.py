@@ -0,0 +1,199 @@
+"""
+Recherche hybride (app.search_many / app.search) et filtre exact sur texts.bin
+(TextStore.contains_many), sur une petite base synthétique : un lot de requêtes donne les
+mêmes résultats qu'autant d'appels à search(), et le filtre exact les mêmes lignes que
+re.search(..., re.IGNORECASE). Le modèle est remplacé par un encodeur déterministe.
+"""
+
+import re
+
+import numpy as np
+import pytest
+
+import app
+import bm25_index
+import index_store
+import result_cache
+
+
+WORDS = ["cantine", "scolaire", "tarifs", "voirie", "éclairage", "public", "budget", "école",
+         "rue", "Armistice", "château", "Pierrefonds", "conseil", "délibération", "garderie"]
+YEARS = ["2022", "2023", "2024", "2025"]
+
+
+def _corpus(size: int = 60, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    documents, metadata = [], []
+    for i in range(size):
+        words = rng.choice(WORDS, size=8).tolist()
+        # Casses variées des mots accentués (ÉCOLE, École, école…)
+        words = [w.upper() if rng.random() < 0.2 else w.capitalize() if rng.random() < 0.2 else w
+                 for w in words]
+        documents.append(" ".join(words) + ".")
+        year = YEARS[i % len(YEARS)]
+        metadata.append({"filename": f"PV-{year}-{i // 4}.pdf", "rel_path": f"PV-{year}-{i // 4}.pdf",
+                         "date": f"{year}-01-01", "year": year, "chunk": i % 4, "total_chunks": 4})
+    return documents, metadata
+
+
+@pytest.fixture
+def model(fake_model):
+    return fake_model(dim=32, per_word=True)
+
+
+@pytest.fixture
+def engine(monkeypatch, model):
+    """Modèle factice, caches vides : ni vector_db/ ni cache de résultats."""
+    monkeypatch.setattr(app, "load_model", lambda: model)
+    monkeypatch.setattr(app, "_query_vectors", lambda: app._QueryVectorCache(0, ()))
+    monkeypatch.setattr(app, "_index_registry", lambda: app._IndexRegistry())
+    monkeypatch.setattr(app, "_retrieval_cache", lambda: result_cache.ResultCache(0))
+
+
+@pytest.fixture(params=["float32", "int8"])
+def db(request, tmp_path, model):
+    """Base au format index_store (TextStore, MetadataStore, BM25 précalculé), float32 ou int8."""
+    documents, metadata = _corpus()
+    emb = model.encode(documents)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    quantization = None if request.param == "float32" else "int8"
+    np.save(tmp_path / index_store.EMBEDDINGS_FILE, emb)
+    index_store.save_quantized(tmp_path, quantization)
+    index_store.save_index(tmp_path, documents, metadata, emb.shape[1], quantization=quantization)
+    bm25_index.write_bm25(tmp_path, documents)
+    embeddings, docs, meta = index_store.load_index(tmp_path, quantized=quantization is not None)
+    return embeddings, docs, meta, bm25_index.load_bm25(tmp_path, len(documents))
+
+
+QUERIES = [
+    ("tarifs de la cantine", 5, None, False),
+    ("éclairage public", 10, None, False),
+    ("budget voirie", 5, ["2024"], False),
+    ("école garderie", 5, ["2023", "2024", "2025"], False),   # filtre large : produit commun
+    ("ÉCOLE", 5, None, True),
+    ("château Pierrefonds", 3, ["2022"], True),
+    ("mot absent", 5, None, True),                               # aucune ligne autorisée
+]
+
+
+def _rows(results: list) -> list:
+    return [(meta["filename"], meta["chunk"]) for _, meta, _ in results]
+
+
+def _assert_same(got: list, expected: list) -> None:
+    assert _rows(got) == _rows(expected)
+    assert [doc for doc, _, _ in got] == [doc for doc, _, _ in expected]
+    np.testing.assert_allclose([s for _, _, s in got], [s for _, _, s in expected], rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("with_bm25", [True, False])
+def test_search_many_matches_single_searches(engine, db, with_bm25):
+    embeddings, documents, metadata, bm25 = db
+    bm25 = bm25 if with_bm25 else None
+    batch = app.search_many(QUERIES, embeddings, documents, metadata, bm25)
+    assert len(batch) == len(QUERIES)
+    for (query, n, years, exact), got in zip(QUERIES, batch):
+        expected = app.search(query, embeddings, documents, metadata, n=n, year_filter=years,
+                              exact=exact, bm25=bm25)
+        _assert_same(got, expected)
+        assert len(got) <= n
+        if years:
+            assert {meta["year"] for _, meta, _ in got} <= set(years)
+        if exact:
+            pattern = re.compile("|".join(map(re.escape, app._exact_terms(query))), re.IGNORECASE)
+            assert all(pattern.search(doc) for doc, _, _ in got)
+
+
+def test_search_on_store_matches_plain_lists(engine, db):
+    """Même résultat avec TextStore / MetadataStore qu'avec des listes (regex, parcours des dicts)."""
+    embeddings, documents, metadata, bm25 = db
+    if isinstance(embeddings, index_store.QuantizedEmbeddings):
+        pytest.skip("les listes n'ont pas de copie quantifiée")
+    plain = (np.asarray(embeddings), list(documents), list(metadata))
+    for got, expected in zip(app.search_many(QUERIES, embeddings, documents, metadata, bm25),
+                             app.search_many(QUERIES, *plain, bm25)):
+        _assert_same(got, expected)
+
+
+def test_retrieval_cache_keyed_by_retrieval_version(engine, db, monkeypatch):
+    embeddings, documents, metadata, bm25 = db
+    registry = app._IndexRegistry()
+    registry.versions["v1"] = (embeddings, documents, metadata, bm25, None, None, "v1")
+    cache = result_cache.ResultCache(16)
+    monkeypatch.setattr(app, "_index_registry", lambda: registry)
+    monkeypatch.setattr(app, "_retrieval_cache", lambda: cache)
+    first = app.search("tarifs de la cantine", embeddings, documents, metadata, bm25=bm25)
+    assert app.search("tarifs  de la cantine", embeddings, documents, metadata, bm25=bm25) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Logique de recherche modifiée (RETRIEVAL_VERSION incrémentée) : l'ancien résultat n'est plus servi
+    monkeypatch.setattr(app, "RETRIEVAL_VERSION", app.RETRIEVAL_VERSION + 1)
+    app.search("tarifs de la cantine", embeddings, documents, metadata, bm25=bm25)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+# ── Filtre exact sur texts.bin ────────────────────────────────────────────────
+TEXTS = [
+    "Tarifs de la CANTINE scolaire.",
+    "L'ÉCOLE maternelle et l'école élémentaire.",
+    "",
+    "Fin du mot cant",            # « cantine » à cheval sur deux chunks : ne compte pas
+    "ine, puis la rue de l'Armistice.",
+    "Éclairage PUBLIC : ÉCLAIRAGE renforcé.",
+    "Château de Pierrefonds (CHÂTEAU impérial).",
+    "cœur de ville, ŒUVRE d'art",
+    "Réservé : ÉTÉ éêèàùçÉÊÈÀÙÇéêèàùç — fin.",
+]
+TERM_LISTS = [
+    ["cantine"],
+    ["école"],
+    ["ÉCOLE", "tarifs"],
+    ["éclairage"],
+    ["château"],
+    ["œuvre", "absent"],
+    ["cantine", "Armistice"],
+    ["introuvable"],
+    ["ÉÊÈÀÙÇÉÊÈÀÙÇéêèàùç"],   # 18 lettres accentuées : 2^18 encodages
+    ["éêèàùçéêèàùçéêèàùç", "cantine"],
+    [],                            # motif vide : tous les textes correspondent
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Blocs de quelques octets : les bornes de bloc tombent entre presque tous les chunks
+    monkeypatch.setattr(index_store, "SCAN_BLOCK", 16)
+    index_store.save_texts(tmp_path, TEXTS)
+    texts = index_store.load_texts(tmp_path)
+    yield texts
+    texts.close()
+
+
+def _regex_mask(terms: list, rows=None) -> np.ndarray:
+    pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE)
+    mask = np.zeros(len(TEXTS), dtype=bool)
+    for i in range(len(TEXTS)) if rows is None else rows:
+        mask[i] = bool(pattern.search(TEXTS[i]))
+    return mask
+
+
+@pytest.mark.parametrize("rows", [None, [0, 2, 3, 4, 7], [5]])
+def test_contains_many_matches_regex(store, rows):
+    masks = store.contains_many(TERM_LISTS, rows=None if rows is None else np.array(rows))
+    assert masks.shape == (len(TERM_LISTS), len(TEXTS))
+    for terms, mask in zip(TERM_LISTS, masks):
+        np.testing.assert_array_equal(mask, _regex_mask(terms, rows), err_msg=str(terms))
+        np.testing.assert_array_equal(store.contains_any(terms, None if rows is None else np.array(rows)), mask)
+
+
+def test_match_across_chunks_does_not_count(store):
+    assert store.contains_any(["cantine"]).tolist() == [True] + [False] * (len(TEXTS) - 1)
+
+
+def test_long_accented_term_falls_back_to_regex(store):
+    term = "é" * 25   # mot collé dans la recherche : 2^25 encodages, non énumérés
+    assert index_store._folded_variants(term) is None
+    assert index_store._folded_variants("éêèàùç") is not None
+    assert not store.contains_any([term]).any()
+    mask = store.contains_any(["ÉÊÈÀÙÇÉÊÈÀÙÇ", "tarifs"])
+    np.testing.assert_array_equal(mask, _regex_mask(["ÉÊÈÀÙÇÉÊÈÀÙÇ", "tarifs"]))
+    assert mask[-1] and mask[0]
@@ -33,10 +33,15 @@ if exist "%~dp0vector_db" (
     git status >nul 2>&1
     if not errorlevel 1 (
         echo Commit vector_db...
-        git add -f "%~dp0vector_db\documents.pkl"
-        git add -f "%~dp0vector_db\embeddings.npy"
-        git add -f "%~dp0vector_db\metadata.pkl"
-        git add -f "%~dp0vector_db\stats.json"
+        rem Seulement CURRENT, stats.json et la version servie (pas la precedente ni les anciennes)
+        if exist "%~dp0vector_db\CURRENT" (
+            set /p VDB_CURRENT=<"%~dp0vector_db\CURRENT"
+            git rm -r -q --cached --ignore-unmatch vector_db/versions
+            git add -f vector_db/CURRENT "vector_db/versions/!VDB_CURRENT!"
+            if exist "%~dp0vector_db\stats.json" git add -f vector_db/stats.json
+        ) else (
+            git add -A -f "%~dp0vector_db"
+        )
         git diff --cached --quiet -- vector_db
         if errorlevel 1 (
             git commit -m "vector_db: reindex depuis input/*.md"
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 MAIRIE_ROOT = BASE_DIR.parent
 BASE_VECTORIELLE = MAIRIE_ROOT / "base_vectorielle"
 
+# Modules partagés avec l'appli Streamlit, à la racine du projet (index_store, query_encoder,
+# ann_index) : importables par l'application search comme des modules installés
+if str(MAIRIE_ROOT) not in sys.path:
+    sys.path.append(str(MAIRIE_ROOT))
+
 SECRET_KEY = "dev-secret-change-in-production"
 DEBUG = True
 ALLOWED_HOSTS = ["*"]
@@ -1,16 +1,25 @@
 # -*- coding: utf-8 -*-
-"""Charge la base vectorielle et exécute les requêtes (singleton au premier appel)."""
+"""
+Charge la base vectorielle et exécute les requêtes (singleton au premier appel).
+Embeddings et textes sont ouverts en mmap, en lecture seule (index_store.load_simple_index) :
+les workers Django et les scripts qui lisent la même base partagent une seule copie en mémoire.
+Les requêtes sont encodées par l'export ONNX int8 du modèle s'il existe (query_encoder.py).
+"""
 import re
-import json
 from pathlib import Path
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from django.conf import settings
 
-STORE_DIR = getattr(settings, "BASE_VECTORIELLE", Path(__file__).resolve().parent.parent.parent / "base_vectorielle")
-EMBEDDINGS_FILE = Path(STORE_DIR) / "embeddings.npz"
-META_FILE = Path(STORE_DIR) / "metadata.json"
+# Format de la base (index_store.py), encodeur de requêtes (query_encoder.py) et index approché
+# IVF (ann_index.py) : modules à la racine du projet, mis sur le chemin par config/settings.py
+import ann_index
+import index_store
+import query_encoder
+
+MAIRIE_ROOT = Path(getattr(settings, "MAIRIE_ROOT", Path(__file__).resolve().parent.parent.parent))
+STORE_DIR = getattr(settings, "BASE_VECTORIELLE", MAIRIE_ROOT / "base_vectorielle")
+
 EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 N_RESULTS_DEFAULT = 12
 # Seuil de similarité minimal : les résultats en dessous sont exclus (réduit les faux positifs).
@@ -22,14 +31,16 @@ KEYWORD_FILTER_MAX_WORDS = 3
 
 _model = None
 _embeddings = None
+_norms = None
+_ivf = None
 _documents = None
 _metadatas = None
 
 
-def _cosine_similarity(a, b):
-    a = np.asarray(a, dtype=np.float32)
-    b = np.asarray(b, dtype=np.float32)
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9)
+def _cosine_scores(q, embeddings, norms):
+    """Similarité cosinus de q avec chaque ligne de embeddings (norms : normes des lignes)."""
+    q = np.asarray(q, dtype=np.float32)
+    return (embeddings @ q) / (norms * np.linalg.norm(q) + 1e-9)
 
 
 def _query_words(query: str):
@@ -47,18 +58,19 @@ def _text_contains_any_word(text: str, words: list) -> bool:
 
 
 def _load():
-    global _model, _embeddings, _documents, _metadatas
+    global _model, _embeddings, _norms, _ivf, _documents, _metadatas
     if _embeddings is not None:
         return
-    if not EMBEDDINGS_FILE.exists() or not META_FILE.exists():
+    if not index_store.simple_index_exists(STORE_DIR):
         raise FileNotFoundError("Base vectorielle absente. Exécutez build_vector_store.py.")
-    _model = SentenceTransformer(EMBEDDING_MODEL)
-    data = np.load(EMBEDDINGS_FILE)
-    _embeddings = data["embeddings"]
-    with open(META_FILE, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    _documents = meta["documents"]
-    _metadatas = meta["metadatas"]
+    _model = query_encoder.load_query_encoder(EMBEDDING_MODEL)   # ONNX int8 si exporté, sinon torch
+    embeddings, documents, metadatas = index_store.load_simple_index(STORE_DIR)
+    _norms = np.linalg.norm(embeddings, axis=1)
+    # Sans ivf.npz (petite base) ou s'il est périmé : parcours complet
+    _ivf = ann_index.load_ivf(STORE_DIR, embeddings)
+    _documents = documents
+    _metadatas = metadatas
+    _embeddings = embeddings
 
 
 def search(query: str, n: int = N_RESULTS_DEFAULT):
@@ -67,30 +79,35 @@ def search(query: str, n: int = N_RESULTS_DEFAULT):
     - Seuil de similarité : résultats avec similarity < MIN_SIMILARITY exclus.
     - Pour requêtes courtes : le document doit contenir au moins un mot de la requête.
       Dans ce cas, on parcourt tous les passages contenant le mot (pas seulement le top par similarité).
+    - Sinon, avec un index IVF (grandes bases), seuls les passages des groupes proches sont scorés.
     """
     _load()
     q_emb = _model.encode([query], convert_to_numpy=True)[0]
-    scores = np.array([_cosine_similarity(q_emb, e) for e in _embeddings])
     words = _query_words(query)
     use_keyword_filter = len(words) <= KEYWORD_FILTER_MAX_WORDS and len(words) >= 1
 
     if use_keyword_filter:
         # Trouver TOUS les passages contenant au moins un mot de la requête, puis trier par similarité.
         indices_with_word = [
-            i for i in range(len(_documents))
-            if _text_contains_any_word(_documents[i], words)
+            i for i, doc in enumerate(_documents)
+            if _text_contains_any_word(doc, words)
         ]
+        rows = np.array(indices_with_word, dtype=np.int64)
+        scores = dict(zip(indices_with_word, _cosine_scores(q_emb, _embeddings[rows], _norms[rows]).tolist()))
         # Garder ceux au-dessus du seuil, trier par score décroissant, prendre n.
         candidates = [
-            (i, float(scores[i]))
+            (i, scores[i])
             for i in indices_with_word
             if scores[i] >= MIN_SIMILARITY_IF_KEYWORD_MATCH
         ]
         candidates.sort(key=lambda x: -x[1])
         idx = [i for i, _ in candidates[:n]]
     else:
-        idx = np.argsort(-scores)[:n]
-        idx = [i for i in idx if scores[i] >= MIN_SIMILARITY]
+        rows = _ivf.candidates(q_emb) if _ivf is not None else np.arange(len(_embeddings))
+        row_scores = _cosine_scores(q_emb, _embeddings[rows], _norms[rows])
+        top = np.argsort(-row_scores, kind="stable")[:n]
+        scores = dict(zip(rows[top].tolist(), row_scores[top].tolist()))
+        idx = [i for i in rows[top].tolist() if scores[i] >= MIN_SIMILARITY]
 
     results = []
     for i in idx:
@@ -105,4 +122,4 @@ def search(query: str, n: int = N_RESULTS_DEFAULT):
 
 
 def is_available():
-    return EMBEDDINGS_FILE.exists() and META_FILE.exists()
+    return index_store.simple_index_exists(STORE_DIR)